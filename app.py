@@ -1,27 +1,108 @@
-from flask import Flask, render_template, request, jsonify, send_file
-from log_splitter import LogProcessor
+from flask import Flask, render_template, request, jsonify, send_file, Response, stream_with_context, g
+from datasets import DEFAULT_DATASET, DatasetRegistry
+from ingest_jobs import JobManager, staging_path
+from log_splitter import KEY_FORMATS, configure_logging
+from metrics import profiled, render_prometheus, write_profile
 import os
-import tempfile
+import json
+import logging
+import uuid
+from contextlib import ExitStack
+from itertools import islice
 from werkzeug.utils import secure_filename
 
 app = Flask(__name__)
-app.config['UPLOAD_FOLDER'] = 'uploads'
+app.config['DATASETS_FOLDER'] = 'datasets'
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+# With LOG_PROFILING=1 any request can ask to be profiled with ?profile=cpu, memory or
+# cpu,memory; reports are written to PROFILES_FOLDER. Off by default: profiling is slow.
+app.config['PROFILING'] = os.environ.get('LOG_PROFILING') == '1'
+app.config['PROFILES_FOLDER'] = 'profiles'
 
-# Ensure upload directory exists
-if not os.path.exists(app.config['UPLOAD_FOLDER']):
-    os.makedirs(app.config['UPLOAD_FOLDER'])
+logger = logging.getLogger(__name__)
 
-# Global variable to store the current log processor instance
-log_processor = None
+# Every dataset is processed into its own directory under DATASETS_FOLDER; its
+# processor stays open between requests so manifests and indexes stay cached
+registry = DatasetRegistry(app.config['DATASETS_FOLDER'])
+# Uploads are ingested in the background; clients poll the job's status
+jobs = JobManager(profile_dir=app.config['PROFILES_FOLDER'])
+
+def request_dataset(create=False):
+    """Return the dataset named by the request's 'dataset' parameter ('default' if
+    there is none), or None if it does not exist. Raises ValueError for a bad name."""
+    return registry.get(request.values.get('dataset') or DEFAULT_DATASET, create)
+
+def lock_processed_dataset():
+    """Return the requested dataset with its read lock held and an error response of None,
+    or None and the error response if it does not exist or has nothing processed yet.
+
+    The caller releases the lock, after streaming the response if there is one.
+    """
+    try:
+        dataset = request_dataset()
+    except ValueError as e:
+        return None, (jsonify({'error': str(e)}), 400)
+    if dataset is not None:
+        dataset.lock.acquire_read()
+        if dataset.processor is not None:
+            return dataset, None
+        dataset.lock.release_read()
+    return None, (jsonify({'error': 'No log file has been processed yet'}), 400)
+
+@app.before_request
+def start_profile():
+    kinds = request.args.get('profile')
+    if app.config['PROFILING'] and kinds:
+        stack = ExitStack()
+        report = stack.enter_context(profiled('cpu' in kinds.split(','), 'memory' in kinds.split(',')))
+        g.profile = (stack, report)
+
+@app.after_request
+def finish_profile(response):
+    """Stop the profile of the request once the response is sent (a streamed response
+    is still running the query) and write the report; its name is in X-Profile."""
+    if 'profile' in g:
+        stack, report = g.pop('profile')
+        name = f"request-{uuid.uuid4().hex}"
+        # Runs after the request context is gone
+        path, folder = request.path, app.config['PROFILES_FOLDER']
+        def write_report():
+            stack.close()
+            os.makedirs(folder, exist_ok=True)
+            paths = write_profile(report, os.path.join(folder, name))
+            logger.info("Profile of %s written to %s", path, ', '.join(paths))
+        response.headers['X-Profile'] = name
+        response.call_on_close(write_report)
+    return response
 
 @app.route('/')
 def index():
     return render_template('index.html')
 
+@app.route('/datasets', methods=['GET'])
+def list_datasets():
+    return jsonify({'datasets': registry.names()})
+
+def ingest_options():
+    """Return the ingest options of an upload request, or raise ValueError."""
+    # Time span of each chunk: 'second', 'minute' or 'hour'
+    granularity = request.values.get('granularity', 'minute')
+    if granularity not in KEY_FORMATS:
+        raise ValueError(f"Unknown granularity: {granularity}")
+    # Append the new lines of the file to the logs already processed
+    options = {'append': request.values.get('append') == 'true', 'granularity': granularity}
+    if app.config['PROFILING']:
+        # The ingest runs in the background, so it is profiled by its job rather than the request
+        options['profile'] = request.values.get('profile')
+    return options
+
+def job_response(job):
+    """202 response telling the client which job to poll."""
+    return jsonify({'job_id': job.id, 'status_url': f'/jobs/{job.id}'}), 202
+
 @app.route('/upload', methods=['POST'])
 def upload_file():
-    global log_processor
+    """Upload a whole file in one form request, then ingest it in the background."""
     if 'file' not in request.files:
         return jsonify({'error': 'No file part'}), 400
     
@@ -29,70 +110,253 @@ def upload_file():
     if file.filename == '':
         return jsonify({'error': 'No selected file'}), 400
     
-    if file:
-        filename = secure_filename(file.filename)
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(filepath)
-        
-        # Initialize log processor with the uploaded file
-        log_processor = LogProcessor(filepath)
-        num_chunks = log_processor.split_by_second()
-        log_processor.compress_files()
-        size_comparison = log_processor.get_total_size_comparison()
-        
-        return jsonify({
-            'message': 'File processed successfully',
-            'chunks': num_chunks,
-            'size_comparison': size_comparison
-        })
+    try:
+        dataset = request_dataset(create=True)
+        options = ingest_options()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    try:
+        jobs.check_ingest(dataset, options)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 409
+    
+    # Saved aside; the job moves it over the file of the same name once it runs
+    filename = secure_filename(file.filename)
+    upload_path = staging_path(dataset, filename)
+    file.save(upload_path)
+    filepath = os.path.join(dataset.upload_dir, filename)
+    return job_response(jobs.submit_ingest(dataset, filepath, options, upload_path=upload_path))
+
+@app.route('/uploads', methods=['POST'])
+def create_upload():
+    """Start a resumable upload of a file of 'size' bytes, sent with PUT /uploads/<id>."""
+    filename = secure_filename(request.values.get('filename', ''))
+    size = request.values.get('size', type=int)
+    if not filename:
+        return jsonify({'error': 'No file name'}), 400
+    if size is None or size < 0:
+        return jsonify({'error': 'The file size is required'}), 400
+    
+    try:
+        dataset = request_dataset(create=True)
+        options = ingest_options()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    try:
+        jobs.check_ingest(dataset, options)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 409
+    
+    session = jobs.create_upload(dataset, filename, size, options)
+    if session.complete:
+        # Nothing to send for an empty file
+        jobs.complete_upload(session)
+    return jsonify(session.status()), 201
+
+@app.route('/uploads/<upload_id>', methods=['GET'])
+def upload_status(upload_id):
+    """How much of an upload has arrived, i.e. where to resume it."""
+    session = jobs.get_upload(upload_id)
+    if session is None:
+        return jsonify({'error': 'Unknown upload'}), 404
+    return jsonify(session.status())
+
+@app.route('/uploads/<upload_id>', methods=['PUT'])
+def upload_slice(upload_id):
+    """Write the request body at the upload's 'offset'; the ingest job starts once
+    the whole file has arrived. A wrong offset gets a 409 with the right one."""
+    session = jobs.get_upload(upload_id)
+    if session is None:
+        return jsonify({'error': 'Unknown upload'}), 404
+    offset = request.args.get('offset', type=int)
+    if offset != session.offset:
+        return jsonify({'error': 'Offset does not match the data received', **session.status()}), 409
+    
+    try:
+        # The body is copied to disk as it arrives, it is never read whole
+        session.write(offset, request.stream)
+    except ValueError as e:
+        return jsonify({'error': str(e), **session.status()}), 400
+    if session.complete:
+        jobs.complete_upload(session)
+    return jsonify(session.status())
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    """State and progress of an ingest job: lines and bytes processed, bytes/sec and ETA."""
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    return jsonify(job.status())
 
 @app.route('/view_logs', methods=['GET'])
 def view_logs():
-    global log_processor
-    if not log_processor:
-        return jsonify({'error': 'No log file has been processed yet'}), 400
-    
     start_timestamp = request.args.get('start_timestamp')
     end_timestamp = request.args.get('end_timestamp')
     log_type = request.args.get('log_type', None)
+    # Optional pagination: page size and the next_cursor of the previous page
+    limit = request.args.get('limit', type=int)
+    cursor = request.args.get('cursor', None)
+    # 'json' (default) or 'ndjson' (one record per line, streamed as it is read)
+    response_format = request.args.get('format', 'json')
     
     if not start_timestamp:
         return jsonify({'error': 'Start timestamp is required'}), 400
+    if response_format not in ('json', 'ndjson'):
+        return jsonify({'error': f'Unknown format: {response_format}'}), 400
     
+    dataset, error = lock_processed_dataset()
+    if error:
+        return error
     try:
-        # Create a temporary file to store the output
-        with tempfile.TemporaryDirectory() as temp_dir:
-            temp_output = os.path.join(temp_dir, 'output.txt')
-            with open(temp_output, 'w') as f:
-                # Redirect stdout to the file temporarily
-                import sys
-                original_stdout = sys.stdout
-                sys.stdout = f
-                if end_timestamp:
-                    log_processor.view_logs_by_timerange(start_timestamp, end_timestamp, log_type)
-                else:
-                    log_processor.view_logs_by_timestamp(start_timestamp, log_type)
-                sys.stdout = original_stdout
-            
-            # Read the contents of the temporary file
-            with open(temp_output, 'r') as f:
-                logs = f.read().splitlines()
+        if limit is not None:
+            records, next_cursor = dataset.processor.query_page(start_timestamp, end_timestamp, log_type,
+                                                                limit, cursor)
+        else:
+            records = dataset.processor.query_logs(start_timestamp, end_timestamp, log_type, cursor)
+            next_cursor = None
         
-        return jsonify({'logs': logs})
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        if response_format == 'json' and limit is not None:
+            response = jsonify({'logs': records, 'next_cursor': next_cursor})
+            dataset.lock.release_read()
+            return response
+        return records_response(records, response_format, next_cursor, dataset.lock.release_read)
+    except ValueError as e:
+        dataset.lock.release_read()
+        return jsonify({'error': str(e)}), 400
+    except BaseException:
+        # The response only releases the lock once it has been built; a missing or
+        # corrupt chunk must not leave the dataset locked for good
+        dataset.lock.release_read()
+        raise
+
+@app.route('/search', methods=['GET'])
+def search():
+    query = request.args.get('q', '')
+    start_timestamp = request.args.get('start_timestamp', None)
+    end_timestamp = request.args.get('end_timestamp', None)
+    log_type = request.args.get('log_type', None)
+    limit = request.args.get('limit', type=int)
+    response_format = request.args.get('format', 'json')
+    
+    if response_format not in ('json', 'ndjson'):
+        return jsonify({'error': f'Unknown format: {response_format}'}), 400
+    
+    dataset, error = lock_processed_dataset()
+    if error:
+        return error
+    try:
+        records = dataset.processor.search_logs(query, start_timestamp, end_timestamp, log_type)
+        if limit is not None:
+            records = islice(records, limit)
+        return records_response(records, response_format, None, dataset.lock.release_read)
+    except ValueError as e:
+        dataset.lock.release_read()
+        return jsonify({'error': str(e)}), 400
+    except BaseException:
+        # The response only releases the lock once it has been built
+        dataset.lock.release_read()
+        raise
+
+def records_response(records, response_format, next_cursor=None, on_close=None):
+    """Stream log records to the client as a JSON object or as NDJSON lines.
+
+    on_close is called once the response is finished, e.g. to release the lock
+    the records are read under."""
+    if response_format == 'ndjson':
+        def generate():
+            for record in records:
+                yield json.dumps(record) + '\n'
+            # The last line tells the client where the next page starts
+            if next_cursor:
+                yield json.dumps({'next_cursor': next_cursor}) + '\n'
+        mimetype = 'application/x-ndjson'
+    else:
+        def generate():
+            # Send each record as soon as it is read instead of building the whole list
+            yield '{"logs": ['
+            for i, record in enumerate(records):
+                yield (',' if i else '') + json.dumps(record)
+            yield ']}'
+        mimetype = 'application/json'
+    
+    response = Response(stream_with_context(generate()), mimetype=mimetype)
+    if on_close is not None:
+        response.call_on_close(on_close)
+    return response
+
+@app.route('/stats', methods=['GET'])
+def stats():
+    start_timestamp = request.args.get('start_timestamp')
+    end_timestamp = request.args.get('end_timestamp')
+    log_type = request.args.get('log_type', None)
+    granularity = request.args.get('granularity', None)
+    
+    if not start_timestamp:
+        return jsonify({'error': 'Start timestamp is required'}), 400
+    
+    dataset, error = lock_processed_dataset()
+    if error:
+        return error
+    try:
+        # Counts come from the counters collected at ingest, no chunk is decompressed
+        if granularity:
+            histogram = dataset.processor.get_histogram(start_timestamp, end_timestamp or start_timestamp,
+                                                        granularity, log_type)
+            return jsonify({'granularity': granularity, 'histogram': histogram})
+        return jsonify(dataset.processor.count_logs(start_timestamp, end_timestamp, log_type))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    finally:
+        dataset.lock.release_read()
+
+@app.route('/cache_stats', methods=['GET'])
+def cache_stats():
+    dataset, error = lock_processed_dataset()
+    if error:
+        return error
+    try:
+        return jsonify(dataset.processor.get_cache_stats())
+    finally:
+        dataset.lock.release_read()
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Stage timers and counters of every open dataset, and its cache, in the Prometheus text format."""
+    labelled_metrics = []
+    samples = []
+    for dataset in registry.open_datasets():
+        labels = {'dataset': dataset.name}
+        labelled_metrics.append((labels, dataset.metrics))
+        if dataset.processor is not None:
+            cache = dataset.processor.get_cache_stats()
+            samples += [
+                ('cache_bytes', 'gauge', 'Bytes held by the chunk cache.', labels, cache['bytes']),
+                ('cache_entries', 'gauge', 'Chunks held by the chunk cache.', labels, cache['entries']),
+                ('cache_hits_total', 'counter', 'Chunk cache hits.', labels, cache['hits']),
+                ('cache_misses_total', 'counter', 'Chunk cache misses.', labels, cache['misses']),
+                ('cache_evictions_total', 'counter', 'Chunk cache evictions.', labels, cache['evictions'])
+            ]
+    return Response(render_prometheus(labelled_metrics, samples), mimetype='text/plain; version=0.0.4')
 
 @app.route('/reset', methods=['POST'])
 def reset():
-    global log_processor
-    if not log_processor:
+    try:
+        dataset = request_dataset()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if dataset is None or dataset.processor is None:
         return jsonify({'error': 'No log file has been processed yet'}), 400
     
     try:
-        log_processor.reset_processing()
+        with dataset.lock.write_locked():
+            dataset.processor.reset_processing()
         return jsonify({'message': 'Processing reset successfully'})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 if __name__ == '__main__':
-    app.run(debug=True) 
\ No newline at end of file
+    # LOG_QUIET=1 only shows warnings and errors
+    configure_logging(quiet=os.environ.get('LOG_QUIET') == '1')
+    # Requests run in threads; the registry's locks keep them from racing
+    app.run(debug=True, threaded=True) 
\ No newline at end of file
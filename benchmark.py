@@ -0,0 +1,521 @@
+"""Benchmarks for the log processor.
+
+Usage:
+    python benchmark.py ingest [LOG_FILE]
+    python benchmark.py index [LOG_FILE]
+    python benchmark.py codecs [LOG_FILE] [--granularity GRANULARITY]
+    python benchmark.py parse [LOG_FILE]
+    python benchmark.py query [LOG_FILE] [--granularity GRANULARITY]
+    python benchmark.py suite [--size SIZE] [--span SECONDS] [--skew SKEW] [--levels MIX]
+                              [--log-file LOG_FILE] [--output RESULTS] [--compare BASELINE]
+
+Every benchmark works in a fresh temporary directory, so results are not
+affected by existing output. Ingest runs and suite scenarios also happen in
+a fresh child process each, so they start from a clean heap; the index,
+codecs, parse and query benchmarks run in the current process and report
+the best of several repeats instead.
+
+The suite runs end-to-end scenarios (ingest, point lookups, range and
+level-filtered range queries, reset) on a log written by log_generator.py
+and saves their throughput, p50/p99 latency and peak memory as JSON; the
+generator and the queries are seeded, so two runs with the same options
+measure the same work and their result files can be compared.
+"""
+import argparse
+import contextlib
+import gzip
+import json
+import math
+import multiprocessing
+import os
+import platform
+import random
+import re
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from binary_index import BinaryIndex
+from line_parsers import PARSERS, get_parser
+from line_parsers import TIMESTAMP_FORMAT
+from log_codecs import available_codecs, get_codec, train_dictionary
+from log_generator import DEFAULT_LEVEL_MIX, DEFAULT_START, LogGenerator, parse_level_mix, parse_size
+from log_splitter import DICTIONARY_SAMPLE_SIZE, KEY_FORMATS, LOG_TYPES, LogProcessor, complete_end
+
+DEFAULT_LOG_FILE = "Hadoop_2k (1).log"
+# Codec specs compared by the codecs benchmark, if available
+CODEC_SPECS = ('gzip:1', 'gzip:6', 'gzip:9', 'zlib', 'zlib-dict', 'lzma', 'bz2', 'zstd', 'zstd:19', 'lz4')
+# Scenarios of the suite, run in this order on the same processed output
+SUITE_SCENARIOS = ('ingest', 'point_lookup', 'range', 'level_range', 'reset')
+# Format version of the suite's result files
+SUITE_RESULTS_VERSION = 1
+
+
+def _ingest_in_memory(processor):
+    processor.split_by_second()
+    processor.compress_files()
+
+
+def _ingest_parallel_compress(processor):
+    processor.split_by_second()
+    processor.compress_files_parallel()
+
+
+def _ingest_fused(processor):
+    processor.split_and_compress()
+
+
+def _ingest_streaming(processor):
+    processor.split_by_second_streaming()
+
+
+def _ingest_sharded(processor):
+    processor.split_and_compress_parallel()
+
+
+# Ingest modes compared by the ingest benchmark
+INGEST_MODES = {
+    'in-memory': _ingest_in_memory,
+    'parallel': _ingest_parallel_compress,
+    'fused': _ingest_fused,
+    'streaming': _ingest_streaming,
+    'sharded': _ingest_sharded,
+}
+
+
+def _run_ingest(mode, input_file, trace_memory):
+    """Run one ingest mode in the current (child) process and return its measurements."""
+    with tempfile.TemporaryDirectory() as work_dir:
+        os.chdir(work_dir)
+        processor = LogProcessor(input_file)
+
+        if trace_memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        INGEST_MODES[mode](processor)
+        elapsed = time.perf_counter() - start
+        peak_memory = None
+        if trace_memory:
+            _, peak_memory = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+        return elapsed, peak_memory
+
+
+def _in_child(function, *args):
+    """Run function in a new process so every run starts from a clean heap."""
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+        return executor.submit(function, *args).result()
+
+
+def benchmark_ingest(input_file):
+    input_file = os.path.abspath(input_file)
+    with open(input_file, 'rb') as f:
+        total_lines = sum(1 for _ in f)
+    input_size = os.path.getsize(input_file)
+
+    print(f"Input: {input_file} ({input_size} bytes, {total_lines} lines)")
+    print(f"{'mode':<12}{'seconds':>10}{'lines/sec':>14}{'peak memory (KB)':>20}")
+    for mode in INGEST_MODES:
+        # Time without tracemalloc, which slows allocation-heavy code down considerably
+        elapsed, _ = _in_child(_run_ingest, mode, input_file, False)
+        _, peak_memory = _in_child(_run_ingest, mode, input_file, True)
+        print(f"{mode:<12}{elapsed:>10.3f}{total_lines / elapsed:>14.0f}{peak_memory / 1024:>20.1f}")
+
+
+def _load_json_index(path):
+    """Load a JSON index the way the viewer used to and return its number of lines."""
+    with gzip.open(path, 'rb') as f:
+        return json.loads(f.read().decode('utf-8'))['total_lines']
+
+
+def _load_binary_index(path):
+    """Load a binary index and return its number of lines."""
+    with open(path, 'rb') as f:
+        return BinaryIndex(f.read()).total_lines
+
+
+def benchmark_index(input_file, repeat=5):
+    input_file = os.path.abspath(input_file)
+    print(f"Input: {input_file}")
+    print(f"{'format':<10}{'files':>8}{'total bytes':>14}{'bytes/line':>12}{'load all (ms)':>16}")
+
+    for index_format, suffix, load in (('json', '.json.gz', _load_json_index),
+                                       ('binary', '.idx', _load_binary_index)):
+        with tempfile.TemporaryDirectory() as work_dir:
+            os.chdir(work_dir)
+            processor = LogProcessor(input_file, index_format=index_format)
+            processor.split_and_compress()
+
+            paths = [os.path.join(processor.compressed_index_dir, filename)
+                     for filename in os.listdir(processor.compressed_index_dir)
+                     if filename.endswith(suffix)]
+            total_bytes = sum(os.path.getsize(path) for path in paths)
+
+            # Best of several runs, to reduce noise from the page cache and the scheduler
+            best = None
+            for _ in range(repeat):
+                start = time.perf_counter()
+                total_lines = sum(load(path) for path in paths)
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+
+            print(f"{index_format:<10}{len(paths):>8}{total_bytes:>14}"
+                  f"{total_bytes / total_lines:>12.2f}{best * 1000:>16.2f}")
+            os.chdir(os.path.dirname(work_dir))
+
+
+def _chunk_blocks(input_file, granularity):
+    """Split the log into chunks and blocks the way ingest does and return the blocks."""
+    with tempfile.TemporaryDirectory() as work_dir:
+        os.chdir(work_dir)
+        processor = LogProcessor(input_file, build_search_index=False, granularity=granularity)
+        logs_by_chunk, _, _ = processor._read_buckets(complete_end(input_file))
+        os.chdir(os.path.dirname(work_dir))
+
+    blocks = []
+    for lines in logs_by_chunk.values():
+        encoded_lines = [(line + '\n').encode('utf-8') for line in lines]
+        for first_line in range(0, len(encoded_lines), processor.block_lines):
+            blocks.append(b''.join(encoded_lines[first_line:first_line + processor.block_lines]))
+    return blocks
+
+
+def benchmark_codecs(input_file, granularity='minute', repeat=3):
+    input_file = os.path.abspath(input_file)
+    blocks = _chunk_blocks(input_file, granularity)
+    original_size = sum(len(block) for block in blocks)
+    with open(input_file, 'rb') as f:
+        sample_lines = f.read(DICTIONARY_SAMPLE_SIZE).splitlines(keepends=True)
+
+    print(f"Input: {input_file} ({original_size} bytes in {len(blocks)} blocks, {granularity} chunks)")
+    print(f"{'codec':<14}{'bytes':>12}{'ratio':>8}{'compress MB/s':>16}{'decompress MB/s':>18}")
+    for spec in CODEC_SPECS:
+        if spec.partition(':')[0] not in available_codecs():
+            print(f"{spec:<14}{'not installed':>12}")
+            continue
+        codec = get_codec(spec)
+        extra_size = 0
+        if spec.startswith('zlib-dict'):
+            # The dictionary is stored once next to the chunks
+            codec.dictionary = train_dictionary(sample_lines)
+            extra_size = len(codec.dictionary)
+
+        # Best of several runs, to reduce noise from the scheduler
+        compress_time = decompress_time = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            frames = [codec.compress(block) for block in blocks]
+            elapsed = time.perf_counter() - start
+            compress_time = elapsed if compress_time is None else min(compress_time, elapsed)
+
+            start = time.perf_counter()
+            for frame in frames:
+                codec.decompress(frame)
+            elapsed = time.perf_counter() - start
+            decompress_time = elapsed if decompress_time is None else min(decompress_time, elapsed)
+
+        compressed_size = sum(len(frame) for frame in frames) + extra_size
+        megabytes = original_size / (1024 * 1024)
+        print(f"{spec:<14}{compressed_size:>12}{original_size / compressed_size:>8.2f}"
+              f"{megabytes / compress_time:>16.1f}{megabytes / decompress_time:>18.1f}")
+
+
+def _parse_uncached(processor, lines):
+    """Parse lines the way ingest used to: regex search, strptime and strftime on every line."""
+    for line in lines:
+        match = re.search(r'(\d{4}-\d{2}-\d{2}\s\d{2}:\d{2}:\d{2})', line)
+        if match:
+            timestamp = datetime.strptime(match.group(1), '%Y-%m-%d %H:%M:%S')
+            processor._chunk_of(timestamp)
+            processor.extract_log_type(line)
+
+
+def benchmark_parse(input_file, repeat=5):
+    input_file = os.path.abspath(input_file)
+    with open(input_file, 'r', encoding='utf-8') as f:
+        lines = f.readlines()
+    with tempfile.TemporaryDirectory() as work_dir:
+        os.chdir(work_dir)
+        processor = LogProcessor(input_file)
+        os.chdir(os.path.dirname(work_dir))
+
+    def parse_with(name):
+        # A new parser per run, so every run starts with an empty timestamp cache
+        parse = get_parser(name, processor._chunk_of).parse
+        for line in lines:
+            parse(line)
+
+    parsers = {'uncached': lambda: _parse_uncached(processor, lines)}
+    for name in PARSERS:
+        parsers[name] = lambda name=name: parse_with(name)
+
+    print(f"Input: {input_file} ({len(lines)} lines)")
+    print(f"{'parser':<12}{'seconds':>10}{'lines/sec':>14}")
+    for name, run in parsers.items():
+        # Best of several runs, to reduce noise from the scheduler
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            run()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        print(f"{name:<12}{best:>10.3f}{len(lines) / best:>14.0f}")
+
+
+def benchmark_query(input_file, granularity='minute', worker_counts=(1, 2, 4, 8), repeat=3):
+    """Time a query over the whole log and its first page with different numbers of read workers."""
+    input_file = os.path.abspath(input_file)
+    with tempfile.TemporaryDirectory() as work_dir:
+        os.chdir(work_dir)
+        LogProcessor(input_file, granularity=granularity).split_and_compress()
+        start_timestamp, end_timestamp = '00:00:00', '23:59:59'
+
+        print(f"Input: {input_file} ({granularity} chunks)")
+        print(f"{'workers':<10}{'records':>10}{'full range (ms)':>18}{'first page (ms)':>18}")
+        for workers in worker_counts:
+            # Best of several runs, each with a new processor so that nothing is cached
+            full_best = page_best = None
+            for _ in range(repeat):
+                processor = LogProcessor(input_file, read_workers=workers)
+                start = time.perf_counter()
+                records = sum(1 for _ in processor.query_logs(start_timestamp, end_timestamp))
+                elapsed = time.perf_counter() - start
+                full_best = elapsed if full_best is None else min(full_best, elapsed)
+
+                processor = LogProcessor(input_file, read_workers=workers)
+                start = time.perf_counter()
+                processor.query_page(start_timestamp, end_timestamp, limit=100)
+                elapsed = time.perf_counter() - start
+                page_best = elapsed if page_best is None else min(page_best, elapsed)
+            print(f"{workers:<10}{records:>10}{full_best * 1000:>18.1f}{page_best * 1000:>18.1f}")
+        os.chdir(os.path.dirname(work_dir))
+
+
+def _percentile(values, percent):
+    """Return the nearest-rank percentile of values."""
+    ordered = sorted(values)
+    return ordered[max(math.ceil(len(ordered) * percent / 100) - 1, 0)]
+
+
+def _log_time_span(input_file):
+    """Return the timestamps (YYYY-MM-DD HH:MM:SS) of the first and last lines of a log."""
+    with open(input_file, 'rb') as f:
+        first_line = f.readline()
+        f.seek(max(os.path.getsize(input_file) - 64 * 1024, 0))
+        last_line = f.read().splitlines()[-1]
+    return first_line[:19].decode('utf-8'), last_line[:19].decode('utf-8')
+
+
+def _suite_operations(scenario, processor, settings):
+    """Return the operations of a scenario, each a function timed on its own.
+
+    Queries start at random seconds of the log, drawn from the suite's seed.
+    """
+    if scenario == 'ingest':
+        return [partial(INGEST_MODES[settings['ingest_mode']], processor)] * settings['ingest_runs']
+    if scenario == 'reset':
+        return [processor.reset_processing]
+
+    first, last = (datetime.strptime(timestamp, TIMESTAMP_FORMAT) for timestamp in settings['time_span'])
+    span = int((last - first).total_seconds())
+    range_seconds = min(settings['range_seconds'], span)
+    rng = random.Random(f"{settings['seed']}-{scenario}")
+    operations = []
+    for _ in range(settings['queries']):
+        start = first + timedelta(seconds=rng.randint(0, span - range_seconds))
+        start_timestamp = start.strftime(TIMESTAMP_FORMAT)
+        if scenario == 'point_lookup':
+            operations.append(partial(processor.view_logs_by_timestamp, start_timestamp))
+            continue
+        end_timestamp = (start + timedelta(seconds=range_seconds)).strftime(TIMESTAMP_FORMAT)
+        log_type = rng.choice(settings['levels']) if scenario == 'level_range' else None
+        operations.append(partial(processor.view_logs_by_timerange, start_timestamp, end_timestamp, log_type))
+    return operations
+
+
+def _run_suite_scenario(scenario, input_file, settings, trace_memory):
+    """Run one scenario of the suite in the current (child) process and return the
+    seconds taken by each of its operations and the peak traced memory."""
+    os.chdir(settings['work_dir'])
+    processor = LogProcessor(input_file, granularity=settings['granularity'], codec=settings['codec'])
+    operations = _suite_operations(scenario, processor, settings)
+
+    # The views print every record they find; keep it out of the results
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        if scenario == 'reset' and trace_memory:
+            # The timed run deleted the output; make it again to have something to delete
+            INGEST_MODES[settings['ingest_mode']](processor)
+        if trace_memory:
+            tracemalloc.start()
+        latencies = []
+        for operation in operations:
+            if scenario == 'ingest':
+                processor.reset_processing()
+            start = time.perf_counter()
+            operation()
+            latencies.append(time.perf_counter() - start)
+        peak_memory = None
+        if trace_memory:
+            _, peak_memory = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+    return latencies, peak_memory
+
+
+def _compare_suites(baseline, results):
+    """Print the change of every scenario's measurements since a baseline run."""
+    if baseline.get('config') != results['config']:
+        print("Warning: the baseline was run with different options; the numbers may not compare")
+    print(f"{'scenario':<14}{'measure':<20}{'baseline':>14}{'this run':>14}{'change':>10}")
+    for scenario, values in results['scenarios'].items():
+        old_values = baseline.get('scenarios', {}).get(scenario)
+        if old_values is None:
+            continue
+        for measure in ('operations_per_sec', 'p50_ms', 'p99_ms', 'peak_memory_bytes'):
+            old, new = old_values.get(measure), values[measure]
+            change = f"{(new - old) / old * 100:+.1f}%" if old else '-'
+            print(f"{scenario:<14}{measure:<20}{old if old is not None else '-':>14}{new:>14}{change:>10}")
+
+
+def benchmark_suite(log_file=None, size=parse_size('20MB'), span_seconds=3600, skew=1.0, level_mix=None,
+                    seed=0, granularity='minute', codec='gzip', ingest_mode='streaming', ingest_runs=1,
+                    queries=200, range_seconds=300, output='benchmark_results.json', compare=None):
+    """Run the suite's scenarios on log_file, or on a log generated from size,
+    span_seconds, skew, level_mix and seed, and write the results to output."""
+    level_mix = level_mix or DEFAULT_LEVEL_MIX
+    config = {
+        'log_file': os.path.abspath(log_file) if log_file else None,
+        'generator': None if log_file else {'size': size, 'span_seconds': span_seconds, 'skew': skew,
+                                            'level_mix': level_mix, 'start': DEFAULT_START, 'seed': seed},
+        'granularity': granularity,
+        'codec': codec,
+        'ingest_mode': ingest_mode,
+        'ingest_runs': ingest_runs,
+        'queries': queries,
+        'range_seconds': range_seconds,
+        'seed': seed
+    }
+    with tempfile.TemporaryDirectory() as work_dir:
+        if log_file:
+            input_file = os.path.abspath(log_file)
+        else:
+            input_file = os.path.join(work_dir, 'generated.log')
+            LogGenerator(size, span_seconds, skew, level_mix, DEFAULT_START, seed).write(input_file)
+        with open(input_file, 'rb') as f:
+            total_lines = sum(1 for _ in f)
+        input_size = os.path.getsize(input_file)
+        settings = {
+            **config,
+            'work_dir': work_dir,
+            'time_span': _log_time_span(input_file),
+            # Level filters of the level_range queries
+            'levels': [level for level, weight in level_mix.items() if weight > 0] if not log_file else list(LOG_TYPES[1:])
+        }
+
+        print(f"Input: {input_file} ({input_size} bytes, {total_lines} lines)")
+        print(f"{'scenario':<14}{'ops':>6}{'ops/sec':>12}{'p50 (ms)':>12}{'p99 (ms)':>12}{'peak memory (KB)':>20}")
+        scenarios = {}
+        for scenario in SUITE_SCENARIOS:
+            # Time without tracemalloc, which slows allocation-heavy code down considerably
+            latencies, _ = _in_child(_run_suite_scenario, scenario, input_file, settings, False)
+            _, peak_memory = _in_child(_run_suite_scenario, scenario, input_file, settings, True)
+            total = sum(latencies)
+            values = {
+                'operations': len(latencies),
+                'seconds': round(total, 6),
+                'operations_per_sec': round(len(latencies) / total, 3) if total else None,
+                'p50_ms': round(_percentile(latencies, 50) * 1000, 3),
+                'p99_ms': round(_percentile(latencies, 99) * 1000, 3),
+                'max_ms': round(max(latencies) * 1000, 3),
+                'peak_memory_bytes': peak_memory
+            }
+            if scenario == 'ingest':
+                values['lines_per_sec'] = round(total_lines * len(latencies) / total)
+                values['bytes_per_sec'] = round(input_size * len(latencies) / total)
+            scenarios[scenario] = values
+            print(f"{scenario:<14}{values['operations']:>6}{values['operations_per_sec'] or 0:>12.1f}"
+                  f"{values['p50_ms']:>12.1f}{values['p99_ms']:>12.1f}{peak_memory / 1024:>20.1f}")
+            if scenario == 'ingest':
+                print(f"{'':<14}{values['lines_per_sec']} lines/sec, "
+                      f"{values['bytes_per_sec'] / (1024 * 1024):.1f} MB/sec")
+
+    results = {
+        'version': SUITE_RESULTS_VERSION,
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'environment': {'python': platform.python_version(), 'platform': platform.platform(),
+                        'cpus': os.cpu_count()},
+        'config': config,
+        'input': {'bytes': input_size, 'lines': total_lines},
+        'scenarios': scenarios
+    }
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {output}")
+
+    if compare:
+        with open(compare, 'r', encoding='utf-8') as f:
+            _compare_suites(json.load(f), results)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks for the log processor")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    ingest_parser = subparsers.add_parser('ingest', help="compare peak memory and throughput of ingest modes")
+    ingest_parser.add_argument('log_file', nargs='?', default=DEFAULT_LOG_FILE)
+
+    index_parser = subparsers.add_parser('index', help="compare size and load time of JSON and binary indexes")
+    index_parser.add_argument('log_file', nargs='?', default=DEFAULT_LOG_FILE)
+
+    codecs_parser = subparsers.add_parser('codecs', help="compare ratio and speed of chunk compression codecs")
+    codecs_parser.add_argument('log_file', nargs='?', default=DEFAULT_LOG_FILE)
+    codecs_parser.add_argument('--granularity', choices=list(KEY_FORMATS), default='minute')
+
+    parse_parser = subparsers.add_parser('parse', help="compare the speed of the line parsers")
+    parse_parser.add_argument('log_file', nargs='?', default=DEFAULT_LOG_FILE)
+
+    query_parser = subparsers.add_parser('query', help="compare wide-range query latency by number of read workers")
+    query_parser.add_argument('log_file', nargs='?', default=DEFAULT_LOG_FILE)
+    query_parser.add_argument('--granularity', choices=list(KEY_FORMATS), default='minute')
+
+    suite_parser = subparsers.add_parser('suite', help="run ingest and query scenarios on a generated log and save the results as JSON")
+    suite_parser.add_argument('--log-file', help="use this log instead of a generated one")
+    suite_parser.add_argument('--size', type=parse_size, default=parse_size('20MB'), help="approximate size of the generated log, e.g. 500KB, 20MB")
+    suite_parser.add_argument('--span', type=int, default=3600, help="seconds covered by the generated log")
+    suite_parser.add_argument('--skew', type=float, default=1.0, help="how unevenly lines are spread over the seconds (0: evenly)")
+    suite_parser.add_argument('--levels', type=parse_level_mix, default=DEFAULT_LEVEL_MIX,
+                              help="relative weight of each level, e.g. INFO=52,WARN=40,ERROR=7.5,FATAL=0.5")
+    suite_parser.add_argument('--seed', type=int, default=0, help="seed of the generated log and of the queries")
+    suite_parser.add_argument('--granularity', choices=list(KEY_FORMATS), default='minute')
+    suite_parser.add_argument('--codec', default='gzip')
+    suite_parser.add_argument('--ingest-mode', choices=list(INGEST_MODES), default='streaming')
+    suite_parser.add_argument('--ingest-runs', type=int, default=1, help="number of times the log is ingested")
+    suite_parser.add_argument('--queries', type=int, default=200, help="queries of each query scenario")
+    suite_parser.add_argument('--range-seconds', type=int, default=300, help="seconds covered by each range query")
+    suite_parser.add_argument('--output', default='benchmark_results.json', help="file the results are written to")
+    suite_parser.add_argument('--compare', help="results of an earlier run to compare with")
+
+    args = parser.parse_args()
+    if args.command == 'ingest':
+        benchmark_ingest(args.log_file)
+    elif args.command == 'index':
+        benchmark_index(args.log_file)
+    elif args.command == 'codecs':
+        benchmark_codecs(args.log_file, args.granularity)
+    elif args.command == 'parse':
+        benchmark_parse(args.log_file)
+    elif args.command == 'query':
+        benchmark_query(args.log_file, args.granularity)
+    elif args.command == 'suite':
+        benchmark_suite(args.log_file, args.size, args.span, args.skew, args.levels, args.seed, args.granularity,
+                        args.codec, args.ingest_mode, args.ingest_runs, args.queries, args.range_seconds,
+                        args.output, args.compare)
+
+
+if __name__ == "__main__":
+    main()
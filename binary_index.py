@@ -0,0 +1,147 @@
+"""Compact binary format for per-chunk index files.
+
+Layout of an .idx file (all integers little-endian):
+
+    header   4s magic b'LIDX', B version, B flags, 2 pad bytes, I total_lines
+    types    total_lines bytes, one log type code per line (see LOG_TYPES)
+    padding  zero bytes up to the next multiple of 4
+    offsets  total_lines + 1 unsigned 32-bit byte offsets of each line in the
+             decompressed chunk, the last one being the chunk length
+    seconds  only if flags has FLAG_SECONDS: total_lines unsigned 16-bit
+             offsets of each line's timestamp from the start of the chunk, in
+             seconds, so a chunk spanning a minute or an hour can be filtered
+             to single seconds without parsing its lines
+    blocks   only if flags has FLAG_BLOCKS: zero bytes up to the next multiple
+             of 4, I block_count, then block_count + 1 first line numbers and
+             block_count + 1 byte offsets of each block in the compressed chunk
+             (the last ones being total_lines and the compressed chunk size)
+
+A chunk with a block table is a series of independently compressed gzip
+members, so the lines of one block can be read without decompressing the
+rest of the chunk.
+
+Version 1 files (no flags, no seconds) are still readable.
+
+The file is used as it is read: log types and offsets are exposed as
+memoryview slices of the file contents, so loading an index costs no parsing.
+"""
+import struct
+import sys
+from array import array
+from bisect import bisect_right
+
+# Log types in code order; code 0 is used for lines without a known log type
+LOG_TYPES = ('UNKNOWN', 'INFO', 'ERROR', 'WARN', 'DEBUG', 'FATAL')
+LOG_TYPE_CODES = {log_type: code for code, log_type in enumerate(LOG_TYPES)}
+
+MAGIC = b'LIDX'
+VERSION = 2
+HEADER = struct.Struct('<4sBB2xI')
+FLAG_SECONDS = 1
+FLAG_BLOCKS = 2
+BLOCK_COUNT = struct.Struct('<I')
+
+
+def encode_index(log_type_codes, line_lengths, second_offsets=None, blocks=None):
+    """Build an index file from per-line log type codes and encoded line lengths.
+
+    line_lengths include the trailing newline of each line. second_offsets, if
+    given, holds the offset in seconds of each line from the start of the chunk.
+    blocks, if given, is a pair of lists of the first line number and the
+    compressed byte offset of each block, both ending with the totals.
+    """
+    total_lines = len(log_type_codes)
+    offsets = array('I', [0])
+    position = 0
+    for length in line_lengths:
+        position += length
+        offsets.append(position)
+    flags = 0
+    seconds = array('H')
+    if second_offsets is not None:
+        flags |= FLAG_SECONDS
+        seconds.extend(second_offsets)
+    block_table = array('I')
+    if blocks is not None:
+        flags |= FLAG_BLOCKS
+        first_lines, block_offsets = blocks
+        block_table.extend(first_lines)
+        block_table.extend(block_offsets)
+    if sys.byteorder != 'little':
+        offsets.byteswap()
+        seconds.byteswap()
+        block_table.byteswap()
+
+    padding = -(HEADER.size + total_lines) % 4
+    parts = [
+        HEADER.pack(MAGIC, VERSION, flags, total_lines),
+        bytes(log_type_codes),
+        b'\0' * padding,
+        offsets.tobytes(),
+        seconds.tobytes()
+    ]
+    if blocks is not None:
+        parts.append(b'\0' * (len(seconds) * 2 % 4))
+        parts.append(BLOCK_COUNT.pack(len(first_lines) - 1))
+        parts.append(block_table.tobytes())
+    return b''.join(parts)
+
+
+def _cast(view, typecode):
+    """Return a little-endian slice of the file as an array-like view of typecode items."""
+    if sys.byteorder == 'little':
+        return view.cast(typecode)
+    # Big-endian hosts need a swapped copy
+    swapped = array(typecode, view.tobytes())
+    swapped.byteswap()
+    return memoryview(swapped)
+
+
+class BinaryIndex:
+    """Read-only view over the contents of an .idx file."""
+
+    def __init__(self, data):
+        view = memoryview(data)
+        magic, version, flags, total_lines = HEADER.unpack_from(view)
+        if magic != MAGIC or version not in (1, VERSION):
+            raise ValueError("Not a binary index file")
+
+        self.total_lines = total_lines
+        self.nbytes = len(view)
+        types_end = HEADER.size + total_lines
+        self.log_types = view[HEADER.size:types_end]
+
+        offsets_start = types_end + (-types_end % 4)
+        offsets_end = offsets_start + 4 * (total_lines + 1)
+        self.offsets = _cast(view[offsets_start:offsets_end], 'I')
+        # Second offset of each line within the chunk; None for one-second chunks
+        self.seconds = None
+        seconds_end = offsets_end
+        if flags & FLAG_SECONDS:
+            seconds_end += 2 * total_lines
+            self.seconds = _cast(view[offsets_end:seconds_end], 'H')
+
+        # First line and compressed offset of each block, each followed by the totals;
+        # None if the chunk has to be decompressed as a whole
+        self.block_first_lines = self.block_offsets = None
+        if flags & FLAG_BLOCKS:
+            table_start = seconds_end + (-seconds_end % 4)
+            (block_count,) = BLOCK_COUNT.unpack_from(view, table_start)
+            first_lines_start = table_start + BLOCK_COUNT.size
+            block_offsets_start = first_lines_start + 4 * (block_count + 1)
+            self.block_first_lines = _cast(view[first_lines_start:block_offsets_start], 'I')
+            self.block_offsets = _cast(view[block_offsets_start:block_offsets_start + 4 * (block_count + 1)], 'I')
+
+    def line(self, chunk_data, position):
+        """Return line number position (0-based) of the decompressed chunk, without its newline."""
+        return chunk_data[self.offsets[position]:self.offsets[position + 1] - 1]
+
+    def block_of(self, position):
+        """Return the number of the block holding line number position."""
+        return bisect_right(self.block_first_lines, position) - 1
+
+    def block_line(self, block_data, block, position):
+        """Return line number position of the decompressed block, without its newline."""
+        block_start = self.offsets[self.block_first_lines[block]]
+        return block_data[self.offsets[position] - block_start:self.offsets[position + 1] - 1 - block_start]
+
@@ -0,0 +1,64 @@
+import threading
+from collections import OrderedDict
+
+
+class ChunkCache:
+    """Memory-bounded LRU cache of decompressed chunks and loaded indexes.
+
+    Entries are evicted least recently used first once the total size of the
+    cached values goes over max_bytes. Values larger than max_bytes are not
+    cached at all. Safe to use from several threads.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # key -> (value, size), least recently used first
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the cached value for key, or None if it is not cached."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value, size):
+        """Cache value under key, counting size bytes against the budget."""
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old_entry = self._entries.pop(key, None)
+            if old_entry is not None:
+                self.current_bytes -= old_entry[1]
+            self._entries[key] = (value, size)
+            self.current_bytes += size
+
+            while self.current_bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted_size
+                self.evictions += 1
+
+    def clear(self):
+        """Drop all cached values, keeping the counters."""
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self.current_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+            }
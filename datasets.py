@@ -0,0 +1,188 @@
+"""Named datasets, each processed into its own storage directory.
+
+A dataset is a directory under the registry root:
+
+    datasets/<name>/dataset.json   the log file the dataset was processed from
+    datasets/<name>/uploads/       uploaded log files
+    datasets/<name>/chunks/, indexes/, compressed_chunks/, compressed_index/
+
+The registry keeps one LogProcessor per dataset, so manifests, indexes and
+decompressed chunks stay cached between requests. Every dataset has a
+read-write lock: queries share it, ingest and reset take it alone.
+"""
+import json
+import os
+import re
+import threading
+from contextlib import contextmanager
+
+from log_splitter import LogProcessor
+from metrics import Metrics
+
+DATASET_NAME_PATTERN = re.compile(r'[A-Za-z0-9_-]{1,64}')
+DEFAULT_DATASET = 'default'
+
+
+class ReadWriteLock:
+    """A lock held either by any number of readers or by a single writer.
+
+    Waiting writers go first, so a steady stream of queries cannot hold off an
+    ingest forever.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._readers = 0
+        self._writer = False
+        self._waiting_writers = 0
+
+    def acquire_read(self):
+        with self._condition:
+            while self._writer or self._waiting_writers:
+                self._condition.wait()
+            self._readers += 1
+
+    def release_read(self):
+        with self._condition:
+            self._readers -= 1
+            if not self._readers:
+                self._condition.notify_all()
+
+    def acquire_write(self):
+        with self._condition:
+            self._waiting_writers += 1
+            while self._writer or self._readers:
+                self._condition.wait()
+            self._waiting_writers -= 1
+            self._writer = True
+
+    def release_write(self):
+        with self._condition:
+            self._writer = False
+            self._condition.notify_all()
+
+    @contextmanager
+    def read_locked(self):
+        self.acquire_read()
+        try:
+            yield
+        finally:
+            self.release_read()
+
+    @contextmanager
+    def write_locked(self):
+        self.acquire_write()
+        try:
+            yield
+        finally:
+            self.release_write()
+
+
+class Dataset:
+    """One named dataset: its directories, its lock and its processor (None until
+    a log file has been processed into it)."""
+
+    def __init__(self, name, root, processor_options):
+        self.name = name
+        self.root = root
+        self.processor_options = processor_options
+        self.upload_dir = os.path.join(root, 'uploads')
+        self.metadata_path = os.path.join(root, 'dataset.json')
+        self.lock = ReadWriteLock()
+        # Timers and counters of the dataset, kept when its processor is replaced by a new upload
+        self.metrics = Metrics()
+        self.processor = None
+        self._manifest_mtime = None
+
+    def has_processed_logs(self):
+        """Whether logs have been processed into the dataset (and not reset since)."""
+        chunks_dir = os.path.join(self.root, 'compressed_chunks')
+        return os.path.isdir(chunks_dir) and bool(os.listdir(chunks_dir))
+
+    def open_processor(self, input_file, **options):
+        """Create the processor of this dataset for input_file and remember the file.
+
+        Call with the write lock held. options override the registry's processor options.
+        """
+        self.processor = LogProcessor(input_file, storage_root=self.root, metrics=self.metrics,
+                                      **{**self.processor_options, **options})
+        with open(self.metadata_path, 'w', encoding='utf-8') as f:
+            json.dump({'input_file': os.path.abspath(input_file)}, f)
+        return self.processor
+
+    def open_existing(self):
+        """Reopen the processor of a dataset processed by an earlier run, if any."""
+        if not os.path.exists(self.metadata_path):
+            return
+        with open(self.metadata_path, 'r', encoding='utf-8') as f:
+            input_file = json.load(f)['input_file']
+        if os.path.exists(input_file):
+            self.processor = LogProcessor(input_file, storage_root=self.root, metrics=self.metrics,
+                                          **self.processor_options)
+            # Load the manifest now rather than on the first query
+            self._manifest_mtime = self._current_manifest_mtime()
+            self.processor._load_manifest()
+
+    def _current_manifest_mtime(self):
+        try:
+            return os.stat(self.processor.manifest_path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def refresh(self):
+        """Reload the processor's manifest if it has been rewritten since it was loaded,
+        e.g. by an ingest in another server process."""
+        if self.processor is None:
+            return
+        mtime = self._current_manifest_mtime()
+        if mtime != self._manifest_mtime:
+            with self.lock.write_locked():
+                self.processor.reload()
+                self._manifest_mtime = mtime
+
+
+class DatasetRegistry:
+    """The datasets under root, opened on first use and kept open.
+
+    processor_options are passed to every LogProcessor the registry creates.
+    """
+
+    def __init__(self, root='datasets', **processor_options):
+        self.root = root
+        self.processor_options = processor_options
+        self._datasets = {}
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def names(self):
+        """Return the sorted names of all datasets, open or not."""
+        with self._lock:
+            names = set(self._datasets)
+        names.update(name for name in os.listdir(self.root)
+                     if DATASET_NAME_PATTERN.fullmatch(name) and os.path.isdir(os.path.join(self.root, name)))
+        return sorted(names)
+
+    def open_datasets(self):
+        """Return the datasets opened so far, sorted by name."""
+        with self._lock:
+            return [self._datasets[name] for name in sorted(self._datasets)]
+
+    def get(self, name, create=False):
+        """Return the dataset called name, or None if it does not exist and create is False.
+
+        A dataset processed by an earlier run gets its processor back, with the
+        manifest loaded, the first time it is asked for.
+        """
+        if not DATASET_NAME_PATTERN.fullmatch(name or ''):
+            raise ValueError("Dataset names are 1 to 64 letters, digits, '-' or '_'")
+        with self._lock:
+            dataset = self._datasets.get(name)
+            if dataset is None:
+                root = os.path.join(self.root, name)
+                if not create and not os.path.isdir(root):
+                    return None
+                dataset = self._datasets[name] = Dataset(name, root, self.processor_options)
+                os.makedirs(dataset.upload_dir, exist_ok=True)
+                dataset.open_existing()
+        dataset.refresh()
+        return dataset
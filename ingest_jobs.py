@@ -0,0 +1,340 @@
+"""Resumable uploads and background ingest jobs.
+
+An upload is written to disk one slice at a time as the client sends it
+(UploadSession), so a large log file is never held in memory, and a client
+whose connection drops asks how much arrived and carries on from there. Once
+the whole file is there, it is ingested by an IngestJob on the JobManager's
+worker threads; the job's status reports the lines and bytes processed so
+far, the throughput and an estimate of the time left.
+
+Sessions and jobs are kept in memory, so they do not survive a restart of
+the server.
+"""
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+
+from metrics import profiled, write_profile
+
+logger = logging.getLogger(__name__)
+
+# Bytes read from the request at a time while an upload slice is written to disk
+UPLOAD_BUFFER_SIZE = 1024 * 1024
+# Uploads that have not received data for this long are dropped with their data
+UPLOAD_EXPIRY_SECONDS = 24 * 3600
+# Finished jobs whose status is kept; older ones are forgotten
+MAX_FINISHED_JOBS = 100
+
+
+def staging_path(dataset, filename):
+    """Return a path in the dataset's upload directory where an upload of filename is
+    kept until its ingest job moves it into place."""
+    return os.path.join(dataset.upload_dir, f"{filename}.{uuid.uuid4().hex}.part")
+
+
+def move_upload(part_path, path):
+    """Move a complete upload to path and return path.
+
+    An existing file of the same name is overwritten in place rather than
+    replaced, like a form upload used to be, so incremental ingest still
+    recognises it as the file it has read before.
+    """
+    if os.path.exists(path):
+        with open(part_path, 'rb') as source, open(path, 'wb') as target:
+            shutil.copyfileobj(source, target, UPLOAD_BUFFER_SIZE)
+        os.unlink(part_path)
+    else:
+        os.replace(part_path, path)
+    return path
+
+
+class UploadSession:
+    """A file being uploaded into a dataset, in slices sent in order.
+
+    The data is written to a '.part' file in the dataset's upload directory;
+    offset is the number of bytes received so far.
+    """
+
+    def __init__(self, upload_id, dataset, filename, size, options):
+        self.id = upload_id
+        self.dataset = dataset
+        self.filename = filename
+        self.size = size
+        self.options = options  # Ingest options: 'append', 'granularity' and 'profile'
+        self.path = os.path.join(dataset.upload_dir, filename)
+        self.part_path = os.path.join(dataset.upload_dir, f"{filename}.{upload_id}.part")
+        self.offset = 0
+        self.updated = time.time()
+        self.job_id = None  # Ingest job started once the upload is complete
+        self._lock = threading.Lock()
+        open(self.part_path, 'wb').close()
+
+    @property
+    def complete(self):
+        return self.offset == self.size
+
+    def write(self, offset, stream):
+        """Write the data read from stream at offset and return the new offset.
+
+        offset must be the number of bytes received so far. If stream breaks off,
+        what was read of it is kept and the offset tells the client where to resume.
+        """
+        with self._lock:
+            if offset != self.offset:
+                raise ValueError(f"Upload is at offset {self.offset}, not {offset}")
+            with open(self.part_path, 'ab') as f:
+                while True:
+                    data = stream.read(UPLOAD_BUFFER_SIZE)
+                    if not data:
+                        break
+                    if self.offset + len(data) > self.size:
+                        raise ValueError(f"Upload is larger than its declared size of {self.size} bytes")
+                    f.write(data)
+                    self.offset += len(data)
+                    self.updated = time.time()
+            return self.offset
+
+    def finish(self):
+        """Move the complete upload to its file name (see move_upload) and return its path.
+
+        Call with the dataset's write lock held.
+        """
+        return move_upload(self.part_path, self.path)
+
+    def discard(self):
+        if os.path.exists(self.part_path):
+            os.unlink(self.part_path)
+
+    def status(self):
+        return {
+            'upload_id': self.id,
+            'dataset': self.dataset.name,
+            'filename': self.filename,
+            'size': self.size,
+            'offset': self.offset,
+            'job_id': self.job_id
+        }
+
+
+class IngestJob:
+    """The ingest of one file into a dataset, run in the background.
+
+    state goes from 'queued' to 'running', then to 'done' with the ingest's
+    result or to 'failed' with an error message.
+    """
+
+    def __init__(self, job_id, dataset_name, filename):
+        self.id = job_id
+        self.dataset_name = dataset_name
+        self.filename = filename
+        self.state = 'queued'
+        self.lines_processed = 0
+        self.bytes_processed = 0
+        self.bytes_total = None
+        self.result = None
+        self.error = None
+        self.profile = None  # Name of the profile report written for the job, if it was profiled
+        self.created = time.time()
+        self._started = None  # time.monotonic() values, for rates
+        self._finished = None
+
+    def start(self):
+        self.state = 'running'
+        self._started = time.monotonic()
+
+    def finish(self, result):
+        self._finished = time.monotonic()
+        self.result = result
+        self.state = 'done'
+
+    def fail(self, error):
+        self._finished = time.monotonic()
+        self.error = error
+        self.state = 'failed'
+
+    def update(self, lines, bytes_processed, bytes_total):
+        """Progress callback of the LogProcessor running the ingest."""
+        self.lines_processed = lines
+        self.bytes_processed = bytes_processed
+        self.bytes_total = bytes_total
+
+    def status(self):
+        """Return the job's state and progress as a dict, with the rate in bytes per
+        second and the estimated seconds left (None until they can be estimated)."""
+        elapsed = 0.0
+        if self._started is not None:
+            elapsed = (self._finished or time.monotonic()) - self._started
+        bytes_per_sec = self.bytes_processed / elapsed if elapsed > 0 else None
+        eta_seconds = None
+        if self.state == 'running' and bytes_per_sec and self.bytes_total is not None:
+            eta_seconds = max(self.bytes_total - self.bytes_processed, 0) / bytes_per_sec
+        return {
+            'job_id': self.id,
+            'dataset': self.dataset_name,
+            'filename': self.filename,
+            'state': self.state,
+            'lines_processed': self.lines_processed,
+            'bytes_processed': self.bytes_processed,
+            'bytes_total': self.bytes_total,
+            'elapsed_seconds': round(elapsed, 3),
+            'bytes_per_sec': round(bytes_per_sec) if bytes_per_sec is not None else None,
+            'lines_per_sec': round(self.lines_processed / elapsed) if elapsed > 0 else None,
+            'eta_seconds': round(eta_seconds, 1) if eta_seconds is not None else None,
+            'result': self.result,
+            'error': self.error,
+            'profile': self.profile
+        }
+
+
+class JobManager:
+    """Upload sessions and the ingest jobs run by a pool of worker threads.
+
+    Jobs of one dataset take turns through the dataset's write lock; jobs of
+    different datasets run side by side, up to workers at a time. Profile
+    reports of jobs are written to profile_dir.
+    """
+
+    def __init__(self, workers=2, profile_dir='profiles'):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='ingest')
+        self.profile_dir = profile_dir
+        self._jobs = OrderedDict()
+        self._uploads = {}
+        self._lock = threading.Lock()
+
+    def create_upload(self, dataset, filename, size, options):
+        """Start an upload of size bytes into dataset, to be ingested with options."""
+        self._expire_uploads()
+        session = UploadSession(uuid.uuid4().hex, dataset, filename, size, options)
+        with self._lock:
+            self._uploads[session.id] = session
+        return session
+
+    def get_upload(self, upload_id):
+        with self._lock:
+            return self._uploads.get(upload_id)
+
+    def complete_upload(self, session):
+        """Start the ingest job of a complete upload and return it; a session only
+        ever starts one job, later calls return the same one."""
+        with session._lock:
+            if session.job_id is None:
+                job = self.submit_ingest(session.dataset, session.filename, session.options, session=session)
+                session.job_id = job.id
+        return self.get(session.job_id)
+
+    def _expire_uploads(self):
+        cutoff = time.time() - UPLOAD_EXPIRY_SECONDS
+        with self._lock:
+            expired = [session for session in self._uploads.values() if session.updated < cutoff]
+            for session in expired:
+                del self._uploads[session.id]
+        for session in expired:
+            session.discard()
+
+    def submit_ingest(self, dataset, input_file, options, session=None, upload_path=None):
+        """Queue the ingest of input_file into dataset and return its job.
+
+        options['append'] ingests only the lines not ingested yet into the
+        dataset's processed logs (if it has any); otherwise the file is processed
+        from scratch with options['granularity']. options['profile'] ('cpu',
+        'memory' or 'cpu,memory') profiles the ingest (see metrics.profiled).
+        With a session, input_file is its file name; with an upload_path (see
+        staging_path), the file was saved there. Either way the upload is moved to
+        input_file when the job starts, unless the job is rejected (see check_ingest),
+        in which case the upload is deleted.
+        """
+        job = IngestJob(uuid.uuid4().hex, dataset.name, os.path.basename(input_file))
+        with self._lock:
+            self._jobs[job.id] = job
+            self._forget_finished_jobs()
+        self._executor.submit(self._run, job, dataset, input_file, options, session, upload_path)
+        return job
+
+    @staticmethod
+    def check_ingest(dataset, options):
+        """Raise ValueError if an ingest with options cannot run on dataset.
+
+        A file is only processed from scratch into a dataset without processed
+        logs: the ingest would find the old output and keep it, while the
+        dataset would be pointed at the new file.
+        """
+        if not options.get('append') and dataset.has_processed_logs():
+            raise ValueError("The dataset already has processed logs; reset it first or upload with append")
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _forget_finished_jobs(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.state in ('done', 'failed')]
+        for job_id in finished[:len(finished) - MAX_FINISHED_JOBS]:
+            del self._jobs[job_id]
+
+    def _run(self, job, dataset, input_file, options, session, upload_path):
+        kinds = (options.get('profile') or '').split(',')
+        profiler = profiled('cpu' in kinds, 'memory' in kinds) if options.get('profile') else nullcontext()
+        report = None
+        try:
+            # Nothing else may use the dataset's files while they are rewritten
+            with dataset.lock.write_locked():
+                job.start()
+                try:
+                    # Checked before the upload is moved over a file the dataset may use
+                    self.check_ingest(dataset, options)
+                except ValueError:
+                    if session is not None:
+                        session.discard()
+                    elif upload_path is not None and os.path.exists(upload_path):
+                        os.unlink(upload_path)
+                    raise
+                if session is not None:
+                    input_file = session.finish()
+                elif upload_path is not None:
+                    input_file = move_upload(upload_path, input_file)
+                with profiler as report:
+                    result = self._ingest(job, dataset, input_file, options)
+        except Exception as e:
+            logger.exception("Ingest job %s failed", job.id)
+            job.fail(str(e))
+        else:
+            job.finish(result)
+        if report:
+            os.makedirs(self.profile_dir, exist_ok=True)
+            write_profile(report, os.path.join(self.profile_dir, f"job-{job.id}"))
+            job.profile = f"job-{job.id}"
+
+    def _ingest(self, job, dataset, input_file, options):
+        processor = dataset.processor
+        if processor is not None:
+            processor.last_ingest_summary = None
+        if options.get('append') and processor is not None:
+            # Append the new lines of the file to the logs already processed
+            processor.progress = job.update
+            try:
+                new_lines = processor.ingest_incremental(input_file)
+            finally:
+                processor.progress = None
+            message = f'Appended {new_lines} new log lines'
+            chunks = len(processor.chunk_stats)
+        else:
+            processor = dataset.open_processor(input_file, granularity=options.get('granularity', 'minute'))
+            # The streaming ingest compresses as it reads, so its progress covers the whole ingest
+            processor.progress = job.update
+            try:
+                chunks = processor.split_by_second_streaming()
+            finally:
+                processor.progress = None
+            message = 'File processed successfully'
+        return {
+            'message': message,
+            'chunks': chunks,
+            'size_comparison': processor.get_total_size_comparison(),
+            # Duration, throughput and time per stage (see LogProcessor._ingest_summary)
+            'summary': processor.last_ingest_summary
+        }
@@ -0,0 +1,541 @@
+"""Token-level inverted index over the lines of all chunks.
+
+Each term (a lowercased run of letters, digits and underscores) maps to a
+posting list of (chunk, line position) pairs. Posting lists are sorted,
+delta-encoded as varints and, when that makes them smaller, zlib-compressed.
+
+File layout:
+
+    I        length of the compressed dictionary
+    dict     zlib-compressed JSON: {"chunks": [chunk keys], "terms": {term: [offset, length, zlib flag]}}
+    postings posting lists, at the offsets given in the dictionary
+
+While a large log is indexed, the builder spills its posting lists to sorted
+run files and merges them term by term at the end, so its memory does not
+grow with the log.
+
+Lines appended later go to delta segments next to the index file
+(search_index.bin, then search_index.1.bin, search_index.2.bin, ...), so an
+append writes only its own lines. A segment is merged into the one before it
+once that is no more than twice its size, which keeps the number of segments
+logarithmic in the size of the index. Lines appended while no index was being
+built are listed in search_index.unindexed.json (chunk key -> first line
+position not indexed) and are scanned by searches instead.
+"""
+import heapq
+import json
+import os
+import re
+import shutil
+import struct
+import zlib
+from array import array
+from itertools import chain, groupby
+from operator import add, itemgetter
+
+TOKEN_PATTERN = re.compile(r'[A-Za-z0-9_]+')
+# Leading timestamp of a log line; times are searched with the time filters instead
+TIMESTAMP_PREFIX = re.compile(r'\d{4}-\d{2}-\d{2}\s\d{2}:\d{2}:\d{2}(,\d+)?')
+DICTIONARY_LENGTH = struct.Struct('<I')
+# Posting lists shorter than this are not worth the zlib header
+MIN_COMPRESSED_LENGTH = 64
+# A builder with a spill path writes what it has collected to a run file once it
+# holds this many (chunk, position) pairs or this many terms
+MAX_BUILDER_PAIRS = 1 << 20
+MAX_BUILDER_TERMS = 1 << 16
+# Runs merged at once; more are first merged into a single run
+MAX_MERGED_RUNS = 64
+# Run record: term length and posting array length in bytes, followed by both
+RUN_RECORD = struct.Struct('<II')
+# A segment is merged into the one before it when that is at most this many times its size
+SEGMENT_SIZE_RATIO = 2
+
+
+def tokenize(text):
+    """Return the set of lowercased search terms in a log line or query."""
+    match = TIMESTAMP_PREFIX.match(text)
+    if match:
+        text = text[match.end():]
+    return {token.lower() for token in TOKEN_PATTERN.findall(text)}
+
+
+def encode_varints(numbers):
+    data = bytearray()
+    for number in numbers:
+        while number >= 0x80:
+            data.append((number & 0x7f) | 0x80)
+            number >>= 7
+        data.append(number)
+    return bytes(data)
+
+
+def decode_varints(data):
+    numbers = []
+    number = shift = 0
+    for byte in data:
+        number |= (byte & 0x7f) << shift
+        if byte & 0x80:
+            shift += 7
+        else:
+            numbers.append(number)
+            number = shift = 0
+    return numbers
+
+
+def encode_postings(pairs):
+    """Return the posting list blob of sorted (chunk number, line position) pairs and
+    whether it is zlib-compressed."""
+    # Chunk ids as deltas; positions as deltas within a chunk, absolute otherwise
+    numbers = []
+    previous_chunk = previous_position = 0
+    for chunk, position in pairs:
+        if chunk == previous_chunk:
+            numbers.extend((0, position - previous_position))
+        else:
+            numbers.extend((chunk - previous_chunk, position))
+        previous_chunk, previous_position = chunk, position
+    blob = encode_varints(numbers)
+
+    if len(blob) >= MIN_COMPRESSED_LENGTH:
+        packed = zlib.compress(blob)
+        if len(packed) < len(blob):
+            return packed, 1
+    return blob, 0
+
+
+def decode_postings(blob, compressed):
+    """Return the (chunk number, line position) pairs of a posting list blob."""
+    if compressed:
+        blob = zlib.decompress(blob)
+    numbers = decode_varints(blob)
+
+    pairs = []
+    chunk = position = 0
+    for i in range(0, len(numbers), 2):
+        chunk_delta, value = numbers[i], numbers[i + 1]
+        if chunk_delta:
+            chunk += chunk_delta
+            position = value
+        else:
+            position += value
+        pairs.append((chunk, position))
+    return pairs
+
+
+class InvertedIndexBuilder:
+    """Collects the terms of every line during ingest and writes the index file.
+
+    With a spill_path, the posting lists collected so far are written to a
+    run file (spill_path + '.run<n>') whenever they reach MAX_BUILDER_PAIRS
+    pairs or MAX_BUILDER_TERMS terms, and write merges the runs; without one
+    everything stays in memory until write.
+    """
+
+    def __init__(self, spill_path=None):
+        self.chunk_ids = {}  # chunk key -> id, in the order chunks are first seen
+        self.postings = {}  # term -> array of chunk id, position, chunk id, position, ...
+        self.pair_count = 0
+        self.spill_path = spill_path
+        # Spilled run files, as (path, None or {chunk key: number added to its positions})
+        self.runs = []
+        self._run_number = 0
+
+    def add(self, chunk_key, position, line):
+        chunk_id = self.chunk_ids.setdefault(chunk_key, len(self.chunk_ids))
+        terms = tokenize(line)
+        for term in terms:
+            postings = self.postings.get(term)
+            if postings is None:
+                postings = self.postings[term] = array('I')
+            postings.append(chunk_id)
+            postings.append(position)
+        self.pair_count += len(terms)
+        if self.pair_count >= MAX_BUILDER_PAIRS or len(self.postings) >= MAX_BUILDER_TERMS:
+            self._spill()
+
+    def add_builder(self, other, first_positions):
+        """Add the lines collected by another builder, e.g. for a later part of the log.
+
+        first_positions maps each chunk key of other to the number of lines the
+        chunk held before other's lines, by which their positions are shifted.
+        The runs other has spilled become runs of this builder, with the shift
+        applied when they are merged.
+        """
+        chunk_ids = [0] * len(other.chunk_ids)
+        shifts = [0] * len(other.chunk_ids)
+        for chunk_key, chunk_id in other.chunk_ids.items():
+            chunk_ids[chunk_id] = self.chunk_ids.setdefault(chunk_key, len(self.chunk_ids))
+            shifts[chunk_id] = first_positions.get(chunk_key, 0)
+        for term, flat in other.postings.items():
+            postings = self.postings.get(term)
+            if postings is None:
+                postings = self.postings[term] = array('I')
+            # Map the chunk ids and shift the positions without a Python-level loop
+            other_ids = flat[0::2]
+            postings.extend(chain.from_iterable(zip(
+                map(chunk_ids.__getitem__, other_ids),
+                map(add, flat[1::2], map(shifts.__getitem__, other_ids)))))
+            self.pair_count += len(other_ids)
+        for path, shifts in other.runs:
+            self.runs.append((path, {chunk_key: first_positions.get(chunk_key, 0) + (shifts or {}).get(chunk_key, 0)
+                                     for chunk_key in other.chunk_ids}))
+        if self.pair_count >= MAX_BUILDER_PAIRS or len(self.postings) >= MAX_BUILDER_TERMS:
+            self._spill()
+
+    def _sorted_postings(self):
+        """Yield (term, sorted (chunk number, position) pairs) for the collected terms in
+        term order; chunks are numbered in key (time) order so posting lists sort by time."""
+        rank = [0] * len(self.chunk_ids)
+        for i, chunk_key in enumerate(sorted(self.chunk_ids)):
+            rank[self.chunk_ids[chunk_key]] = i
+        for term in sorted(self.postings):
+            flat = self.postings[term]
+            yield term, sorted(zip(map(rank.__getitem__, flat[0::2]), flat[1::2]))
+
+    def _spill(self):
+        if self.spill_path is None:
+            return
+        path = f"{self.spill_path}.run{self._run_number}"
+        self._run_number += 1
+        # The arrays are written as they are; they are sorted and encoded once, by the final merge
+        writer = RunWriter(path, list(self.chunk_ids))
+        for term in sorted(self.postings):
+            writer.add_flat(term, self.postings[term])
+        writer.close()
+        self.runs.append((path, None))
+        self.postings = {}
+        self.pair_count = 0
+
+        if len(self.runs) >= MAX_MERGED_RUNS:
+            # Keep the number of files open at once in the final merge bounded
+            path = f"{self.spill_path}.run{self._run_number}"
+            self._run_number += 1
+            merge_sources([read_run(*run) for run in self.runs], RunWriter(path, sorted(self.chunk_ids)))
+            self.discard()
+            self.runs = [(path, None)]
+
+    def flush(self):
+        """Spill the postings still in memory, e.g. before the builder is sent to
+        another process; does nothing without a spill_path."""
+        if self.postings:
+            self._spill()
+
+    def write(self, path):
+        """Write the index file of the collected lines to path and return its size."""
+        writer = IndexWriter(path, sorted(self.chunk_ids))
+        if not self.runs:
+            for term, pairs in self._sorted_postings():
+                writer.add(term, pairs)
+            return writer.close()
+        self.flush()
+        size = merge_sources([read_run(*run) for run in self.runs], writer)
+        self.discard()
+        return size
+
+    def discard(self):
+        """Delete the spilled run files."""
+        for path, _ in self.runs:
+            if os.path.exists(path):
+                os.unlink(path)
+        self.runs = []
+
+    def append_to(self, path):
+        """Add the collected lines to the index at path as a new segment, or create
+        the index if there is none.
+
+        The existing segments are left alone unless the new one makes them due
+        for a merge (see SEGMENT_SIZE_RATIO).
+        """
+        paths = segment_paths(path)
+        if not paths:
+            return self.write(path)
+        base, extension = os.path.splitext(path)
+        number = int(paths[-1][len(base) + 1:-len(extension)]) + 1 if len(paths) > 1 else 1
+        paths.append(f"{base}.{number}{extension}")
+        self.write(paths[-1])
+
+        while len(paths) > 1 and os.path.getsize(paths[-2]) <= SEGMENT_SIZE_RATIO * os.path.getsize(paths[-1]):
+            merge_index_files(paths[-2:], paths[-2])
+            os.unlink(paths.pop())
+
+
+class IndexWriter:
+    """Writes an index file one term at a time, in term order.
+
+    The posting lists go to a temporary file and the dictionary is compressed
+    as it is built, so only its compressed form is held in memory; close writes
+    it in front of the posting lists and moves the file into place. chunk_keys
+    is the sorted list of chunk keys the pairs' chunk numbers refer to.
+    """
+
+    def __init__(self, path, chunk_keys):
+        self.path = path
+        self.chunk_keys = chunk_keys
+        self.offset = 0
+        self._postings = open(path + '.postings', 'w+b')
+        self._compressor = zlib.compressobj()
+        self._dictionary = [self._compressor.compress(
+            f'{{"chunks": {json.dumps(chunk_keys)}, "terms": {{'.encode('utf-8'))]
+        self._separator = ''
+
+    def add(self, term, pairs):
+        blob, compressed = encode_postings(pairs)
+        # One entry of the dictionary's "terms" object: term: [offset, length, zlib flag]
+        entry = f'{self._separator}{json.dumps(term)}: [{self.offset}, {len(blob)}, {compressed}]'
+        self._dictionary.append(self._compressor.compress(entry.encode('utf-8')))
+        self._separator = ', '
+        self._postings.write(blob)
+        self.offset += len(blob)
+
+    def close(self):
+        """Finish the file and return its size."""
+        self._dictionary.append(self._compressor.compress(b'}}'))
+        self._dictionary.append(self._compressor.flush())
+        dictionary = b''.join(self._dictionary)
+        with self._postings, open(self.path + '.tmp', 'wb') as f:
+            f.write(DICTIONARY_LENGTH.pack(len(dictionary)))
+            f.write(dictionary)
+            self._postings.seek(0)
+            shutil.copyfileobj(self._postings, f)
+        os.unlink(self.path + '.postings')
+        os.replace(self.path + '.tmp', self.path)
+        return DICTIONARY_LENGTH.size + len(dictionary) + self.offset
+
+
+class RunWriter:
+    """Writes a run file, to be read back in one pass by read_run: the chunk keys,
+    then for each term, in term order, a RUN_RECORD, the term and its array of
+    chunk number, position, chunk number, position, ... (not necessarily sorted)."""
+
+    def __init__(self, path, chunk_keys):
+        self.path = path
+        self.chunk_keys = chunk_keys
+        self._file = open(path, 'wb')
+        header = zlib.compress(json.dumps(chunk_keys).encode('utf-8'))
+        self._file.write(DICTIONARY_LENGTH.pack(len(header)))
+        self._file.write(header)
+
+    def add(self, term, pairs):
+        self.add_flat(term, array('I', chain.from_iterable(pairs)))
+
+    def add_flat(self, term, flat):
+        encoded_term = term.encode('utf-8')
+        data = flat.tobytes()
+        self._file.write(RUN_RECORD.pack(len(encoded_term), len(data)))
+        self._file.write(encoded_term)
+        self._file.write(data)
+
+    def close(self):
+        size = self._file.tell()
+        self._file.close()
+        return size
+
+
+def read_run(path, shifts=None):
+    """Return the chunk keys of a run file and an iterator over its (term, flat array
+    of chunk number, position, ...), with the positions of each chunk key in shifts
+    increased by its value."""
+    f = open(path, 'rb')
+    (header_length,) = DICTIONARY_LENGTH.unpack(f.read(DICTIONARY_LENGTH.size))
+    chunk_keys = json.loads(zlib.decompress(f.read(header_length)))
+    shift_by_chunk = [shifts.get(chunk_key, 0) for chunk_key in chunk_keys] if shifts else None
+
+    def terms():
+        with f:
+            while True:
+                record = f.read(RUN_RECORD.size)
+                if not record:
+                    return
+                term_length, data_length = RUN_RECORD.unpack(record)
+                term = f.read(term_length).decode('utf-8')
+                flat = array('I')
+                flat.frombytes(f.read(data_length))
+                if shift_by_chunk is not None:
+                    chunks = flat[0::2]
+                    flat = array('I', chain.from_iterable(zip(
+                        chunks, map(add, flat[1::2], map(shift_by_chunk.__getitem__, chunks)))))
+                yield term, flat
+
+    return chunk_keys, terms()
+
+
+def read_index_file(path):
+    """Return the chunk keys of an index file and an iterator over its (term, flat list
+    of chunk number, position, ...) in term order."""
+    index = InvertedIndex(path)
+    return index.chunk_keys, ((term, list(chain.from_iterable(index.pairs(term)))) for term in sorted(index.terms))
+
+
+def _ranked(terms, ranks):
+    for term, flat in terms:
+        yield term, ranks, flat
+
+
+def merge_sources(sources, writer):
+    """Write the terms of several sources with writer and return what its close returns.
+
+    Each source is a (chunk keys, iterator over (term, flat chunk number, position
+    sequence) in term order) pair, as returned by read_run and read_index_file;
+    writer.chunk_keys must be sorted and hold the chunk keys of every source. The
+    posting lists of a term found in several sources are merged, and only one
+    term's are held in memory at a time.
+    """
+    rank = {chunk_key: i for i, chunk_key in enumerate(writer.chunk_keys)}
+    streams = [_ranked(terms, [rank[chunk_key] for chunk_key in chunk_keys]) for chunk_keys, terms in sources]
+    for term, group in groupby(heapq.merge(*streams, key=itemgetter(0)), key=itemgetter(0)):
+        merged = []
+        for _, ranks, flat in group:
+            merged.extend(zip(map(ranks.__getitem__, flat[0::2]), flat[1::2]))
+        merged.sort()
+        writer.add(term, merged)
+    return writer.close()
+
+
+def merge_index_files(paths, path):
+    """Merge the index files at paths into one at path (which may be one of them) and return its size."""
+    sources = [read_index_file(source) for source in paths]
+    chunk_keys = sorted(set().union(*(chunk_keys for chunk_keys, _ in sources)))
+    return merge_sources(sources, IndexWriter(path, chunk_keys))
+
+
+def write_index(path, chunk_keys, postings):
+    """Write an index file and return its size.
+
+    chunk_keys is the sorted list of chunk keys and postings maps each term to
+    its sorted list of (chunk number in chunk_keys, line position) pairs.
+    """
+    writer = IndexWriter(path, chunk_keys)
+    for term in sorted(postings):
+        writer.add(term, postings[term])
+    return writer.close()
+
+
+def segment_paths(path):
+    """Return the paths of the segments of the index at path, oldest first."""
+    directory, name = os.path.split(path)
+    base, extension = os.path.splitext(name)
+    pattern = re.compile(re.escape(base) + r'\.(\d+)' + re.escape(extension))
+    numbers = sorted(int(match.group(1)) for match in map(pattern.fullmatch, os.listdir(directory or '.'))
+                     if match) if os.path.isdir(directory or '.') else []
+    paths = [path] if os.path.exists(path) else []
+    return paths + [os.path.join(directory, f"{base}.{number}{extension}") for number in numbers]
+
+
+def unindexed_path(path):
+    return os.path.splitext(path)[0] + '.unindexed.json'
+
+
+def load_unindexed(path):
+    """Return {chunk key: first line position not indexed} of the index at path."""
+    marker = unindexed_path(path)
+    if not os.path.exists(marker):
+        return {}
+    with open(marker, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def mark_unindexed(path, first_positions):
+    """Note that the lines of each chunk key in first_positions from its position on
+    are missing from the index at path."""
+    unindexed = load_unindexed(path)
+    for chunk_key, position in first_positions.items():
+        unindexed[chunk_key] = min(unindexed.get(chunk_key, position), position)
+    with open(unindexed_path(path), 'w', encoding='utf-8') as f:
+        json.dump(unindexed, f)
+
+
+def delete_index(path):
+    """Delete the index at path: its segments and its list of unindexed lines."""
+    for segment in segment_paths(path) + [unindexed_path(path)]:
+        if os.path.exists(segment):
+            os.unlink(segment)
+
+
+def remove_chunks(path, removed_keys):
+    """Rewrite the segments of the index at path that hold lines of the chunks in
+    removed_keys without them; one term's posting list is held in memory at a time."""
+    removed_keys = set(removed_keys)
+    for segment in segment_paths(path):
+        index = InvertedIndex(segment)
+        if removed_keys.isdisjoint(index.chunk_keys):
+            continue
+        chunk_keys = []
+        rank = []  # Chunk number in the segment -> chunk number in the rewritten one, or None
+        for chunk_key in index.chunk_keys:
+            rank.append(None if chunk_key in removed_keys else len(chunk_keys))
+            if chunk_key not in removed_keys:
+                chunk_keys.append(chunk_key)
+        if not chunk_keys and segment != path:
+            os.unlink(segment)
+            continue
+        writer = IndexWriter(segment, chunk_keys)
+        for term in sorted(index.terms):
+            pairs = [(rank[chunk], position) for chunk, position in index.pairs(term) if rank[chunk] is not None]
+            if pairs:
+                writer.add(term, pairs)
+        writer.close()
+
+    unindexed = load_unindexed(path)
+    if not removed_keys.isdisjoint(unindexed):
+        with open(unindexed_path(path), 'w', encoding='utf-8') as f:
+            json.dump({chunk_key: position for chunk_key, position in unindexed.items()
+                       if chunk_key not in removed_keys}, f)
+
+
+class InvertedIndex:
+    """Read access to an index file written by InvertedIndexBuilder."""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            data = f.read()
+        (dictionary_length,) = DICTIONARY_LENGTH.unpack_from(data)
+        dictionary_end = DICTIONARY_LENGTH.size + dictionary_length
+        dictionary = json.loads(zlib.decompress(data[DICTIONARY_LENGTH.size:dictionary_end]))
+
+        self.chunk_keys = dictionary['chunks']
+        self.terms = dictionary['terms']
+        self.postings = memoryview(data)[dictionary_end:]
+
+    def pairs(self, term):
+        """Return the sorted (chunk number in chunk_keys, line position) pairs of term."""
+        entry = self.terms.get(term)
+        if entry is None:
+            return []
+        offset, length, compressed = entry
+        return decode_postings(self.postings[offset:offset + length], compressed)
+
+    def lookup(self, term):
+        """Return the sorted (chunk key, line position) pairs of the lines containing term."""
+        chunk_keys = self.chunk_keys
+        return [(chunk_keys[chunk], position) for chunk, position in self.pairs(term)]
+
+    def search(self, query):
+        """Return the sorted (chunk key, line position) pairs of the lines containing every term of query."""
+        terms = tokenize(query)
+        if not terms:
+            return []
+        # Start from the rarest term so the intersection stays small
+        terms = sorted(terms, key=lambda term: self.terms[term][1] if term in self.terms else 0)
+        matches = set(self.lookup(terms[0]))
+        for term in terms[1:]:
+            if not matches:
+                break
+            matches.intersection_update(self.lookup(term))
+        return sorted(matches)
+
+
+class SearchIndex:
+    """Read access to all segments of an index, and the lines they are missing."""
+
+    def __init__(self, path):
+        self.segments = [InvertedIndex(segment) for segment in segment_paths(path)]
+        # Chunk key -> first line position not in any segment, to be scanned
+        self.unindexed = load_unindexed(path)
+
+    def search(self, query):
+        """Return the sorted (chunk key, line position) pairs of the indexed lines
+        containing every term of query."""
+        if len(self.segments) == 1:
+            return self.segments[0].search(query)
+        # Each line is in one segment only
+        return sorted(chain.from_iterable(segment.search(query) for segment in self.segments))
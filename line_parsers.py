@@ -0,0 +1,95 @@
+"""Line parsers: find the chunk key, second offset and log level of a log line.
+
+The generic RegexLineParser finds the timestamp and level anywhere in the
+line. Parsers for known layouts read them at fixed positions instead and
+hand lines that do not fit the layout to the generic parser, so they give
+the same result on any input. Parsers are named, see get_parser.
+
+Every parser turns each distinct timestamp string into a chunk key only
+once: log files hold many lines per second, so the strptime call and key
+formatting are taken out of the per-line work.
+"""
+import re
+from datetime import datetime
+
+TIMESTAMP_PATTERN = re.compile(r'(\d{4}-\d{2}-\d{2}\s\d{2}:\d{2}:\d{2})')
+LOG_LEVEL_PATTERN = re.compile(r'\s(INFO|ERROR|WARN|DEBUG|FATAL)\s')
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+# Timestamp at the start of a Hadoop line
+HADOOP_TIMESTAMP_PATTERN = re.compile(r'\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}')
+LOG_LEVELS = frozenset(('INFO', 'ERROR', 'WARN', 'DEBUG', 'FATAL'))
+# Cached timestamps are dropped once there are this many, to bound memory
+MAX_CACHED_TIMESTAMPS = 1 << 16
+
+
+def extract_log_level(line):
+    """Return the log level (INFO, ERROR, WARN, etc.) of a line, or UNKNOWN."""
+    match = LOG_LEVEL_PATTERN.search(line)
+    if match:
+        return match.group(1)
+    return "UNKNOWN"
+
+
+class RegexLineParser:
+    """Finds the timestamp and log level anywhere in the line.
+
+    chunk_of maps a timestamp (datetime) to its (chunk key, second offset).
+    """
+
+    name = 'regex'
+
+    def __init__(self, chunk_of):
+        self.chunk_of = chunk_of
+        self.keys = {}  # timestamp string -> (chunk key, second offset)
+
+    def _key(self, timestamp_str):
+        key = self.keys.get(timestamp_str)
+        if key is None:
+            if len(self.keys) >= MAX_CACHED_TIMESTAMPS:
+                self.keys.clear()
+            key = self.keys[timestamp_str] = self.chunk_of(datetime.strptime(timestamp_str, TIMESTAMP_FORMAT))
+        return key
+
+    def parse(self, line):
+        """Return (chunk key, second offset, log level) for a line, or None if it has no timestamp."""
+        match = TIMESTAMP_PATTERN.search(line)
+        if match is None:
+            return None
+        time_key, second_offset = self._key(match.group(1))
+        return time_key, second_offset, extract_log_level(line)
+
+
+class HadoopLineParser(RegexLineParser):
+    """Lines of the form '2015-10-18 18:01:47,978 INFO [main] ...'.
+
+    The timestamp is the first 19 characters and the level the word after
+    the milliseconds.
+    """
+
+    name = 'hadoop'
+
+    def parse(self, line):
+        # Cheap layout check; the whole timestamp is only checked the first time it is seen
+        if line[19:20] == ',' and line[10:11] == ' ':
+            level_start = line.find(' ', 20) + 1
+            level_end = line.find(' ', level_start)
+            level = line[level_start:level_end]
+            if level_end > 0 and level in LOG_LEVELS and line[20:level_start - 1].isdigit():
+                timestamp_str = line[:19]
+                key = self.keys.get(timestamp_str)
+                if key is not None:
+                    return key[0], key[1], level
+                if HADOOP_TIMESTAMP_PATTERN.fullmatch(timestamp_str):
+                    time_key, second_offset = self._key(timestamp_str)
+                    return time_key, second_offset, level
+        return RegexLineParser.parse(self, line)
+
+
+PARSERS = {parser.name: parser for parser in (HadoopLineParser, RegexLineParser)}
+
+
+def get_parser(name, chunk_of):
+    """Return a new parser of the given name using chunk_of to compute chunk keys."""
+    if name not in PARSERS:
+        raise ValueError(f"Unknown line parser: {name}")
+    return PARSERS[name](chunk_of)
@@ -0,0 +1,214 @@
+"""Compression codecs for log chunks.
+
+Every codec compresses one block of lines at a time into a self-contained
+frame; a chunk is the concatenation of its blocks' frames, which are found
+through the block table of the chunk's index. Codecs are named by a spec
+string "name" or "name:level", e.g. "gzip:6" or "lzma".
+
+zstd and lz4 are only available when the zstandard and lz4 packages are
+installed.
+"""
+import bz2
+import gzip
+import lzma
+import re
+import zlib
+from abc import ABC, abstractmethod
+from collections import Counter
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
+
+# zlib only looks back 32KB, so a larger preset dictionary would be wasted
+ZLIB_DICTIONARY_SIZE = 32 * 1024
+# Numbers (timestamps, ids, sizes) are ignored when grouping lines by template
+DIGITS = re.compile(rb'\d+')
+
+
+class Codec(ABC):
+    """Base class of the codecs: compresses and decompresses single blocks."""
+
+    name = None
+    extension = None  # Appended to '.log' in chunk file names
+    default_level = None
+
+    def __init__(self, level=None):
+        self.level = self.default_level if level is None else level
+
+    @property
+    def spec(self):
+        return f"{self.name}:{self.level}"
+
+    def with_level(self, level):
+        """Return a codec of the same kind compressing at another level."""
+        return type(self)(level)
+
+    @abstractmethod
+    def compress(self, data):
+        """Return data (bytes) compressed into a self-contained frame."""
+
+    @abstractmethod
+    def decompress(self, data):
+        """Return the bytes of a frame written by compress."""
+
+
+class GzipCodec(Codec):
+    """gzip members; a chunk is a valid multi-member .gz file."""
+
+    name = 'gzip'
+    extension = '.gz'
+    default_level = 9
+
+    def compress(self, data):
+        return gzip.compress(data, compresslevel=self.level)
+
+    def decompress(self, data):
+        return gzip.decompress(data)
+
+
+class ZlibCodec(Codec):
+    """Raw deflate streams, without the gzip header and checksum."""
+
+    name = 'zlib'
+    extension = '.deflate'
+    default_level = 6
+
+    def compress(self, data):
+        compressor = zlib.compressobj(self.level, zlib.DEFLATED, -15)
+        return compressor.compress(data) + compressor.flush()
+
+    def decompress(self, data):
+        return zlib.decompress(data, -15)
+
+
+class ZlibDictCodec(Codec):
+    """Raw deflate with a preset dictionary shared by all blocks.
+
+    Small blocks compress poorly on their own because every block starts with
+    an empty history; priming it with typical lines of the log (see
+    train_dictionary) recovers most of the ratio. The dictionary has to be set
+    before use and stored alongside the chunks.
+    """
+
+    name = 'zlib-dict'
+    extension = '.zd'
+    default_level = 6
+
+    def __init__(self, level=None, dictionary=None):
+        super().__init__(level)
+        self.dictionary = dictionary
+
+    def with_level(self, level):
+        return type(self)(level, self.dictionary)
+
+    def compress(self, data):
+        compressor = zlib.compressobj(self.level, zlib.DEFLATED, -15, zdict=self.dictionary)
+        return compressor.compress(data) + compressor.flush()
+
+    def decompress(self, data):
+        decompressor = zlib.decompressobj(-15, zdict=self.dictionary)
+        return decompressor.decompress(data) + decompressor.flush()
+
+
+class LzmaCodec(Codec):
+    name = 'lzma'
+    extension = '.xz'
+    default_level = 6
+
+    def compress(self, data):
+        return lzma.compress(data, preset=self.level)
+
+    def decompress(self, data):
+        return lzma.decompress(data)
+
+
+class Bz2Codec(Codec):
+    name = 'bz2'
+    extension = '.bz2'
+    default_level = 9
+
+    def compress(self, data):
+        return bz2.compress(data, compresslevel=self.level)
+
+    def decompress(self, data):
+        return bz2.decompress(data)
+
+
+class ZstdCodec(Codec):
+    name = 'zstd'
+    extension = '.zst'
+    default_level = 3
+
+    def compress(self, data):
+        return zstandard.ZstdCompressor(level=self.level).compress(data)
+
+    def decompress(self, data):
+        return zstandard.ZstdDecompressor().decompress(data)
+
+
+class Lz4Codec(Codec):
+    name = 'lz4'
+    extension = '.lz4'
+    default_level = 0
+
+    def compress(self, data):
+        return lz4.frame.compress(data, compression_level=self.level)
+
+    def decompress(self, data):
+        return lz4.frame.decompress(data)
+
+
+CODECS = {codec.name: codec for codec in
+          (GzipCodec, ZlibCodec, ZlibDictCodec, LzmaCodec, Bz2Codec, ZstdCodec, Lz4Codec)}
+# Codecs that need a package that is not part of the standard library
+OPTIONAL_MODULES = {'zstd': zstandard, 'lz4': lz4}
+
+
+def available_codecs():
+    """Return the names of the codecs that can be used in this environment."""
+    return [name for name in CODECS if OPTIONAL_MODULES.get(name, True) is not None]
+
+
+def get_codec(spec):
+    """Return the codec for a spec string such as 'gzip', 'gzip:6' or 'zstd:19'."""
+    name, _, level = spec.partition(':')
+    if name not in CODECS:
+        raise ValueError(f"Unknown codec: {name}")
+    if name not in available_codecs():
+        raise ValueError(f"The {name} codec needs a package that is not installed")
+    try:
+        return CODECS[name](int(level) if level else None)
+    except ValueError:
+        raise ValueError(f"Invalid codec level: {level}")
+
+
+def train_dictionary(lines, size=ZLIB_DICTIONARY_SIZE):
+    """Build a preset dictionary for ZlibDictCodec from sample lines (bytes).
+
+    Lines are grouped by template, i.e. with their numbers removed, and one
+    example of each template is kept, most common templates last: deflate
+    encodes matches close to the end of the dictionary most cheaply.
+    """
+    examples = {}
+    counts = Counter()
+    for line in lines:
+        template = DIGITS.sub(b'', line)
+        counts[template] += 1
+        examples.setdefault(template, line)
+
+    parts = []
+    total = 0
+    for template, _ in counts.most_common():
+        example = examples[template]
+        if total + len(example) > size:
+            break
+        parts.append(example)
+        total += len(example)
+    return b''.join(reversed(parts))
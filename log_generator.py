@@ -0,0 +1,205 @@
+"""Deterministic generator of synthetic Hadoop-style log files.
+
+The sample log is small, so benchmarks at realistic sizes run on generated
+logs instead. Lines look like the sample's:
+
+    2015-10-18 18:01:47,978 INFO [main] org.apache.hadoop...: message
+
+A log is described by its approximate size, the time span it covers, how
+unevenly its lines are spread over the seconds of that span (skew) and the
+share of each log level. The same description and seed always produce the
+same file, byte for byte, so results of runs on different days compare.
+"""
+import argparse
+import random
+from bisect import bisect_right
+from datetime import datetime, timedelta
+
+from line_parsers import TIMESTAMP_FORMAT
+
+DEFAULT_START = '2015-10-18 18:00:00'
+# Share of each level in the sample log
+DEFAULT_LEVEL_MIX = {'INFO': 0.52, 'WARN': 0.40, 'ERROR': 0.075, 'FATAL': 0.005}
+# Lines generated to estimate the average line length, and from it the number of lines
+LENGTH_SAMPLE_LINES = 1000
+# Lines written at a time
+WRITE_BATCH_LINES = 4096
+SIZE_UNITS = {'': 1, 'B': 1, 'KB': 1024, 'MB': 1024 ** 2, 'GB': 1024 ** 3}
+
+# (thread, logger, message) templates of each level; {} fields are filled with random numbers
+TEMPLATES = {
+    'INFO': (
+        ('AsyncDispatcher event handler', 'org.apache.hadoop.mapreduce.v2.app.job.impl.TaskAttemptImpl',
+         'attempt_1445144423722_{:04d}_m_{:06d}_0 TaskAttempt Transitioned from NEW to UNASSIGNED'),
+        ('RMCommunicator Allocator', 'org.apache.hadoop.mapreduce.v2.app.rm.RMContainerAllocator',
+         'Reduce slow start threshold not met. completedMapsForReduceSlowstart {}'),
+        ('RMCommunicator Allocator', 'org.apache.hadoop.mapreduce.v2.app.rm.RMContainerAllocator',
+         'After Scheduling: PendingReds:{} ScheduledMaps:{} ScheduledReds:0 AssignedMaps:{} AssignedReds:0'),
+        ('IPC Server handler {} on 62270', 'org.apache.hadoop.mapred.TaskAttemptListenerImpl',
+         'Progress of TaskAttempt attempt_1445144423722_{:04d}_m_{:06d}_0 is : 0.{}'),
+        ('ContainerLauncher #{}', 'org.apache.hadoop.mapreduce.v2.app.launcher.ContainerLauncherImpl',
+         'Processing the event EventType: CONTAINER_REMOTE_LAUNCH for container container_{}_0020_01_{:06d}'),
+        ('main', 'org.apache.hadoop.mapreduce.v2.app.MRAppMaster',
+         'Executing with tokens: {} attempt(s) of job_1445144423722_{:04d}'),
+    ),
+    'WARN': (
+        ('LeaseRenewer:msrabi@msra-sa-41:9000', 'org.apache.hadoop.hdfs.LeaseRenewer',
+         'Failed to renew lease for [DFSClient_NONMAPREDUCE_{}_1] for {} seconds.  Will retry shortly ...'),
+        ('RMCommunicator Allocator', 'org.apache.hadoop.ipc.Client',
+         'Address change detected. Old: msra-sa-41/10.190.173.{}:8030 New: msra-sa-41:8030'),
+        ('CommitterEvent Processor #{}', 'org.apache.hadoop.mapreduce.lib.output.FileOutputCommitter',
+         'Could not delete hdfs://msra-sa-41:9000/out/_temporary/{}/attempt_{:06d}'),
+    ),
+    'ERROR': (
+        ('RMCommunicator Allocator', 'org.apache.hadoop.mapreduce.v2.app.rm.RMContainerAllocator',
+         'ERROR IN CONTACTING RM. retries {} of {}'),
+        ('LeaseRenewer:msrabi@msra-sa-41:9000', 'org.apache.hadoop.hdfs.LeaseRenewer',
+         'Failed to renew lease for DFSClient_NONMAPREDUCE_{}_1 after {} ms'),
+    ),
+    'FATAL': (
+        ('AsyncDispatcher event handler', 'org.apache.hadoop.yarn.event.AsyncDispatcher',
+         'Error in dispatcher thread {} of job_1445144423722_{:04d}'),
+    ),
+    'DEBUG': (
+        ('IPC Client ({}) connection to msra-sa-41/10.190.173.170:9000', 'org.apache.hadoop.ipc.Client',
+         'IPC Client ({}) sending #{}'),
+    ),
+}
+
+
+def parse_size(text):
+    """Return the number of bytes of a size such as '4096', '500KB' or '1.5GB'."""
+    text = text.strip().upper()
+    number = text.rstrip('KMGB')
+    unit = text[len(number):]
+    if unit not in SIZE_UNITS or not number:
+        raise ValueError(f"Invalid size: {text} (e.g. 4096, 500KB, 10MB, 1GB)")
+    return int(float(number) * SIZE_UNITS[unit])
+
+
+def parse_level_mix(text):
+    """Return the level mix of 'INFO=52,WARN=40,ERROR=8' as {level: weight}."""
+    mix = {}
+    for item in text.split(','):
+        level, _, weight = item.partition('=')
+        level = level.strip().upper()
+        if level not in TEMPLATES:
+            raise ValueError(f"Unknown log level: {level}")
+        mix[level] = float(weight)
+    if not any(weight > 0 for weight in mix.values()):
+        raise ValueError("At least one log level needs a positive weight")
+    return mix
+
+
+class LogGenerator:
+    """Writes a synthetic Hadoop log.
+
+    size is the approximate size of the log in bytes and span_seconds the
+    time it covers, from start (YYYY-MM-DD HH:MM:SS). skew sets how unevenly
+    the lines are spread over the seconds: each second gets a rank, in an
+    order drawn from the seed, and a share of the lines proportional to
+    1 / rank ** skew, so 0 spreads them evenly and 1 or more gives a few
+    very busy seconds and many quiet ones. level_mix maps levels to their
+    relative weights.
+    """
+
+    def __init__(self, size, span_seconds=3600, skew=1.0, level_mix=None, start=DEFAULT_START, seed=0):
+        if size < 0 or span_seconds < 1 or skew < 0:
+            raise ValueError("size and skew cannot be negative, and the span is at least one second")
+        self.size = size
+        self.span_seconds = span_seconds
+        self.skew = skew
+        self.level_mix = dict(level_mix or DEFAULT_LEVEL_MIX)
+        self.start = datetime.strptime(start, TIMESTAMP_FORMAT)
+        self.seed = seed
+
+    def _line_maker(self, rng):
+        """Return a function making the part of a line after its timestamp, drawn from rng."""
+        levels = [level for level, weight in self.level_mix.items() if weight > 0]
+        cumulative = []
+        total = 0.0
+        for level in levels:
+            total += self.level_mix[level]
+            cumulative.append(total)
+        templates = {level: [(thread, logger, message, message.count('{') + thread.count('{'))
+                             for thread, logger, message in TEMPLATES[level]]
+                     for level in levels}
+
+        def make_line():
+            level = levels[min(bisect_right(cumulative, rng.random() * total), len(levels) - 1)]
+            thread, logger, message, fields = rng.choice(templates[level])
+            if fields:
+                numbers = [rng.randrange(1000000) for _ in range(fields)]
+                thread_fields = thread.count('{')
+                thread = thread.format(*numbers[:thread_fields])
+                message = message.format(*numbers[thread_fields:])
+            return f" {level} [{thread}] {logger}: {message}\n"
+
+        return make_line
+
+    def line_counts(self):
+        """Return the number of lines of each second of the span."""
+        # Lines are estimated from a sample drawn separately, so it does not shift the log itself
+        make_line = self._line_maker(random.Random(f"{self.seed}-length"))
+        # Timestamp and milliseconds: 'YYYY-MM-DD HH:MM:SS,mmm'
+        average_length = 23 + sum(len(make_line().encode('utf-8'))
+                                  for _ in range(LENGTH_SAMPLE_LINES)) / LENGTH_SAMPLE_LINES
+        total_lines = round(self.size / average_length)
+
+        rng = random.Random(f"{self.seed}-seconds")
+        ranks = list(range(1, self.span_seconds + 1))
+        rng.shuffle(ranks)
+        weights = [rank ** -self.skew for rank in ranks]
+        scale = total_lines / sum(weights)
+        # Rounding the running total, not each second, keeps the total exact
+        counts = []
+        cumulative = 0.0
+        assigned = 0
+        for weight in weights:
+            cumulative += weight * scale
+            count = round(cumulative) - assigned
+            counts.append(count)
+            assigned += count
+        return counts
+
+    def write(self, path):
+        """Write the log to path and return its number of lines."""
+        rng = random.Random(f"{self.seed}-lines")
+        make_line = self._line_maker(rng)
+        total_lines = 0
+        batch = []
+        with open(path, 'w', encoding='utf-8', newline='\n') as f:
+            for second, count in enumerate(self.line_counts()):
+                if not count:
+                    continue
+                prefix = (self.start + timedelta(seconds=second)).strftime(TIMESTAMP_FORMAT)
+                for millisecond in sorted(rng.randrange(1000) for _ in range(count)):
+                    batch.append(f"{prefix},{millisecond:03d}{make_line()}")
+                if len(batch) >= WRITE_BATCH_LINES:
+                    f.writelines(batch)
+                    total_lines += len(batch)
+                    batch = []
+            f.writelines(batch)
+            total_lines += len(batch)
+        return total_lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a synthetic Hadoop-style log file")
+    parser.add_argument('output', help="log file to write")
+    parser.add_argument('--size', type=parse_size, default=parse_size('10MB'), help="approximate size, e.g. 500KB, 10MB, 1GB")
+    parser.add_argument('--span', type=int, default=3600, help="seconds covered by the log")
+    parser.add_argument('--skew', type=float, default=1.0, help="0 spreads lines evenly over the seconds; higher values concentrate them")
+    parser.add_argument('--levels', type=parse_level_mix, default=DEFAULT_LEVEL_MIX,
+                        help="relative weight of each level, e.g. INFO=52,WARN=40,ERROR=7.5,FATAL=0.5")
+    parser.add_argument('--start', default=DEFAULT_START, help="timestamp of the first second (YYYY-MM-DD HH:MM:SS)")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    generator = LogGenerator(args.size, args.span, args.skew, args.levels, args.start, args.seed)
+    lines = generator.write(args.output)
+    print(f"Wrote {lines} lines to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,25 +1,395 @@
 import os
-import re
-from datetime import datetime
+import argparse
+import base64
+from datetime import datetime, timedelta
+import io
 import json
 import gzip
+import logging
+import mmap
 import shutil
-import tempfile
+import struct
+import threading
+import time
+import zlib
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from itertools import chain, islice
+from binary_index import LOG_TYPES, LOG_TYPE_CODES, BinaryIndex, encode_index
+from chunk_cache import ChunkCache
+from inverted_index import (InvertedIndexBuilder, SearchIndex, delete_index, mark_unindexed, remove_chunks,
+                            segment_paths, tokenize)
+from line_parsers import PARSERS, extract_log_level, get_parser
+from log_codecs import get_codec, train_dictionary
+from metrics import Metrics, snapshot_difference
+from prefetch import ordered_prefetch
+
+logger = logging.getLogger(__name__)
+
+# Chunk key format for each chunk granularity; every key starts with the date,
+# so logs from different days never share a chunk and keys sort in time order
+KEY_FORMATS = {
+    'second': '%Y-%m-%d_%H_%M_%S',
+    'minute': '%Y-%m-%d_%H_%M',
+    'hour': '%Y-%m-%d_%H'
+}
+# Number of seconds covered by each bucket
+BUCKET_SECONDS = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+# Length of the chunk key prefix that identifies each histogram bucket
+BUCKET_KEY_LENGTHS = {'second': 19, 'minute': 16, 'hour': 13, 'day': 10}
+# Histogram granularities from finest to coarsest
+GRANULARITIES = ('second', 'minute', 'hour', 'day')
+
+# Timestamp formats accepted by queries; times without a date apply to every day in the logs
+QUERY_FORMATS = ('%Y-%m-%d %H:%M:%S', '%H:%M:%S')
+RECORD_TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# Index record spilled to disk by the streaming ingest: log type code, encoded line
+# length and second offset of the line within its chunk
+INDEX_RECORD = struct.Struct('<BIH')
+
+# Lines per independently compressed block of a chunk: small enough that reading a
+# few lines decompresses little, large enough to keep most of the compression ratio
+DEFAULT_BLOCK_LINES = 1024
+
+# Block record spilled to disk by the streaming ingest: first line and compressed offset
+BLOCK_RECORD = struct.Struct('<II')
+
+# Number of bytes at the start of a source file checksummed to recognise it
+HEAD_CHECKSUM_LENGTH = 1024
+
+# Bytes of the log file read at a time by read_lines and complete_end
+READ_BATCH_BYTES = 1024 * 1024
+
+# Lines added to the chunks at a time by an incremental ingest; a batch is bucketed
+# in memory, so an append of a large file does not have to fit in memory at once
+APPEND_BATCH_LINES = 16 * 1024
+
+# Number of bytes at the start of the log file used to train a codec dictionary
+DICTIONARY_SAMPLE_SIZE = 4 * 1024 * 1024
+
+# Most threads used by default to decompress the blocks of a query concurrently
+MAX_READ_WORKERS = 8
+
+# Largest part of the log file handed to one worker by the parallel ingest; each
+# worker holds its shard and the shard's compressed chunks in memory
+MAX_SHARD_BYTES = 64 * 1024 * 1024
+
+# Number of lines read between two calls of an ingest progress callback
+PROGRESS_INTERVAL_LINES = 10000
+
+# Lines parsed at a time by ingest, and index entries filtered at a time by queries;
+# stage timers run once per batch, so their cost is spread over many lines
+PARSE_BATCH_LINES = 4096
+FILTER_BATCH_LINES = 4096
+
+def chunk_of(timestamp, granularity):
+    """Return the key of the chunk holding timestamp and the second offset within it."""
+    time_key = timestamp.strftime(KEY_FORMATS[granularity])
+    second_offset = (timestamp.minute * 60 + timestamp.second) % BUCKET_SECONDS[granularity]
+    return time_key, second_offset
+
+def configure_logging(quiet=False, verbose=False):
+    """Show log messages on stderr: only warnings and errors when quiet, and a
+    message for every file written or deleted when verbose."""
+    level = logging.WARNING if quiet else logging.DEBUG if verbose else logging.INFO
+    logging.basicConfig(level=level, format='%(message)s')
+
+def parse_batches(lines, parse, metrics):
+    """Yield (lines, parse results) for successive batches of PARSE_BATCH_LINES lines.
+
+    Reading and parsing each batch are timed as the 'read' and 'parse' stages of metrics.
+    """
+    lines = iter(lines)
+    while True:
+        with metrics.timer('read'):
+            batch = list(islice(lines, PARSE_BATCH_LINES))
+        if not batch:
+            return
+        with metrics.timer('parse'):
+            parsed = list(map(parse, batch))
+        metrics.increment('lines_read', len(batch))
+        yield batch, parsed
+
+def parse_query_timestamp(timestamp):
+    """Parse a query timestamp; returns (datetime, whether it has a date)."""
+    for query_format in QUERY_FORMATS:
+        try:
+            return datetime.strptime(timestamp, query_format), query_format != '%H:%M:%S'
+        except (ValueError, TypeError):
+            continue
+    raise ValueError(f"time data {timestamp!r} does not match format 'HH:MM:SS' or 'YYYY-MM-DD HH:MM:SS'")
+
+def file_head_checksum(path, length):
+    """Return the CRC32 of the first length bytes of a file."""
+    with open(path, 'rb') as f:
+        return zlib.crc32(f.read(length))
+
+def complete_end(path):
+    """Return the byte offset just after the last newline of a file (0 if it has none),
+    i.e. where its last complete line ends; a line still being written comes after it."""
+    with open(path, 'rb') as f:
+        end = os.fstat(f.fileno()).st_size
+        while end > 0:
+            start = max(0, end - READ_BATCH_BYTES)
+            f.seek(start)
+            newline = f.read(end - start).rfind(b'\n')
+            if newline != -1:
+                return start + newline + 1
+            end = start
+    return 0
+
+def read_lines(path, start, end):
+    """Yield the lines of a file between byte offsets start and end (which ends a line),
+    decoded as UTF-8 with their newlines, reading READ_BATCH_BYTES at a time."""
+    with open(path, 'rb') as f:
+        f.seek(start)
+        remaining = end - start
+        rest = b''  # Start of a line continued in the next batch
+        while remaining > 0:
+            data = f.read(min(READ_BATCH_BYTES, remaining))
+            if not data:
+                break
+            remaining -= len(data)
+            data = rest + data
+            cut = data.rfind(b'\n') + 1
+            rest = data[cut:]
+            # Newlines are translated as when the file is read in text mode
+            yield from io.StringIO(data[:cut].decode('utf-8'), newline=None)
+
+def encode_cursor(time_key, position):
+    """Encode a query position (chunk key and line position) as an opaque token."""
+    return base64.urlsafe_b64encode(json.dumps([time_key, position]).encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor):
+    """Decode a token made by encode_cursor; raises ValueError if it is not valid."""
+    try:
+        time_key, position = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+    if not isinstance(time_key, str) or not isinstance(position, int) or position < 0:
+        raise ValueError("Invalid cursor")
+    return time_key, position
+
+class StreamingChunkWriter:
+    """Appends lines to one compressed chunk and to its pending index entries.
+
+    Lines are compressed with codec in blocks of block_lines lines, each block
+    written as soon as it is full; the first line and compressed offset of
+    every block are recorded for the index. first_line is the number of lines
+    already in the chunk. Compression is timed in metrics.
+    """
+
+    def __init__(self, chunk_path, index_part_path, block_part_path, codec, block_lines, metrics, first_line=0):
+        # Reopening an existing chunk in 'ab' mode adds new blocks after the old ones
+        self.chunk_file = open(chunk_path, 'ab')
+        self.index_part_file = open(index_part_path, 'ab')
+        self.block_part_file = open(block_part_path, 'ab')
+        self.codec = codec
+        self.block_lines = block_lines
+        self.metrics = metrics
+        self.line_number = first_line
+        self.block = []  # Encoded lines of the block being filled
+
+    def write(self, line, log_type, second_offset=0):
+        """Append a line and return the number of bytes it takes in the chunk."""
+        data = (line + '\n').encode('utf-8')
+        self.block.append(data)
+        self.index_part_file.write(INDEX_RECORD.pack(LOG_TYPE_CODES[log_type], len(data), second_offset))
+        if len(self.block) == self.block_lines:
+            self._finish_block()
+        return len(data)
+
+    def _finish_block(self):
+        if self.block:
+            self.block_part_file.write(BLOCK_RECORD.pack(self.line_number, self.chunk_file.tell()))
+            with self.metrics.timer('compress'):
+                frame = self.codec.compress(b''.join(self.block))
+            self.chunk_file.write(frame)
+            self.line_number += len(self.block)
+            self.block = []
+
+    def close(self):
+        self._finish_block()
+        self.chunk_file.close()
+        self.index_part_file.close()
+        self.block_part_file.close()
+
+def compress_blocks(encoded_lines, block_lines, codec):
+    """Compress encoded lines with codec in independent blocks of block_lines lines.
+
+    Returns the compressed data and the block table: the first line number and
+    compressed offset of each block, each list followed by the totals.
+    """
+    frames = []
+    first_lines = []
+    block_offsets = []
+    offset = 0
+    for first_line in range(0, len(encoded_lines), block_lines):
+        frame = codec.compress(b''.join(encoded_lines[first_line:first_line + block_lines]))
+        first_lines.append(first_line)
+        block_offsets.append(offset)
+        frames.append(frame)
+        offset += len(frame)
+    first_lines.append(len(encoded_lines))
+    block_offsets.append(offset)
+    return b''.join(frames), (first_lines, block_offsets)
+
+def compress_batch(jobs, codec, compresslevel=9):
+    """Compress each (input_path, output_path, block_lines) job and return the compressed
+    sizes and block tables.
+
+    Log chunks are compressed with codec in blocks of block_lines lines (see
+    compress_blocks); files with block_lines None (JSON indexes) are gzipped at
+    compresslevel as a whole and get no block table.
+    Defined at module level so that it can run in a worker process."""
+    results = []
+    for input_path, output_path, block_lines in jobs:
+        blocks = None
+        if block_lines is None:
+            with open(input_path, 'rb') as f_in:
+                with gzip.open(output_path, 'wb', compresslevel=compresslevel) as f_out:
+                    shutil.copyfileobj(f_in, f_out)
+        else:
+            with open(input_path, 'rb') as f_in:
+                encoded_lines = f_in.read().splitlines(keepends=True)
+            compressed_log, blocks = compress_blocks(encoded_lines, block_lines, codec)
+            with open(output_path, 'wb') as f_out:
+                f_out.write(compressed_log)
+        results.append((os.path.getsize(output_path), blocks))
+    return results
+
+def ingest_shard(input_file, start, end, granularity, line_parser, codec, block_lines, search_spill_path):
+    """Bucket and compress the lines between byte offsets start and end of input_file.
+
+    Returns, for each chunk with lines in the shard, the compressed blocks, the
+    index records (INDEX_RECORD per line), the block table and the uncompressed
+    size, plus the shard's search index builder (None without a search_spill_path,
+    where it spills its postings) and a snapshot of the shard's stage timers.
+    Line positions are relative to the shard; the caller shifts them by the
+    lines of earlier shards.
+    Defined at module level so that it can run in a worker process.
+    """
+    metrics = Metrics()
+    with metrics.timer('read'):
+        with open(input_file, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            shard = data[start:end]
+    parse = get_parser(line_parser, partial(chunk_of, granularity=granularity)).parse
+    search_builder = InvertedIndexBuilder(spill_path=search_spill_path) if search_spill_path else None
+    lines_by_chunk = {}
+    records_by_chunk = {}
+    
+    # Read as text the same way the other ingest modes read the file
+    for batch, parsed_batch in parse_batches(io.TextIOWrapper(io.BytesIO(shard), encoding='utf-8'), parse, metrics):
+        with metrics.timer('bucket'):
+            for line, parsed in zip(batch, parsed_batch):
+                if not parsed:
+                    continue
+                time_key, second_offset, log_type = parsed
+                encoded_lines = lines_by_chunk.get(time_key)
+                if encoded_lines is None:
+                    encoded_lines = lines_by_chunk[time_key] = []
+                    records_by_chunk[time_key] = bytearray()
+                if search_builder is not None:
+                    search_builder.add(time_key, len(encoded_lines), line)
+                encoded = (line.strip() + '\n').encode('utf-8')
+                encoded_lines.append(encoded)
+                records_by_chunk[time_key] += INDEX_RECORD.pack(LOG_TYPE_CODES[log_type], len(encoded), second_offset)
+    
+    chunks = {}
+    for time_key, encoded_lines in lines_by_chunk.items():
+        with metrics.timer('compress'):
+            compressed_log, blocks = compress_blocks(encoded_lines, block_lines, codec)
+        chunks[time_key] = (compressed_log, bytes(records_by_chunk[time_key]), blocks,
+                            sum(len(encoded) for encoded in encoded_lines))
+    if search_builder is not None:
+        # Only the names of its run files go back to the parent
+        search_builder.flush()
+    return chunks, search_builder, metrics.snapshot()
 
 class LogProcessor:
-    def __init__(self, input_file):
+    def __init__(self, input_file, index_format='binary', cache_bytes=64 * 1024 * 1024,
+                 build_search_index=True, granularity='minute', retention_days=None,
+                 block_lines=DEFAULT_BLOCK_LINES, codec='gzip', line_parser='hadoop', read_workers=None,
+                 read_ahead=None, storage_root=None, metrics=None):
+        if index_format not in ('binary', 'json'):
+            raise ValueError(f"Unknown index format: {index_format}")
+        if line_parser not in PARSERS:
+            raise ValueError(f"Unknown line parser: {line_parser}")
+        # Codec used to compress chunks, e.g. 'gzip:9' or 'zstd' (see log_codecs.py).
+        # Processed output keeps the codec it was written with, recorded in the manifest.
+        self.codec = get_codec(codec)
+        if self.codec.name != 'gzip' and index_format != 'binary':
+            # Other codecs need the block table, which only binary indexes keep
+            raise ValueError(f"The {self.codec.name} codec needs the binary index format")
+        if granularity not in KEY_FORMATS:
+            raise ValueError(f"Unknown granularity: {granularity}")
+        if retention_days is not None and retention_days < 1:
+            raise ValueError("Retention must be at least one day")
+        if read_workers is not None and read_workers < 1:
+            raise ValueError("Read workers must be at least 1")
         self.input_file = input_file
+        self.index_format = index_format  # Format of newly written index files (see binary_index.py)
+        # Time span of each chunk ('second', 'minute' or 'hour'). Processed output
+        # keeps the granularity it was written with, recorded in the manifest.
+        self.granularity = granularity
+        # Number of most recent days kept after each ingest; None keeps everything
+        self.retention_days = retention_days
+        # Number of lines per independently compressed block of a chunk
+        self.block_lines = block_lines
+        # Parser finding the timestamp and log type of each line (see line_parsers.py);
+        # the hadoop parser falls back to the generic regex one for other layouts
+        self.line_parser = line_parser
+        # Number of threads decompressing the blocks of a query ahead of the records being
+        # returned (1 reads serially), and the most blocks they may hold at once
+        self.read_workers = read_workers or min(MAX_READ_WORKERS, os.cpu_count() or 1)
+        self.read_ahead = read_ahead or 2 * self.read_workers
+        # Threads are only started by the first query that needs them
+        self._read_executor = ThreadPoolExecutor(max_workers=self.read_workers) if self.read_workers > 1 else None
+        # Whether ingest builds the keyword search index. It is held in memory until the
+        # end of ingest, so turn it off to keep the streaming ingest's memory flat.
+        self.build_search_index = build_search_index
+        self._search_builder = None
+        # Called as progress(lines, bytes, total_bytes) every PROGRESS_INTERVAL_LINES lines
+        # read by an ingest, and once at the end; None reports nothing
+        self.progress = None
+        # Stage timers and counters of ingest and queries (see metrics.py); pass a shared
+        # Metrics to keep adding to it across processors
+        self.metrics = metrics or Metrics()
+        # Summary of the last ingest (see _finish_ingest) and what it started from
+        self.last_ingest_summary = None
+        self._ingest_start = None
+        self._full_ingest_end = None  # Where the running full ingest stops reading (see _start_full_ingest)
         self.original_size = os.path.getsize(input_file)
         self.chunk_sizes = {}  # Store original and compressed sizes for each chunk
         self.index_sizes = {}  # Store original and compressed sizes for index files
+        self.chunk_stats = {}  # Store line count and per-log-type counts for each chunk
         self.total_original_size = 0  # Will include original chunks + original index files
         self.total_compressed_size = 0  # Will include compressed chunks + compressed index files
         
-        # Create necessary directories
-        self.output_dir = "chunks"
-        self.index_dir = "indexes"
-        self.compressed_chunks_dir = "compressed_chunks"
-        self.compressed_index_dir = "compressed_index"
+        # Create necessary directories, under storage_root (by default the current
+        # directory); processors with different roots do not share any files
+        self.storage_root = storage_root or ''
+        self.output_dir = os.path.join(self.storage_root, "chunks")
+        self.index_dir = os.path.join(self.storage_root, "indexes")
+        self.compressed_chunks_dir = os.path.join(self.storage_root, "compressed_chunks")
+        self.compressed_index_dir = os.path.join(self.storage_root, "compressed_index")
+        self.manifest_path = os.path.join(self.compressed_index_dir, "manifest.json")
+        self.search_index_path = os.path.join(self.compressed_index_dir, "search_index.bin")
+        # Preset dictionary of codecs that use one, shared by all chunks
+        self.dictionary_path = os.path.join(self.compressed_index_dir, "codec_dictionary.bin")
+        # Byte offset reached in each source file, for incremental ingest
+        self.ingest_state_path = os.path.join(self.compressed_index_dir, "ingest_state.json")
+        
+        # Decompressed chunks and loaded indexes of recent queries
+        self.cache = ChunkCache(cache_bytes)
+        
+        # Manifest contents and the lookup tables derived from it, loaded on first use
+        self._manifest_lock = threading.Lock()
+        self._set_manifest(None)
         
         for directory in [self.output_dir, self.index_dir, 
                          self.compressed_chunks_dir, self.compressed_index_dir]:
@@ -39,18 +409,22 @@ class LogProcessor:
                     try:
                         if os.path.isfile(file_path):
                             os.unlink(file_path)
-                        print(f"Deleted: {file_path}")
+                        logger.debug("Deleted: %s", file_path)
                     except Exception as e:
-                        print(f"Error deleting {file_path}: {e}")
+                        logger.error("Error deleting %s: %s", file_path, e)
         
-        print("\nAll processed files have been deleted. You can now reprocess the log file.")
+        self.chunk_sizes = {}
+        self.index_sizes = {}
+        self.chunk_stats = {}
+        # Forget the deleted dictionary so the next ingest trains a new one
+        self.codec = get_codec(self.codec.spec)
+        self._set_manifest(None)
+        
+        logger.info("All processed files have been deleted. You can now reprocess the log file.")
 
     def extract_log_type(self, line):
         """Extract the log type (INFO, ERROR, WARN, etc.) from a log line."""
-        match = re.search(r'\s(INFO|ERROR|WARN|DEBUG|FATAL)\s', line)
-        if match:
-            return match.group(1)
-        return "UNKNOWN"
+        return extract_log_level(line)
 
     def get_total_sizes(self):
         """Get the total sizes and space savings."""
@@ -58,13 +432,19 @@ class LogProcessor:
         input_file_size = self.original_size
         
         # Calculate total size of all compressed files (chunks + indexes)
-        compressed_size = 0
-        for filename in os.listdir(self.compressed_chunks_dir):
-            if filename.endswith('.gz'):
-                compressed_size += os.path.getsize(os.path.join(self.compressed_chunks_dir, filename))
-        for filename in os.listdir(self.compressed_index_dir):
-            if filename.endswith('.gz'):
-                compressed_size += os.path.getsize(os.path.join(self.compressed_index_dir, filename))
+        manifest = self._load_manifest()
+        if manifest is not None:
+            compressed_size = sum(chunk['compressed_size'] + chunk['index_size'] for chunk in manifest)
+            compressed_size += self._dictionary_size()
+        else:
+            # Output of an older version without a manifest
+            compressed_size = 0
+            for filename in os.listdir(self.compressed_chunks_dir):
+                if filename.endswith(self._chunk_suffix()):
+                    compressed_size += os.path.getsize(os.path.join(self.compressed_chunks_dir, filename))
+            for filename in os.listdir(self.compressed_index_dir):
+                if filename.endswith(('.gz', '.idx')):
+                    compressed_size += os.path.getsize(os.path.join(self.compressed_index_dir, filename))
         
         # Calculate space savings
         space_saved = input_file_size - compressed_size
@@ -88,16 +468,38 @@ class LogProcessor:
         total_processed_size = 0
         chunk_details = {}
         
-        # Get details for each chunk
-        for filename in os.listdir(self.output_dir):
-            if filename.endswith('.log'):
-                time_key = filename[:-4]  # Remove .log extension
-                chunk_path = os.path.join(self.output_dir, filename)
-                compressed_chunk_path = os.path.join(self.compressed_chunks_dir, filename + '.gz')
-                index_path = os.path.join(self.compressed_index_dir, time_key + '.json.gz')
+        manifest = self._load_manifest()
+        if manifest is not None:
+            for chunk in manifest:
+                chunk_details[chunk['key']] = {
+                    'original_size': chunk['original_size'],
+                    'compressed_size': chunk['compressed_size'],
+                    'index_size': chunk['index_size']
+                }
+                total_processed_size += chunk['compressed_size'] + chunk['index_size']
+            # The codec dictionary is shared by all chunks
+            total_processed_size += self._dictionary_size()
+            
+            return {
+                'original_size': original_size,
+                'total_processed_size': total_processed_size,
+                'difference': original_size - total_processed_size,
+                'chunk_details': chunk_details
+            }
+        
+        # Get details for each chunk (output of an older version without a manifest)
+        for filename in os.listdir(self.compressed_chunks_dir):
+            if filename.endswith(self._chunk_suffix()):
+                time_key = filename[:-len(self._chunk_suffix())]  # Remove .log.gz (or other codec) extension
+                chunk_path = os.path.join(self.output_dir, time_key + '.log')
+                compressed_chunk_path = os.path.join(self.compressed_chunks_dir, filename)
+                index_path = self._index_path(time_key)
                 
-                # Get sizes
-                original_size_chunk = os.path.getsize(chunk_path)
+                # Get sizes (streaming ingest does not keep a plaintext copy of the chunk)
+                if os.path.exists(chunk_path):
+                    original_size_chunk = os.path.getsize(chunk_path)
+                else:
+                    original_size_chunk = self.chunk_sizes.get(time_key, {}).get('original', 0)
                 compressed_size = os.path.getsize(compressed_chunk_path)
                 index_size = os.path.getsize(index_path)
                 
@@ -117,105 +519,923 @@ class LogProcessor:
             'chunk_details': chunk_details
         }
 
-    def split_by_second(self):
-        """Split log file into separate files based on seconds in timestamp."""
-        # Check if files are already compressed
-        if os.path.exists(self.compressed_chunks_dir) and os.listdir(self.compressed_chunks_dir):
-            print("\nFiles are already processed and compressed!")
-            print("Use the 'Reset Processing' option if you want to reprocess the log file.")
-            return 0
+    def _chunk_of(self, timestamp):
+        """Return the key of the chunk holding timestamp and the second offset within it."""
+        return chunk_of(timestamp, self.granularity)
+
+    def _new_line_parser(self):
+        """Return a parser for the lines of the log, keyed by the current granularity."""
+        return get_parser(self.line_parser, self._chunk_of)
+
+    def _read_buckets(self, end):
+        """Read the log file up to byte offset end into per-chunk lists of lines, log type
+        codes and second offsets."""
+        self._start_search_index()
+        return self._bucket_lines(self._track_progress(read_lines(self.input_file, 0, end), end))
+
+    def _track_progress(self, lines, total_bytes):
+        """Wrap an iterable of lines to report the ingest's progress to self.progress.
 
-        # Dictionary to store logs for each second
+        total_bytes is the size of all the lines. Lines are counted in characters,
+        close enough to bytes for logs; once all lines are read the total is
+        reported. Returns lines itself when there is no progress callback, so an
+        ingest without one pays nothing.
+        """
+        if self.progress is None:
+            return lines
+        return self._report_progress(self.progress, lines, total_bytes)
+
+    @staticmethod
+    def _report_progress(progress, lines, total_bytes):
+        line_count = 0
+        byte_count = 0
+        for line in lines:
+            yield line
+            line_count += 1
+            byte_count += len(line)
+            if not line_count % PROGRESS_INTERVAL_LINES:
+                progress(line_count, min(byte_count, total_bytes), total_bytes)
+        progress(line_count, total_bytes, total_bytes)
+
+    def _bucket_lines(self, lines, first_positions=None):
+        """Sort lines into per-chunk lists of lines, log type codes and second offsets.
+
+        first_positions maps chunk keys to the number of lines the chunk already
+        holds, so that lines appended to it are added to the search index at the
+        right position.
+        """
+        first_positions = first_positions or {}
+        # Dictionary to store logs for each chunk
         logs_by_second = {}
-        # Dictionary to store indexes for each second
-        indexes_by_second = {}
-        
-        # Regular expression to match timestamp format
-        timestamp_pattern = r'(\d{4}-\d{2}-\d{2}\s\d{2}:\d{2}:\d{2})'
-        
-        with open(self.input_file, 'r', encoding='utf-8') as file:
-            for line in file:
-                # Try to find timestamp in the line
-                match = re.search(timestamp_pattern, line)
-                if match:
-                    timestamp_str = match.group(1)
-                    # Parse the timestamp
-                    timestamp = datetime.strptime(timestamp_str, '%Y-%m-%d %H:%M:%S')
-                    # Create key in format HH_MM_SS
-                    time_key = timestamp.strftime('%H_%M_%S')
+        # Dictionary to store the log type code of each line, for each chunk
+        types_by_second = {}
+        # Dictionary to store the second offset of each line within its chunk
+        seconds_by_chunk = {}
+        
+        parse = self._new_line_parser().parse
+        
+        for batch, parsed_batch in parse_batches(lines, parse, self.metrics):
+            with self.metrics.timer('bucket'):
+                # parsed is the date-qualified chunk key (e.g. 2015-10-18_18_01), second offset and log type
+                for line, parsed in zip(batch, parsed_batch):
+                    if not parsed:
+                        continue
+                    time_key, second_offset, log_type = parsed
                     
-                    # Add line to appropriate second bucket
+                    # Add line to appropriate chunk
                     if time_key not in logs_by_second:
                         logs_by_second[time_key] = []
-                        indexes_by_second[time_key] = []
-                    
-                    # Get the line number within this time bucket
-                    line_num = len(logs_by_second[time_key]) + 1
+                        types_by_second[time_key] = bytearray()
+                        seconds_by_chunk[time_key] = array('H')
                     
                     # Add line to logs
+                    position = first_positions.get(time_key, 0) + len(logs_by_second[time_key])
+                    self._add_to_search_index(time_key, position, line)
                     logs_by_second[time_key].append(line.strip())  # Strip whitespace
                     
                     # Add index entry
-                    log_type = self.extract_log_type(line)
-                    index_entry = {
-                        "line_number": line_num,
-                        "log_type": log_type
-                    }
-                    indexes_by_second[time_key].append(index_entry)
-        
-        # Write each second's logs and indexes to separate files
-        for time_key in logs_by_second:
-            # Write log file
-            log_file = os.path.join(self.output_dir, f"{time_key}.log")
-            with open(log_file, 'w', encoding='utf-8') as f:
-                f.write('\n'.join(logs_by_second[time_key]) + '\n')  # Join with newlines
-            
-            # Store original chunk size
-            original_size = os.path.getsize(log_file)
-            self.chunk_sizes[time_key] = {'original': original_size}
-            
-            # Write index file
-            index_file = os.path.join(self.index_dir, f"{time_key}.json")
-            with open(index_file, 'w', encoding='utf-8') as f:
-                json.dump({
-                    "total_lines": len(logs_by_second[time_key]),
-                    "entries": indexes_by_second[time_key]
-                }, f, indent=2)
-            
-            # Store original index size
-            index_size = os.path.getsize(index_file)
-            self.index_sizes[time_key] = {'original': index_size}
-            
-            print(f"Created: {time_key}.log with {len(logs_by_second[time_key])} log entries")
-            print(f"Created: {time_key}.json index file")
+                    types_by_second[time_key].append(LOG_TYPE_CODES[log_type])
+                    seconds_by_chunk[time_key].append(second_offset)
+        
+        return logs_by_second, types_by_second, seconds_by_chunk
+
+    def _second_offsets(self, seconds_by_chunk, time_key):
+        """Return the second offsets to store in a chunk's index; one-second chunks need none."""
+        return None if self.granularity == 'second' else seconds_by_chunk[time_key]
+
+    def split_by_second(self):
+        """Split log file into separate files based on the timestamp, one per chunk
+        of the configured granularity (second, minute or hour)."""
+        # Check if files are already compressed
+        if os.path.exists(self.compressed_chunks_dir) and os.listdir(self.compressed_chunks_dir):
+            logger.warning("Files are already processed and compressed! "
+                           "Use the 'Reset Processing' option if you want to reprocess the log file.")
+            return 0
+
+        end = self._start_full_ingest('classic')
+        self._prepare_codec()
+        logs_by_second, types_by_second, seconds_by_chunk = self._read_buckets(end)
+        
+        # Write each chunk's logs and indexes to separate files
+        with self.metrics.timer('write'):
+            for time_key in logs_by_second:
+                # Write log file
+                log_file = os.path.join(self.output_dir, f"{time_key}.log")
+                with open(log_file, 'wb') as f:
+                    # Written as bytes so that index offsets match on every platform
+                    f.write(('\n'.join(logs_by_second[time_key]) + '\n').encode('utf-8'))  # Join with newlines
+                
+                # Store original chunk size
+                original_size = os.path.getsize(log_file)
+                self.chunk_sizes[time_key] = {'original': original_size}
+                
+                self._record_chunk_stats(time_key, types_by_second[time_key])
+                
+                # Write index file
+                if self.index_format == 'json':
+                    # JSON indexes are written as plaintext and gzipped by compress_files
+                    index_file = os.path.join(self.index_dir, f"{time_key}.json")
+                    with open(index_file, 'wb') as f:
+                        f.write(self._encode_json_index(types_by_second[time_key],
+                                                        self._second_offsets(seconds_by_chunk, time_key)))
+                    
+                    # Store original index size
+                    index_size = os.path.getsize(index_file)
+                    self.index_sizes[time_key] = {'original': index_size}
+                else:
+                    # Binary indexes are stored as they are, so they go straight to their final place
+                    line_lengths = [len(entry.encode('utf-8')) + 1 for entry in logs_by_second[time_key]]
+                    index_file = self._write_index(time_key, types_by_second[time_key], line_lengths,
+                                                   self._second_offsets(seconds_by_chunk, time_key))
+                
+                logger.debug("Created: %s.log with %d log entries", time_key, len(logs_by_second[time_key]))
+                logger.debug("Created: %s index file", os.path.basename(index_file))
         
         return len(logs_by_second)
 
+    def split_and_compress(self, keep_plaintext=False, compresslevel=None):
+        """Split, index and compress the log file in one pass over the data.
+
+        Chunks and indexes are gzipped in memory and written straight to the
+        compressed directories, instead of being written to disk as plaintext and
+        read back by compress_files. With keep_plaintext=True the uncompressed
+        copies are written to the 'chunks' and 'indexes' directories as well.
+        compresslevel overrides the level of the codec.
+        """
+        # Check if files are already compressed
+        if os.path.exists(self.compressed_chunks_dir) and os.listdir(self.compressed_chunks_dir):
+            logger.warning("Files are already processed and compressed! "
+                           "Use the 'Reset Processing' option if you want to reprocess the log file.")
+            return 0
+
+        end = self._start_full_ingest('fused')
+        self._prepare_codec()
+        codec = self._codec_at(compresslevel)
+        logs_by_second, types_by_second, seconds_by_chunk = self._read_buckets(end)
+        
+        with self.metrics.timer('write'):
+            for time_key in logs_by_second:
+                second_offsets = self._second_offsets(seconds_by_chunk, time_key)
+                encoded_lines = [(entry + '\n').encode('utf-8') for entry in logs_by_second[time_key]]
+                log_data = b''.join(encoded_lines)
+                
+                if keep_plaintext:
+                    with open(os.path.join(self.output_dir, f"{time_key}.log"), 'wb') as f:
+                        f.write(log_data)
+                    # Binary indexes are stored uncompressed, so only JSON ones have a plaintext copy
+                    if self.index_format == 'json':
+                        with open(os.path.join(self.index_dir, f"{time_key}.json"), 'wb') as f:
+                            f.write(self._encode_json_index(types_by_second[time_key], second_offsets))
+                
+                with self.metrics.timer('compress'):
+                    compressed_log, blocks = compress_blocks(encoded_lines, self.block_lines, codec)
+                with open(self._chunk_path(time_key), 'wb') as f:
+                    f.write(compressed_log)
+                self._write_index(time_key, types_by_second[time_key], [len(encoded) for encoded in encoded_lines],
+                                  second_offsets, blocks, compresslevel)
+                
+                self.chunk_sizes[time_key] = {'original': len(log_data), 'compressed': len(compressed_log)}
+                self._record_chunk_stats(time_key, types_by_second[time_key])
+        
+        self._finish_ingest()
+        return len(logs_by_second)
+
+    def split_by_second_streaming(self, max_open_chunks=64):
+        """Split and compress the log file in a single streaming pass.
+
+        Unlike split_by_second, each line is appended to its compressed chunk as
+        soon as it is read instead of being held in memory until the end. At most
+        max_open_chunks chunk writers are kept open; the least recently used one is
+        closed when another is needed and reopened in append mode later, so peak
+        memory stays flat regardless of the size of the input file.
+        """
+        # Check if files are already compressed
+        if os.path.exists(self.compressed_chunks_dir) and os.listdir(self.compressed_chunks_dir):
+            logger.warning("Files are already processed and compressed! "
+                           "Use the 'Reset Processing' option if you want to reprocess the log file.")
+            return 0
+
+        end = self._start_full_ingest('streaming')
+        self._prepare_codec()
+        # Open writers in least recently used order
+        writers = OrderedDict()
+        # Number of lines and uncompressed bytes written to each chunk so far
+        line_counts = {}
+        original_sizes = {}
+        
+        parse = self._new_line_parser().parse
+        
+        self._start_search_index()
+        lines = self._track_progress(read_lines(self.input_file, 0, end), end)
+        for batch, parsed_batch in parse_batches(lines, parse, self.metrics):
+            with self.metrics.timer('bucket'):
+                for line, parsed in zip(batch, parsed_batch):
+                    if not parsed:
+                        continue
+                    time_key, second_offset, log_type = parsed
+                    
+                    writer = writers.pop(time_key, None)
+                    if writer is None:
+                        # Close the least recently used writer to stay within the limit
+                        if len(writers) >= max_open_chunks:
+                            _, oldest = writers.popitem(last=False)
+                            oldest.close()
+                        writer = StreamingChunkWriter(
+                            self._chunk_path(time_key),
+                            os.path.join(self.index_dir, f"{time_key}.types"),
+                            os.path.join(self.index_dir, f"{time_key}.blocks"),
+                            self.codec, self.block_lines, self.metrics, line_counts.get(time_key, 0))
+                    writers[time_key] = writer
+                    
+                    self._add_to_search_index(time_key, line_counts.get(time_key, 0), line)
+                    size = writer.write(line.strip(), log_type, second_offset)
+                    line_counts[time_key] = line_counts.get(time_key, 0) + 1
+                    original_sizes[time_key] = original_sizes.get(time_key, 0) + size
+        
+        with self.metrics.timer('write'):
+            for writer in writers.values():
+                writer.close()
+            
+            # Turn the pending index records of each chunk into its index file
+            for time_key in line_counts:
+                compressed_log = self._chunk_path(time_key)
+                self.chunk_sizes[time_key] = {
+                    'original': original_sizes[time_key],
+                    'compressed': os.path.getsize(compressed_log)
+                }
+                self._finalize_streamed_index(time_key)
+        
+        self._finish_ingest()
+        return len(line_counts)
+
+    def split_and_compress_parallel(self, workers=None, shard_bytes=None, compresslevel=None):
+        """Split and compress the log file with a pool of worker processes.
+
+        The file is cut into shards at line boundaries, and each worker reads its
+        shard through mmap, then buckets and compresses its lines (see
+        ingest_shard). The partial chunks are merged in file order, so every
+        chunk holds its lines in the same order as with the other ingest modes;
+        a chunk that spans shards simply gets the blocks of each shard in turn.
+        workers defaults to the number of CPUs and shard_bytes to a size that
+        gives every worker a few shards, at most MAX_SHARD_BYTES.
+        compresslevel overrides the level of the codec.
+        """
+        # Check if files are already compressed
+        if os.path.exists(self.compressed_chunks_dir) and os.listdir(self.compressed_chunks_dir):
+            logger.warning("Files are already processed and compressed! "
+                           "Use the 'Reset Processing' option if you want to reprocess the log file.")
+            return 0
+
+        file_size = self._start_full_ingest('sharded')
+        self._prepare_codec()
+        codec = self._codec_at(compresslevel)
+        workers = workers or os.cpu_count() or 1
+        offsets = self._shard_offsets(shard_bytes or min(MAX_SHARD_BYTES, file_size // (workers * 4) + 1), file_size)
+        shard_count = len(offsets) - 1
+        # Number of lines, uncompressed and compressed bytes of each chunk merged so far
+        line_counts = {}
+        original_sizes = {}
+        compressed_sizes = {}
+        
+        self._start_search_index()
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = executor.map(
+                ingest_shard,
+                [self.input_file] * shard_count, offsets[:-1], offsets[1:],
+                [self.granularity] * shard_count, [self.line_parser] * shard_count,
+                [codec] * shard_count, [self.block_lines] * shard_count,
+                # Each worker spills its part of the search index to its own run files
+                [f"{self.search_index_path}.shard{shard}" if self._search_builder is not None else None
+                 for shard in range(shard_count)])
+            # Results come back in shard order, i.e. in the order of the lines in the file
+            for shard_end, (chunks, shard_search, shard_metrics) in zip(offsets[1:], results):
+                # Time spent in the worker, added up over all workers
+                self.metrics.merge(shard_metrics)
+                first_positions = {time_key: line_counts.get(time_key, 0) for time_key in chunks}
+                with self.metrics.timer('write'):
+                    for time_key, (compressed_log, records, blocks, original_size) in chunks.items():
+                        first_line = first_positions[time_key]
+                        first_offset = compressed_sizes.get(time_key, 0)
+                        with open(self._chunk_path(time_key), 'ab') as f:
+                            f.write(compressed_log)
+                        with open(os.path.join(self.index_dir, f"{time_key}.types"), 'ab') as f:
+                            f.write(records)
+                        with open(os.path.join(self.index_dir, f"{time_key}.blocks"), 'ab') as f:
+                            first_lines, block_offsets = blocks
+                            for block_line, block_offset in zip(first_lines[:-1], block_offsets[:-1]):
+                                f.write(BLOCK_RECORD.pack(first_line + block_line, first_offset + block_offset))
+                        line_counts[time_key] = first_line + first_lines[-1]
+                        original_sizes[time_key] = original_sizes.get(time_key, 0) + original_size
+                        compressed_sizes[time_key] = first_offset + len(compressed_log)
+                if shard_search is not None:
+                    with self.metrics.timer('bucket'):
+                        self._search_builder.add_builder(shard_search, first_positions)
+                if self.progress is not None:
+                    self.progress(sum(line_counts.values()), shard_end, file_size)
+        
+        with self.metrics.timer('write'):
+            # Turn the pending index records of each chunk into its index file
+            for time_key in line_counts:
+                self.chunk_sizes[time_key] = {
+                    'original': original_sizes[time_key],
+                    'compressed': compressed_sizes[time_key]
+                }
+                self._finalize_streamed_index(time_key)
+        
+        self._finish_ingest()
+        return len(line_counts)
+
+    def _shard_offsets(self, shard_bytes, file_size):
+        """Return the byte offsets that cut the first file_size bytes of the log file
+        (which end a line) into shards of about shard_bytes bytes, each ending after
+        a newline; the first is 0 and the last file_size (an empty file has no shards)."""
+        offsets = [0]
+        with open(self.input_file, 'rb') as f:
+            if file_size:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                    while offsets[-1] + shard_bytes < file_size:
+                        newline = data.find(b'\n', offsets[-1] + shard_bytes - 1)
+                        if newline == -1 or newline + 1 == file_size:
+                            break
+                        offsets.append(newline + 1)
+                offsets.append(file_size)
+        return offsets
+
+    def _finalize_streamed_index(self, time_key):
+        """Write the final index for a chunk produced by the streaming ingest."""
+        index_part = os.path.join(self.index_dir, f"{time_key}.types")
+        with open(index_part, 'rb') as f:
+            records = list(INDEX_RECORD.iter_unpack(f.read()))
+        os.unlink(index_part)
+        block_part = os.path.join(self.index_dir, f"{time_key}.blocks")
+        with open(block_part, 'rb') as f:
+            block_records = list(BLOCK_RECORD.iter_unpack(f.read()))
+        os.unlink(block_part)
+        
+        log_type_codes = bytes(code for code, _, _ in records)
+        second_offsets = None
+        if self.granularity != 'second':
+            second_offsets = [second_offset for _, _, second_offset in records]
+        blocks = ([first_line for first_line, _ in block_records] + [len(records)],
+                  [offset for _, offset in block_records] + [self.chunk_sizes[time_key]['compressed']])
+        self._record_chunk_stats(time_key, log_type_codes)
+        self._write_index(time_key, log_type_codes, [length for _, length, _ in records], second_offsets, blocks)
+
+    def _record_chunk_stats(self, time_key, log_type_codes):
+        """Remember the line count and per-log-type counts of a chunk for the manifest."""
+        log_types = {}
+        for code, log_type in enumerate(LOG_TYPES):
+            count = log_type_codes.count(code)
+            if count:
+                log_types[log_type] = count
+        self.chunk_stats[time_key] = {'lines': len(log_type_codes), 'log_types': log_types}
+
+    def _start_search_index(self):
+        # The builder spills its postings next to the index, so a large log does not fill memory
+        self._search_builder = (InvertedIndexBuilder(spill_path=self.search_index_path)
+                                if self.build_search_index else None)
+
+    def _add_to_search_index(self, time_key, position, line):
+        if self._search_builder is not None:
+            self._search_builder.add(time_key, position, line)
+
+    def _finish_ingest(self, appended=None):
+        """Write the files that describe the whole ingest: search index and manifest.
+
+        appended maps the chunk keys an incremental ingest added lines to to the
+        position of their first new line; the new lines are added to the existing
+        search index as a segment, or noted as unindexed if none were collected.
+        """
+        append = appended is not None
+        if not append:
+            delete_index(self.search_index_path)
+        # Appended lines need an index to add to, unless they are the only ones
+        if self._search_builder is not None and (
+                not append or segment_paths(self.search_index_path)
+                or all(appended.get(time_key) == 0 for time_key in self.chunk_stats)):
+            with self.metrics.timer('search_index'):
+                if append:
+                    self._search_builder.append_to(self.search_index_path)
+                else:
+                    self._search_builder.write(self.search_index_path)
+        elif append:
+            if self._search_builder is not None:
+                self._search_builder.discard()
+            if segment_paths(self.search_index_path):
+                # Leave the index as it is; searches scan the lines it is missing
+                mark_unindexed(self.search_index_path, appended)
+        self._search_builder = None
+        with self.metrics.timer('write'):
+            self._write_manifest()
+        if not append:
+            # A full ingest consumed the file up to its last complete line; later appends
+            # start after it. Without _start_full_ingest (compress_files of another
+            # processor), that is where the last complete line ends now.
+            end = self._full_ingest_end if self._full_ingest_end is not None else complete_end(self.input_file)
+            self._save_ingest_offset(self.input_file, end)
+            self._full_ingest_end = None
+        if self.retention_days is not None:
+            self.apply_retention(self.retention_days)
+        if self._ingest_start is not None:
+            self.metrics.increment('ingests')
+            self.last_ingest_summary = self._ingest_summary()
+            self._ingest_start = None
+            summary = self.last_ingest_summary
+            logger.info("Ingested %d lines (%d bytes) into %d chunks in %.2fs [%s]",
+                        summary['lines'], summary['bytes'], summary['chunks'], summary['seconds'],
+                        ', '.join(f"{stage} {seconds:.3f}s" for stage, seconds in summary['stages'].items()))
+
+    def _start_full_ingest(self, mode):
+        """Start an ingest of the whole log file and return the byte offset it stops at:
+        the end of the last complete line, so a line still being written is left to
+        ingest_incremental."""
+        self._full_ingest_end = complete_end(self.input_file)
+        self._start_ingest(mode, self._full_ingest_end)
+        return self._full_ingest_end
+
+    def _start_ingest(self, mode, input_bytes=0):
+        """Note the start of an ingest of input_bytes bytes, summed up by _finish_ingest."""
+        self._ingest_start = (mode, time.perf_counter(), self.metrics.snapshot())
+        self.metrics.increment('bytes_read', input_bytes)
+
+    def _ingest_summary(self):
+        """Return the summary of the ingest since _start_ingest: its mode, duration,
+        throughput, seconds spent in each stage and the counters it added to.
+
+        Stage times of the sharded ingest are added up over its worker processes,
+        so together they can exceed the duration.
+        """
+        mode, started, before = self._ingest_start
+        seconds = time.perf_counter() - started
+        changes = snapshot_difference(self.metrics.snapshot(), before)
+        lines = changes['counters'].get('lines_read', 0)
+        input_bytes = changes['counters'].get('bytes_read', 0)
+        return {
+            'mode': mode,
+            'seconds': round(seconds, 3),
+            'lines': lines,
+            'bytes': input_bytes,
+            'chunks': len(self.chunk_stats),
+            'lines_per_sec': round(lines / seconds) if seconds > 0 else None,
+            'bytes_per_sec': round(input_bytes / seconds) if seconds > 0 else None,
+            'stages': {stage: round(values['seconds'], 4) for stage, values in sorted(changes['stages'].items())},
+            'counters': changes['counters']
+        }
+
+    def _load_ingest_state(self):
+        """Return the ingest state: for each source file, how much of it was ingested."""
+        if not os.path.exists(self.ingest_state_path):
+            return {}
+        with open(self.ingest_state_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _save_ingest_offset(self, source_file, offset):
+        """Remember that source_file was ingested up to offset bytes."""
+        state = self._load_ingest_state()
+        state[os.path.abspath(source_file)] = {
+            'inode': os.stat(source_file).st_ino,
+            'offset': offset,
+            # Checksum of the start of the file, to notice a file replaced in place
+            'head': file_head_checksum(source_file, min(offset, HEAD_CHECKSUM_LENGTH)),
+            'head_length': min(offset, HEAD_CHECKSUM_LENGTH)
+        }
+        with open(self.ingest_state_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+
+    def _pending_reads(self, source_file):
+        """Return the (path, offset) pairs to read to catch up with source_file.
+
+        Handles a source file that was truncated or replaced (read again from the
+        start) and one that was rotated, i.e. renamed and replaced by a new file
+        (the rest of the old file, found in the same directory by its inode, is
+        read first).
+        """
+        entry = self._load_ingest_state().get(os.path.abspath(source_file))
+        if entry is None:
+            return [(source_file, 0)]
+        
+        stat = os.stat(source_file)
+        if stat.st_ino != entry['inode']:
+            reads = []
+            directory = os.path.dirname(os.path.abspath(source_file))
+            for filename in sorted(os.listdir(directory)):
+                rotated_path = os.path.join(directory, filename)
+                if os.path.isfile(rotated_path) and os.stat(rotated_path).st_ino == entry['inode']:
+                    reads.append((rotated_path, entry['offset']))
+                    break
+            reads.append((source_file, 0))
+            return reads
+        
+        if (stat.st_size < entry['offset'] or
+                file_head_checksum(source_file, entry['head_length']) != entry['head']):
+            return [(source_file, 0)]
+        return [(source_file, entry['offset'])]
+
+    def _load_chunk_stats(self):
+        """Fill the per-chunk counters and sizes from the manifest, for chunks not seen by this instance."""
+        for chunk in self._load_manifest() or []:
+            time_key = chunk['key']
+            self.chunk_stats.setdefault(time_key, {'lines': chunk['lines'], 'log_types': chunk['log_types']})
+            self.chunk_sizes.setdefault(time_key, {'original': chunk['original_size'],
+                                                   'compressed': chunk['compressed_size']})
+            self.index_sizes.setdefault(time_key, {'compressed': chunk['index_size']})
+
+    def ingest_incremental(self, input_file=None, compresslevel=None):
+        """Ingest only the lines added to a log file since it was last ingested.
+
+        input_file defaults to the processor's log file; another file is merged
+        into the same chunks. The byte offset reached in each file is kept in the
+        ingest state, and only complete lines are ingested, so a line still being
+        written is picked up by the next call. The new lines are read and added in
+        batches of APPEND_BATCH_LINES; each batch is appended to its chunks as new
+        blocks and to their indexes. Existing line positions do not change, so
+        cursors stay valid. compresslevel overrides the level of the codec.
+        Returns the number of lines stored (lines without a timestamp are skipped).
+        """
+        source_file = input_file or self.input_file
+        self._start_ingest('incremental')
+        self._load_chunk_stats()
+        self._prepare_codec(source_file)
+        codec = self._codec_at(compresslevel)
+        
+        # (path, offset, end of its last complete line) of each file to read
+        reads = [(path, offset, max(offset, complete_end(path))) for path, offset in self._pending_reads(source_file)]
+        end_offset = reads[-1][2]
+        total_bytes = sum(end - offset for _, offset, end in reads)
+        self.metrics.increment('bytes_read', total_bytes)
+        
+        # Position of the first new line of each chunk given lines, for the search index
+        first_positions = {time_key: stats['lines'] for time_key, stats in self.chunk_stats.items()}
+        appended = {}
+        stored = 0
+        lines = self._track_progress(
+            chain.from_iterable(read_lines(path, offset, end) for path, offset, end in reads), total_bytes)
+        self._start_search_index()
+        while True:
+            with self.metrics.timer('read'):
+                batch = list(islice(lines, APPEND_BATCH_LINES))
+            if not batch:
+                break
+            for time_key, line_count in self._append_lines(batch, codec, compresslevel).items():
+                appended.setdefault(time_key, first_positions.get(time_key, 0))
+                stored += line_count
+        
+        if not appended:
+            self._search_builder = None
+            self._save_ingest_offset(source_file, end_offset)
+            return 0
+        
+        self._finish_ingest(appended)
+        self._save_ingest_offset(source_file, end_offset)
+        logger.info("Ingested %d new lines into %d chunks", stored, len(appended))
+        return stored
+
+    def _append_lines(self, lines, codec, compresslevel=None):
+        """Add lines to the end of their chunks and return how many went to each chunk key."""
+        first_positions = {time_key: stats['lines'] for time_key, stats in self.chunk_stats.items()}
+        logs_by_chunk, types_by_chunk, seconds_by_chunk = self._bucket_lines(lines, first_positions)
+        
+        with self.metrics.timer('write'):
+            for time_key in logs_by_chunk:
+                log_data = ('\n'.join(logs_by_chunk[time_key]) + '\n').encode('utf-8')
+                line_lengths = [len(entry.encode('utf-8')) + 1 for entry in logs_by_chunk[time_key]]
+                log_type_codes = bytes(types_by_chunk[time_key])
+                second_offsets = self._second_offsets(seconds_by_chunk, time_key)
+                compressed_log = self._chunk_path(time_key)
+                original_size = len(log_data)
+                
+                with self.metrics.timer('compress'):
+                    compressed_data, (first_lines, block_offsets) = compress_blocks(
+                        [(entry + '\n').encode('utf-8') for entry in logs_by_chunk[time_key]],
+                        self.block_lines, codec)
+                
+                if time_key in self.chunk_stats:
+                    # Extend the existing index with the new lines
+                    old_index_path = self._index_path(time_key)
+                    old_codes, old_lengths, old_seconds, old_blocks = self._index_arrays(self._load_index(time_key))
+                    line_lengths = old_lengths + line_lengths
+                    log_type_codes = old_codes + log_type_codes
+                    if second_offsets is not None:
+                        second_offsets = old_seconds + list(second_offsets)
+                    original_size += self.chunk_sizes[time_key].get('original', 0)
+                    
+                    # The new blocks follow the existing ones, which end with the line count and file size
+                    old_first_lines, old_block_offsets = old_blocks or ([0, len(old_codes)],
+                                                                        [0, os.path.getsize(compressed_log)])
+                    first_lines = old_first_lines[:-1] + [old_first_lines[-1] + line for line in first_lines]
+                    block_offsets = old_block_offsets[:-1] + [old_block_offsets[-1] + offset for offset in block_offsets]
+                else:
+                    old_index_path = None
+                
+                # Appending gzip members continues the decompressed stream
+                with open(compressed_log, 'ab') as f:
+                    f.write(compressed_data)
+                plaintext_log = os.path.join(self.output_dir, f"{time_key}.log")
+                if os.path.exists(plaintext_log):
+                    with open(plaintext_log, 'ab') as f:
+                        f.write(log_data)
+                
+                index_path = self._write_index(time_key, log_type_codes, line_lengths, second_offsets,
+                                               (first_lines, block_offsets), compresslevel)
+                if old_index_path is not None and old_index_path != index_path and os.path.exists(old_index_path):
+                    # The chunk was indexed in the other format before
+                    os.unlink(old_index_path)
+                self.chunk_sizes[time_key] = {'original': original_size, 'compressed': os.path.getsize(compressed_log)}
+                self._record_chunk_stats(time_key, log_type_codes)
+        
+        # The cached indexes and chunks of the extended chunks miss the new lines
+        self.cache.clear()
+        return {time_key: len(entries) for time_key, entries in logs_by_chunk.items()}
+
+    def follow(self, input_file=None, poll_interval=1.0, stop_event=None):
+        """Keep ingesting the lines appended to a log file, like tail -f.
+
+        The file is checked every poll_interval seconds until stop_event (a
+        threading.Event) is set or the user presses Ctrl+C.
+        """
+        try:
+            while stop_event is None or not stop_event.is_set():
+                try:
+                    self.ingest_incremental(input_file)
+                except FileNotFoundError:
+                    # Between the rotation of the file and the creation of the new one
+                    pass
+                if stop_event is None:
+                    time.sleep(poll_interval)
+                else:
+                    stop_event.wait(poll_interval)
+        except KeyboardInterrupt:
+            logger.info("Stopped following the log file")
+
+    def _write_manifest(self):
+        """Write the sorted list of chunks with their line counts and sizes.
+
+        Range queries and size reports use the manifest instead of listing and
+        stat-ing the compressed directories. Chunk keys sort in time order.
+        """
+        if not self.chunk_stats:
+            return
+        
+        chunks = []
+        for time_key in sorted(self.chunk_stats):
+            compressed_log = self._chunk_path(time_key)
+            chunk_sizes = self.chunk_sizes.get(time_key, {})
+            index_sizes = self.index_sizes.get(time_key, {})
+            chunks.append({
+                'key': time_key,
+                'lines': self.chunk_stats[time_key]['lines'],
+                'log_types': self.chunk_stats[time_key]['log_types'],
+                'original_size': chunk_sizes.get('original', 0),
+                'compressed_size': chunk_sizes.get('compressed') or os.path.getsize(compressed_log),
+                'index_size': index_sizes.get('compressed') or os.path.getsize(self._index_path(time_key))
+            })
+        self._save_manifest(chunks)
+
+    def _save_manifest(self, chunks):
+        """Write the manifest for the given sorted chunk entries, with their rollups."""
+        # Roll the per-chunk counts up into buckets of each coarser granularity
+        rollups = {}
+        for granularity in GRANULARITIES[GRANULARITIES.index(self.granularity) + 1:]:
+            key_length = BUCKET_KEY_LENGTHS[granularity]
+            buckets = []
+            for chunk in chunks:
+                bucket_key = chunk['key'][:key_length]
+                if not buckets or buckets[-1]['key'] != bucket_key:
+                    buckets.append({'key': bucket_key, 'lines': 0, 'log_types': {}})
+                buckets[-1]['lines'] += chunk['lines']
+                for log_type, count in chunk['log_types'].items():
+                    buckets[-1]['log_types'][log_type] = buckets[-1]['log_types'].get(log_type, 0) + count
+            rollups[granularity] = buckets
+        
+        manifest = {'version': 2, 'granularity': self.granularity, 'codec': self.codec.spec,
+                    'chunks': chunks, 'rollups': rollups}
+        with open(self.manifest_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f)
+        
+        self._set_manifest(manifest)
+
+    def _set_manifest(self, manifest):
+        """Store the manifest and build the lookup tables used by queries.
+
+        Queries take the manifest as loaded once self._manifest is set, so it is
+        set last, after everything derived from it.
+        """
+        if manifest is None:
+            self._manifest = None
+            self._manifest_keys = None
+            self._count_prefix = None
+            self.cache.clear()
+            self._search_index = None
+            return
+        
+        # Processed output is read with the granularity and codec it was written with
+        codec = get_codec(manifest.get('codec', 'gzip'))
+        if codec.spec == self.codec.spec:
+            codec = self.codec
+        self._prepare_codec(codec=codec)
+        manifest_keys = [chunk['key'] for chunk in manifest['chunks']]
+        
+        # Running totals of lines per log type (and overall, under None), so the
+        # number of lines in any range of chunks is a single subtraction
+        count_prefix = {log_type: [0] for log_type in (None,) + LOG_TYPES}
+        for chunk in manifest['chunks']:
+            for log_type, totals in count_prefix.items():
+                count = chunk['lines'] if log_type is None else chunk['log_types'].get(log_type, 0)
+                totals.append(totals[-1] + count)
+        
+        # A new manifest means new data, so nothing cached can be trusted anymore
+        self.cache.clear()
+        self._search_index = None
+        self.granularity = manifest['granularity']
+        self.codec = codec
+        self._manifest_keys = manifest_keys
+        self._count_prefix = count_prefix
+        self._manifest = manifest
+
+    def reload(self):
+        """Forget the loaded manifest, indexes and cached chunks so that they are read
+        again from disk, e.g. after another process ingested into the same storage."""
+        self._set_manifest(None)
+
+    def _load_manifest(self):
+        """Return the sorted manifest entries, or None if there is no manifest.
+
+        Queries sharing a dataset's read lock may get here together; only one of
+        them loads the manifest, the others wait for it.
+        """
+        manifest = self._manifest
+        if manifest is None:
+            with self._manifest_lock:
+                manifest = self._manifest
+                if manifest is None:
+                    if not os.path.exists(self.manifest_path):
+                        return None
+                    with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                        manifest = json.load(f)
+                    if manifest.get('version', 1) < 2:
+                        # Version 1 used HH_MM_SS keys without a date
+                        raise ValueError("Processed files use an older layout; reset and reprocess the log file")
+                    self._set_manifest(manifest)
+        return manifest['chunks']
+
+    def _chunk_keys(self):
+        """Return the sorted keys of all chunks."""
+        if self._load_manifest() is not None:
+            return self._manifest_keys
+        
+        # No manifest yet (split_by_second without compress_files): list the directory
+        keys = []
+        for log_file in sorted(os.listdir(self.compressed_chunks_dir)):
+            if log_file.endswith(self._chunk_suffix()):
+                time_key = log_file[:-len(self._chunk_suffix())]  # Remove .log.gz (or other codec) extension
+                try:
+                    datetime.strptime(time_key, KEY_FORMATS[self.granularity])
+                except ValueError:
+                    continue
+                keys.append(time_key)
+        return keys
+
+    def _query_intervals(self, start_timestamp, end_timestamp):
+        """Turn query timestamps into a sorted list of (start, end) datetimes, inclusive.
+
+        A time without a date takes the date of the other timestamp, or applies to
+        every day in the logs if neither has one.
+        """
+        if end_timestamp is None:
+            end_timestamp = start_timestamp
+        start_time, start_dated = parse_query_timestamp(start_timestamp)
+        end_time, end_dated = parse_query_timestamp(end_timestamp)
+        
+        if start_dated and end_dated:
+            intervals = [(start_time, end_time)]
+        elif start_dated:
+            intervals = [(start_time, datetime.combine(start_time.date(), end_time.time()))]
+        elif end_dated:
+            intervals = [(datetime.combine(end_time.date(), start_time.time()), end_time)]
+        else:
+            dates = sorted({time_key[:10] for time_key in self._chunk_keys()})
+            intervals = []
+            for date in dates:
+                day = datetime.strptime(date, '%Y-%m-%d').date()
+                intervals.append((datetime.combine(day, start_time.time()),
+                                  datetime.combine(day, end_time.time())))
+        return [(start, end) for start, end in intervals if start <= end]
+
+    def _chunk_second_range(self, time_key, start, end):
+        """Return the (first, last) second offsets of a chunk that fall between start and
+        end, or None if the whole chunk does."""
+        chunk_seconds = BUCKET_SECONDS[self.granularity]
+        chunk_start = datetime.strptime(time_key, KEY_FORMATS[self.granularity])
+        first = max(0, int((start - chunk_start).total_seconds()))
+        last = min(chunk_seconds - 1, int((end - chunk_start).total_seconds()))
+        if first == 0 and last == chunk_seconds - 1:
+            return None
+        return first, last
+
+    def _chunk_reads(self, intervals):
+        """Return (chunk key, second range) for every chunk overlapping the intervals, in order.
+
+        The second range is None for chunks entirely inside an interval; only the
+        first and last chunk of each interval can be partly outside it.
+        """
+        keys = self._chunk_keys()
+        key_format = KEY_FORMATS[self.granularity]
+        reads = []
+        for start, end in intervals:
+            # Binary search in the sorted keys: O(log n + k)
+            first = bisect_left(keys, start.strftime(key_format))
+            last = bisect_right(keys, end.strftime(key_format))
+            for i in range(first, last):
+                second_range = None
+                if i == first or i == last - 1:
+                    second_range = self._chunk_second_range(keys[i], start, end)
+                reads.append((keys[i], second_range))
+        return reads
+
+    def _encode_json_index(self, log_type_codes, second_offsets=None):
+        """Encode the log type codes (and second offsets, if any) of a chunk as a JSON index file."""
+        entries = [
+            {"line_number": line_num, "log_type": LOG_TYPES[code]}
+            for line_num, code in enumerate(log_type_codes, start=1)
+        ]
+        if second_offsets is not None:
+            for entry, second_offset in zip(entries, second_offsets):
+                entry["second_offset"] = second_offset
+        return json.dumps({
+            "total_lines": len(log_type_codes),
+            "entries": entries
+        }, indent=2).encode('utf-8')
+
+    def _write_index(self, time_key, log_type_codes, line_lengths, second_offsets=None, blocks=None,
+                     compresslevel=None):
+        """Write the final index of a chunk in the configured format and return its path.
+
+        Binary indexes are stored uncompressed so that they can be used without
+        decoding; JSON indexes are gzipped. Only binary indexes keep the block
+        table, so chunks indexed in JSON are always decompressed as a whole.
+        """
+        if self.index_format == 'binary':
+            index_data = encode_index(log_type_codes, line_lengths, second_offsets, blocks)
+            stored_data = index_data
+            output_path = os.path.join(self.compressed_index_dir, f"{time_key}.idx")
+        else:
+            index_data = self._encode_json_index(log_type_codes, second_offsets)
+            stored_data = gzip.compress(index_data, compresslevel=9 if compresslevel is None else compresslevel)
+            output_path = os.path.join(self.compressed_index_dir, f"{time_key}.json.gz")
+        
+        with open(output_path, 'wb') as f_out:
+            f_out.write(stored_data)
+        
+        self.index_sizes[time_key] = {
+            'original': len(index_data),
+            'compressed': len(stored_data)
+        }
+        return output_path
+
+    def _index_arrays(self, index):
+        """Return the log type codes, line lengths, second offsets and block table of a
+        loaded index as lists, to write it again with more lines or a block table."""
+        offsets = index.offsets
+        line_lengths = [offsets[i + 1] - offsets[i] for i in range(index.total_lines)]
+        second_offsets = list(index.seconds) if index.seconds is not None else None
+        blocks = None
+        if index.block_first_lines is not None:
+            blocks = (list(index.block_first_lines), list(index.block_offsets))
+        return bytes(index.log_types), line_lengths, second_offsets, blocks
+
+    def _add_block_table(self, time_key, blocks):
+        """Add the block table of a chunk compressed after its binary index was written."""
+        if not os.path.exists(os.path.join(self.compressed_index_dir, f"{time_key}.idx")):
+            return
+        log_type_codes, line_lengths, second_offsets, _ = self._index_arrays(self._load_index(time_key))
+        self._write_index(time_key, log_type_codes, line_lengths, second_offsets, blocks)
+
     def compress_files(self):
         """Compress all log and index files."""
         # Check if files are already compressed
         if os.path.exists(self.compressed_chunks_dir) and os.listdir(self.compressed_chunks_dir):
-            print("\nFiles are already compressed!")
-            print("Use the 'Reset Processing' option if you want to reprocess the log file.")
+            logger.warning("Files are already compressed! "
+                           "Use the 'Reset Processing' option if you want to reprocess the log file.")
             return
 
         # Compress log files
         for filename in os.listdir(self.output_dir):
             if filename.endswith('.log'):
                 input_path = os.path.join(self.output_dir, filename)
-                output_path = os.path.join(self.compressed_chunks_dir, filename + '.gz')
+                time_key = filename[:-4]  # Remove .log extension
+                output_path = self._chunk_path(time_key)
                 
-                with open(input_path, 'rb') as f_in:
-                    with gzip.open(output_path, 'wb') as f_out:
-                        shutil.copyfileobj(f_in, f_out)
+                # Compressed in blocks of lines that can be decompressed on their own
+                with self.metrics.timer('compress'):
+                    [(compressed_size, blocks)] = compress_batch([(input_path, output_path, self.block_lines)],
+                                                                 self.codec)
                 
                 # Store compressed chunk size
-                time_key = filename[:-4]  # Remove .log extension
-                compressed_size = os.path.getsize(output_path)
                 if time_key in self.chunk_sizes:
                     self.chunk_sizes[time_key]['compressed'] = compressed_size
+                self._add_block_table(time_key, blocks)
                 
-                print(f"Compressed: {filename}")
+                logger.debug("Compressed: %s", filename)
 
         # Compress index files
         for filename in os.listdir(self.index_dir):
@@ -223,9 +1443,10 @@ class LogProcessor:
                 input_path = os.path.join(self.index_dir, filename)
                 output_path = os.path.join(self.compressed_index_dir, filename + '.gz')
                 
-                with open(input_path, 'rb') as f_in:
-                    with gzip.open(output_path, 'wb') as f_out:
-                        shutil.copyfileobj(f_in, f_out)
+                with self.metrics.timer('compress'):
+                    with open(input_path, 'rb') as f_in:
+                        with gzip.open(output_path, 'wb') as f_out:
+                            shutil.copyfileobj(f_in, f_out)
                 
                 # Store compressed index size
                 time_key = filename[:-5]  # Remove .json extension
@@ -233,150 +1454,688 @@ class LogProcessor:
                 if time_key in self.index_sizes:
                     self.index_sizes[time_key]['compressed'] = compressed_size
                 
-                print(f"Compressed: {filename}")
+                logger.debug("Compressed: %s", filename)
+        
+        self._finish_ingest()
 
-    def view_logs_by_timestamp(self, timestamp, log_type=None):
-        """View logs for a specific timestamp by decompressing the file temporarily.
-        Optional log_type parameter to filter logs by type (INFO, ERROR, etc.)"""
-        # Convert timestamp format from HH:MM:SS to HH_MM_SS
-        try:
-            # Parse the timestamp to validate format
-            datetime.strptime(timestamp, '%H:%M:%S')
-            time_key = timestamp.replace(':', '_')
-        except ValueError:
-            print("Invalid timestamp format. Please use HH:MM:SS format.")
+    def compress_files_parallel(self, workers=None, compresslevel=None, batch_size=64):
+        """Compress all log and index files using a pool of worker processes.
+
+        Files are handed to the workers in batches of batch_size to keep the
+        per-task overhead low when there are many small per-second chunks.
+        workers defaults to the number of CPUs. compresslevel overrides the
+        level of the codec.
+        """
+        # Check if files are already compressed
+        if os.path.exists(self.compressed_chunks_dir) and os.listdir(self.compressed_chunks_dir):
+            logger.warning("Files are already compressed! "
+                           "Use the 'Reset Processing' option if you want to reprocess the log file.")
             return
 
-        # Check if compressed files exist
-        compressed_log = os.path.join(self.compressed_chunks_dir, f"{time_key}.log.gz")
-        compressed_index = os.path.join(self.compressed_index_dir, f"{time_key}.json.gz")
+        codec = self._codec_at(compresslevel)
+        # (sizes dict, time key, (input path, output path, block lines)) for every file to compress
+        jobs = []
+        for filename in os.listdir(self.output_dir):
+            if filename.endswith('.log'):
+                jobs.append((self.chunk_sizes, filename[:-4],
+                             (os.path.join(self.output_dir, filename),
+                              self._chunk_path(filename[:-4]),
+                              self.block_lines)))
+        for filename in os.listdir(self.index_dir):
+            if filename.endswith('.json'):
+                jobs.append((self.index_sizes, filename[:-5],
+                             (os.path.join(self.index_dir, filename),
+                              os.path.join(self.compressed_index_dir, filename + '.gz'),
+                              None)))
         
-        if not os.path.exists(compressed_log):
-            print(f"No logs found for timestamp {timestamp}")
-            return
+        batches = [jobs[i:i + batch_size] for i in range(0, len(jobs), batch_size)]
+        # Wall time of the whole pool, not the time added up over the workers
+        with self.metrics.timer('compress'):
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                results = executor.map(
+                    compress_batch,
+                    [[job for _, _, job in batch] for batch in batches],
+                    [codec] * len(batches),
+                    [9 if compresslevel is None else compresslevel] * len(batches))
+                
+                # Store compressed sizes, in the same order the jobs were submitted
+                for batch, batch_results in zip(batches, results):
+                    for (size_dict, time_key, (input_path, _, _)), (compressed_size, blocks) in zip(batch, batch_results):
+                        if time_key not in size_dict:
+                            size_dict[time_key] = {'original': os.path.getsize(input_path)}
+                        size_dict[time_key]['compressed'] = compressed_size
+                        if blocks is not None:
+                            self._add_block_table(time_key, blocks)
+        
+        logger.info("Compressed %d files in %d batches", len(jobs), len(batches))
+        self._finish_ingest()
+
+    def apply_retention(self, days):
+        """Delete the chunks of all but the most recent days of logs.
+
+        Days are counted back from the newest date in the logs, so that ingesting
+        an old log file does not delete everything. Returns the removed chunk keys.
+        """
+        if days < 1:
+            raise ValueError("Retention must be at least one day")
+        chunks = self._load_manifest()
+        if not chunks:
+            return []
+        newest_date = datetime.strptime(chunks[-1]['key'][:10], '%Y-%m-%d')
+        cutoff = (newest_date - timedelta(days=days - 1)).strftime('%Y-%m-%d')
+        # Keys sort in time order, so the expired chunks are at the start
+        expired = [chunk['key'] for chunk in chunks if chunk['key'][:10] < cutoff]
+        if not expired:
+            return []
+        
+        for time_key in expired:
+            for file_path in (self._chunk_path(time_key),
+                              self._index_path(time_key),
+                              os.path.join(self.output_dir, f"{time_key}.log"),
+                              os.path.join(self.index_dir, f"{time_key}.json")):
+                if os.path.exists(file_path):
+                    os.unlink(file_path)
+            self.chunk_sizes.pop(time_key, None)
+            self.index_sizes.pop(time_key, None)
+            self.chunk_stats.pop(time_key, None)
+        
+        remove_chunks(self.search_index_path, expired)
+        self._save_manifest(chunks[len(expired):])
+        
+        logger.info("Removed %d chunks older than %s", len(expired), cutoff)
+        return expired
 
-        # Create a temporary directory
-        with tempfile.TemporaryDirectory() as temp_dir:
-            try:
-                # Decompress and read the log file
-                with gzip.open(compressed_log, 'rb') as f_in:
-                    log_content = f_in.read().decode('utf-8').splitlines()
+    def count_logs(self, start_timestamp, end_timestamp=None, log_type=None):
+        """Count the log lines between two timestamps (inclusive), per log type.
+
+        Timestamps are HH:MM:SS or YYYY-MM-DD HH:MM:SS. Chunks entirely inside the
+        range are counted from the counters collected at ingest time, and the
+        chunks at either end from the second offsets in their indexes, so nothing
+        is decompressed. end_timestamp defaults to start_timestamp. Returns a dict
+        with the total (of log_type only, if given) and the count of each log type.
+        """
+        if end_timestamp is None:
+            end_timestamp = start_timestamp
+        intervals = self._query_intervals(start_timestamp, end_timestamp)
+        if log_type is not None and log_type not in LOG_TYPE_CODES:
+            raise ValueError(f"Unknown log type: {log_type}")
+        
+        if self._load_manifest() is None:
+            raise ValueError("No processed logs with counters found")
+        key_format = KEY_FORMATS[self.granularity]
+        totals = dict.fromkeys((None,) + LOG_TYPES, 0)
+        for start, end in intervals:
+            first = bisect_left(self._manifest_keys, start.strftime(key_format))
+            last = bisect_right(self._manifest_keys, end.strftime(key_format))
+            if first == last:
+                continue
+            for each_type, prefix in self._count_prefix.items():
+                totals[each_type] += prefix[last] - prefix[first]
+            
+            # Replace the counts of the chunks only partly in the range by exact ones
+            for i in sorted({first, last - 1}):
+                time_key = self._manifest_keys[i]
+                second_range = self._chunk_second_range(time_key, start, end)
+                if second_range is None:
+                    continue
+                chunk = self._manifest['chunks'][i]
+                totals[None] -= chunk['lines']
+                for each_type, count in chunk['log_types'].items():
+                    totals[each_type] -= count
                 
-                # Decompress and read the index file
-                with gzip.open(compressed_index, 'rb') as f_in:
-                    index_content = json.loads(f_in.read().decode('utf-8'))
+                index = self._load_index(time_key)
+                first_second, last_second = second_range
+                for code, second_offset in zip(index.log_types, index.seconds):
+                    if first_second <= second_offset <= last_second:
+                        totals[None] += 1
+                        totals[LOG_TYPES[code]] += 1
+        
+        return {
+            'start': start_timestamp,
+            'end': end_timestamp,
+            'total': totals[log_type],
+            'log_types': {each_type: totals[each_type] for each_type in LOG_TYPES if totals[each_type]}
+        }
+
+    def get_histogram(self, start_timestamp, end_timestamp, granularity='minute', log_type=None):
+        """Return per-bucket line counts between two timestamps.
+
+        granularity is 'second', 'minute', 'hour' or 'day'. Buckets that overlap the
+        range are reported whole, and buckets without any lines are left out. Each
+        bucket holds its start time (YYYY-MM-DD HH:MM:SS), its total (of log_type
+        only, if given) and the count of each log type. Buckets at least as long as
+        the chunks come from the counters collected at ingest time; shorter ones are
+        counted from the second offsets in the indexes.
+        """
+        if granularity not in BUCKET_KEY_LENGTHS:
+            raise ValueError(f"Unknown granularity: {granularity}")
+        if log_type is not None and log_type not in LOG_TYPE_CODES:
+            raise ValueError(f"Unknown log type: {log_type}")
+        intervals = self._query_intervals(start_timestamp, end_timestamp)
+        
+        chunks = self._load_manifest()
+        if chunks is None:
+            raise ValueError("No processed logs with counters found")
+        if GRANULARITIES.index(granularity) < GRANULARITIES.index(self.granularity):
+            selected = self._count_buckets_from_indexes(intervals, granularity)
+        else:
+            if granularity == self.granularity:
+                buckets, bucket_keys = chunks, self._manifest_keys
+            else:
+                buckets = self._manifest['rollups'][granularity]
+                bucket_keys = [bucket['key'] for bucket in buckets]
+            key_length = BUCKET_KEY_LENGTHS[granularity]
+            selected = []
+            for start, end in intervals:
+                start_key = start.strftime(KEY_FORMATS['second'])[:key_length]
+                end_key = end.strftime(KEY_FORMATS['second'])[:key_length]
+                selected.extend(buckets[bisect_left(bucket_keys, start_key):bisect_right(bucket_keys, end_key)])
+        
+        histogram = []
+        for bucket in selected:
+            # Pad the key to a full second key, e.g. 2015-10-18_18 -> 2015-10-18 18:00:00
+            full_key = bucket['key'] + '_00_00_00'[:BUCKET_KEY_LENGTHS['second'] - len(bucket['key'])]
+            histogram.append({
+                'time': full_key[:10] + ' ' + full_key[11:].replace('_', ':'),
+                'total': bucket['lines'] if log_type is None else bucket['log_types'].get(log_type, 0),
+                'log_types': bucket['log_types']
+            })
+        return histogram
+
+    def _count_buckets_from_indexes(self, intervals, granularity):
+        """Count the lines of buckets shorter than a chunk, from the second offsets in the indexes."""
+        bucket_seconds = BUCKET_SECONDS[granularity]
+        buckets = []
+        for start, end in intervals:
+            # Widen the interval to whole buckets
+            start -= timedelta(seconds=(start.minute * 60 + start.second) % bucket_seconds)
+            end += timedelta(seconds=bucket_seconds - 1 - (end.minute * 60 + end.second) % bucket_seconds)
+            for time_key, second_range in self._chunk_reads([(start, end)]):
+                index = self._load_index(time_key)
+                first_second, last_second = second_range or (0, BUCKET_SECONDS[self.granularity] - 1)
+                counts = {}  # bucket start offset -> line count per log type code
+                for code, second_offset in zip(index.log_types, index.seconds):
+                    if first_second <= second_offset <= last_second:
+                        bucket_counts = counts.setdefault(second_offset - second_offset % bucket_seconds,
+                                                          [0] * len(LOG_TYPES))
+                        bucket_counts[code] += 1
                 
-                # Filter logs if log_type is specified
-                if log_type:
-                    # Get line numbers for the specified log type
-                    filtered_lines = []
-                    for entry in index_content['entries']:
-                        if entry['log_type'] == log_type:
-                            # Line numbers are 1-based in the index
-                            filtered_lines.append(log_content[entry['line_number'] - 1])
-                    
-                    # Update display content
-                    log_content = filtered_lines
-                    total_lines = len(filtered_lines)
+                chunk_start = datetime.strptime(time_key, KEY_FORMATS[self.granularity])
+                for offset in sorted(counts):
+                    buckets.append({
+                        'key': (chunk_start + timedelta(seconds=offset)).strftime(KEY_FORMATS[granularity]),
+                        'lines': sum(counts[offset]),
+                        'log_types': {LOG_TYPES[code]: count for code, count in enumerate(counts[offset]) if count}
+                    })
+        return buckets
+
+    def _chunk_suffix(self):
+        return '.log' + self.codec.extension
+
+    def _chunk_path(self, time_key):
+        """Return the path of a compressed chunk."""
+        return os.path.join(self.compressed_chunks_dir, time_key + self._chunk_suffix())
+
+    def _codec_at(self, compresslevel):
+        """Return the codec to compress with, at compresslevel if it is not None."""
+        return self.codec if compresslevel is None else self.codec.with_level(compresslevel)
+
+    def _prepare_codec(self, sample_file=None, codec=None):
+        """Load the dictionary of a codec (by default the processor's) that uses one, or
+        train it on the start of sample_file (by default the log file) if there is none yet."""
+        codec = codec or self.codec
+        if getattr(codec, 'dictionary', False) is not None:
+            return
+        if os.path.exists(self.dictionary_path):
+            with open(self.dictionary_path, 'rb') as f:
+                codec.dictionary = f.read()
+            return
+        with open(sample_file or self.input_file, 'rb') as f:
+            sample_lines = f.read(DICTIONARY_SAMPLE_SIZE).splitlines(keepends=True)
+        codec.dictionary = train_dictionary(sample_lines)
+        with open(self.dictionary_path, 'wb') as f:
+            f.write(codec.dictionary)
+
+    def _dictionary_size(self):
+        return os.path.getsize(self.dictionary_path) if os.path.exists(self.dictionary_path) else 0
+
+    def _index_path(self, time_key):
+        """Return the path of a chunk's index, preferring the binary format over JSON."""
+        binary_path = os.path.join(self.compressed_index_dir, f"{time_key}.idx")
+        if os.path.exists(binary_path):
+            return binary_path
+        return os.path.join(self.compressed_index_dir, f"{time_key}.json.gz")
+
+    def _load_index(self, time_key, chunk_data=None):
+        """Load the index of a chunk as a BinaryIndex.
+
+        Indexes written in the older JSON format are converted on the fly, using
+        the decompressed chunk (decompressed here if not given) to work out the
+        line offsets.
+        """
+        index = self.cache.get(('index', time_key))
+        if index is not None:
+            return index
+        
+        with self.metrics.timer('index_load'):
+            index_path = self._index_path(time_key)
+            if index_path.endswith('.idx'):
+                with open(index_path, 'rb') as f:
+                    index = BinaryIndex(f.read())
+            else:
+                with gzip.open(index_path, 'rb') as f_in:
+                    index_content = json.loads(f_in.read().decode('utf-8'))
+                log_type_codes = bytearray(index_content['total_lines'])
+                second_offsets = None
+                if self.granularity != 'second':
+                    second_offsets = [0] * index_content['total_lines']
+                for entry in index_content['entries']:
+                    # Line numbers are 1-based in the index
+                    log_type_codes[entry['line_number'] - 1] = LOG_TYPE_CODES.get(entry['log_type'], 0)
+                    if second_offsets is not None:
+                        second_offsets[entry['line_number'] - 1] = entry['second_offset']
+                if chunk_data is None:
+                    chunk_data = self._decompress_chunk(time_key)
+                line_lengths = [len(line) for line in chunk_data.splitlines(keepends=True)]
+                index = BinaryIndex(encode_index(log_type_codes, line_lengths, second_offsets))
+        
+        self.cache.put(('index', time_key), index, index.nbytes)
+        return index
+
+    def _decompress_chunk(self, time_key):
+        """Return the decompressed contents of a chunk, from the cache when possible."""
+        chunk_data = self.cache.get(('chunk', time_key))
+        if chunk_data is None:
+            with self.metrics.timer('decompress'):
+                with open(self._chunk_path(time_key), 'rb') as f_in:
+                    compressed_data = f_in.read()
+                binary_path = os.path.join(self.compressed_index_dir, f"{time_key}.idx")
+                index = self._load_index(time_key) if os.path.exists(binary_path) else None
+                if index is not None and index.block_first_lines is not None:
+                    # Decompress block by block: not every codec reads concatenated frames
+                    offsets = index.block_offsets
+                    chunk_data = b''.join(self.codec.decompress(compressed_data[offsets[block]:offsets[block + 1]])
+                                          for block in range(len(offsets) - 1))
                 else:
-                    total_lines = index_content['total_lines']
-                
-                # Display the contents
-                print(f"\nLogs for timestamp {timestamp}" + 
-                      (f" (filtered by {log_type})" if log_type else ""))
-                print(f"Total log entries: {total_lines}")
-                print("-" * 80)
-                
-                # Display the logs
-                for line in log_content:
-                    if line.strip():  # Only print non-empty lines
-                        print(line.strip())
-                
-                print("-" * 80)
+                    # Whole gzip chunk, from an older version or indexed in JSON
+                    chunk_data = gzip.decompress(compressed_data)
+            self.metrics.increment('bytes_decompressed', len(chunk_data))
+            self.cache.put(('chunk', time_key), chunk_data, len(chunk_data))
+        return chunk_data
+
+    def _decompress_block(self, time_key, index, block):
+        """Return the decompressed contents of one block of a chunk, from the cache when possible."""
+        block_data = self.cache.get(('block', time_key, block))
+        if block_data is None:
+            compressed_log = self._chunk_path(time_key)
+            with self.metrics.timer('decompress'):
+                with open(compressed_log, 'rb') as f:
+                    f.seek(index.block_offsets[block])
+                    compressed_block = f.read(index.block_offsets[block + 1] - index.block_offsets[block])
+                block_data = self.codec.decompress(compressed_block)
+            self.metrics.increment('bytes_decompressed', len(block_data))
+            self.cache.put(('block', time_key, block), block_data, len(block_data))
+        return block_data
+
+    def _line_reader(self, time_key, index):
+        """Return a function that reads a line of a chunk, as bytes, by line position.
+
+        With a block table only the blocks holding the lines asked for are read
+        and decompressed; otherwise the whole chunk is decompressed once.
+        """
+        if index.block_first_lines is None:
+            chunk_data = self._decompress_chunk(time_key)
+            return lambda position: index.line(chunk_data, position)
+        
+        current = {}  # block number -> decompressed block, for the last block read
+        def read_line(position):
+            block = index.block_of(position)
+            block_data = current.get(block)
+            if block_data is None:
+                current.clear()
+                block_data = current[block] = self._decompress_block(time_key, index, block)
+            return index.block_line(block_data, block, position)
+        return read_line
+
+    def get_cache_stats(self):
+        """Return the size and hit/miss/eviction counters of the chunk cache."""
+        return self.cache.stats()
+
+    def _iter_chunk_records(self, time_key, log_type=None, start_position=0, second_range=None):
+        """Yield (line position, record) for the lines of one chunk from start_position on,
+        optionally only those of log_type and those whose second offset is within second_range."""
+        code = None
+        if log_type:
+            code = LOG_TYPE_CODES.get(log_type)
+            if code is None:
+                return
+        
+        index = self._load_index(time_key)
+        read_line = self._line_reader(time_key, index)
+        yield from self._iter_index_records(time_key, index, read_line, range(start_position, index.total_lines),
+                                            code, second_range)
+
+    def _iter_index_records(self, time_key, index, read_line, positions, code, second_range):
+        """Yield (line position, record) for the lines of a chunk at positions, using
+        read_line to read them, optionally only those with log type code and those
+        whose second offset is within second_range."""
+        chunk_start = datetime.strptime(time_key, KEY_FORMATS[self.granularity])
+        timestamps = {}  # second offset -> formatted timestamp
+        log_types = index.log_types
+        seconds = index.seconds
+        for batch_start in range(0, len(positions), FILTER_BATCH_LINES):
+            batch = positions[batch_start:batch_start + FILTER_BATCH_LINES]
+            # Use the index to skip lines of other types or other seconds without decoding them
+            with self.metrics.timer('filter'):
+                matched = batch
+                if code is not None:
+                    matched = [position for position in matched if log_types[position] == code]
+                if second_range is not None and seconds is not None:
+                    low, high = second_range
+                    matched = [position for position in matched if low <= seconds[position] <= high]
+                elif second_range is not None and not second_range[0] <= 0 <= second_range[1]:
+                    matched = []
+            self.metrics.increment('lines_scanned', len(batch))
+            self.metrics.increment('lines_matched', len(matched))
+            
+            for position in matched:
+                line = read_line(position).decode('utf-8')
+                if line.strip():  # Only return non-empty lines
+                    second_offset = seconds[position] if seconds is not None else 0
+                    timestamp = timestamps.get(second_offset)
+                    if timestamp is None:
+                        timestamp = (chunk_start + timedelta(seconds=second_offset)).strftime(RECORD_TIMESTAMP_FORMAT)
+                        timestamps[second_offset] = timestamp
+                    yield position, {'timestamp': timestamp, 'level': LOG_TYPES[log_types[position]], 'line': line}
+
+    def _has_lines(self, chunk_reads):
+        """Return whether any line of any type falls in the (chunk key, second range)
+        pairs of chunk_reads, from the indexes alone: no chunk is decompressed."""
+        for time_key, second_range in chunk_reads:
+            index = self._load_index(time_key)
+            if not index.total_lines:
+                continue
+            if second_range is None:
+                return True
+            low, high = second_range
+            if index.seconds is None:
+                # Indexes without second offsets put every line at the start of the chunk
+                if low <= 0 <= high:
+                    return True
+            elif any(low <= second <= high for second in index.seconds):
+                return True
+        return False
+
+    def _iter_records(self, chunk_reads, log_type=None, start_position=0):
+        """Yield (chunk key, line position, record) for the (chunk key, second range)
+        pairs of chunk_reads in order.
+
+        start_position only applies to the first chunk, to resume from a cursor.
+        With several read workers the blocks to read are decompressed concurrently,
+        ahead of the records being yielded (see _iter_records_parallel).
+        """
+        if self.read_workers > 1:
+            return self._iter_records_parallel(chunk_reads, log_type, start_position)
+        return self._iter_records_serial(chunk_reads, log_type, start_position)
+
+    def _iter_records_serial(self, chunk_reads, log_type=None, start_position=0):
+        for time_key, second_range in chunk_reads:
+            for position, record in self._iter_chunk_records(time_key, log_type, start_position, second_range):
+                yield time_key, position, record
+            start_position = 0
+
+    def _iter_records_parallel(self, chunk_reads, log_type=None, start_position=0):
+        """Like _iter_records_serial, but decompress the blocks on a thread pool.
+
+        Blocks are decompressed in order with up to read_ahead of them ahead of the
+        one whose records are being yielded, so memory stays bounded and a caller
+        that stops early (e.g. at a page limit) leaves the rest of the range unread.
+        """
+        code = LOG_TYPE_CODES.get(log_type) if log_type else None
+        if log_type and code is None:
+            return
+        
+        block_reads = self._block_reads(chunk_reads, code, start_position)
+        for (time_key, second_range, index, block, positions), data in ordered_prefetch(
+                self._read_executor, self._fetch_block, block_reads, self.read_ahead):
+            if block is None:
+                read_line = partial(index.line, data)
+            else:
+                read_line = partial(index.block_line, data, block)
+            for position, record in self._iter_index_records(time_key, index, read_line, positions,
+                                                             code, second_range):
+                yield time_key, position, record
+
+    def _block_reads(self, chunk_reads, code, start_position):
+        """Yield (chunk key, second range, index, block, line positions) for the blocks
+        that may hold lines of chunk_reads with log type code (any type if None).
+
+        Block is None for chunks without a block table, which are read whole.
+        Blocks whose lines all have other log types or seconds outside the range
+        are skipped.
+        """
+        for time_key, second_range in chunk_reads:
+            index = self._load_index(time_key)
+            if index.block_first_lines is None:
+                yield time_key, second_range, index, None, range(start_position, index.total_lines)
+                start_position = 0
+                continue
             
-            except Exception as e:
-                print(f"Error reading logs: {str(e)}")
+            first_lines = index.block_first_lines
+            first_block = index.block_of(start_position) if start_position < index.total_lines else len(first_lines) - 1
+            for block in range(first_block, len(first_lines) - 1):
+                first = max(first_lines[block], start_position)
+                end = first_lines[block + 1]
+                if code is not None and code not in bytes(index.log_types[first:end]):
+                    continue
+                if second_range is not None and index.seconds is not None:
+                    seconds = index.seconds[first:end]
+                    if min(seconds) > second_range[1] or max(seconds) < second_range[0]:
+                        continue
+                yield time_key, second_range, index, block, range(first, end)
+            start_position = 0
+
+    def _fetch_block(self, block_read):
+        """Decompress the block of a _block_reads entry (or the whole chunk); runs on the read threads."""
+        time_key, _, index, block, _ = block_read
+        if block is None:
+            return self._decompress_chunk(time_key)
+        return self._decompress_block(time_key, index, block)
+
+    def _prepare_query(self, start_timestamp, end_timestamp, log_type, cursor):
+        """Check the query arguments and return the chunks to read and the position
+        to start at in the first of them."""
+        intervals = self._query_intervals(start_timestamp, end_timestamp)
+        if log_type is not None and log_type not in LOG_TYPE_CODES:
+            raise ValueError(f"Unknown log type: {log_type}")
+        chunk_reads = self._chunk_reads(intervals)
+        self.metrics.increment('queries')
+        
+        start_position = 0
+        if cursor:
+            cursor_key, start_position = decode_cursor(cursor)
+            keys = [time_key for time_key, _ in chunk_reads]
+            first = bisect_left(keys, cursor_key)
+            if first == len(keys) or keys[first] != cursor_key:
+                raise ValueError("Cursor does not belong to this time range")
+            chunk_reads = chunk_reads[first:]
+        
+        return chunk_reads, start_position
+
+    def query_logs(self, start_timestamp, end_timestamp=None, log_type=None, cursor=None):
+        """Return a generator of the log records between two timestamps (inclusive).
+
+        Timestamps are YYYY-MM-DD HH:MM:SS, or HH:MM:SS to match that time of day
+        on every day in the logs. end_timestamp defaults to start_timestamp. Each
+        record is a dict with the 'timestamp' (YYYY-MM-DD HH:MM:SS), 'level' and
+        'line' of one log line, in chunk order.
+        cursor resumes a query where a page returned by query_page ended.
+        The arguments are checked right away and raise ValueError; chunks are only
+        decompressed as the generator is consumed, so memory use does not depend on
+        the size of the range.
+        """
+        chunk_reads, start_position = self._prepare_query(start_timestamp, end_timestamp, log_type, cursor)
+        return (record for _, _, record in self._iter_records(chunk_reads, log_type, start_position))
+
+    def query_page(self, start_timestamp, end_timestamp=None, log_type=None, limit=100, cursor=None):
+        """Return up to limit records of a query and the cursor of the next page.
+
+        The next cursor is None when there are no more records. Only the chunks
+        needed for this page are decompressed.
+        """
+        if limit < 1:
+            raise ValueError("Limit must be at least 1")
+        chunk_reads, start_position = self._prepare_query(start_timestamp, end_timestamp, log_type, cursor)
+        
+        records = []
+        for time_key, position, record in self._iter_records(chunk_reads, log_type, start_position):
+            if len(records) == limit:
+                # There is at least one more record: the next page starts here
+                return records, encode_cursor(time_key, position)
+            records.append(record)
+        return records, None
+
+    def search_logs(self, query, start_timestamp=None, end_timestamp=None, log_type=None):
+        """Return a generator of the records of all lines containing every term of query.
+
+        Terms are whole words (runs of letters, digits and underscores) matched
+        case-insensitively, so 'RMContainerAllocator' finds lines mentioning
+        org.apache...rm.RMContainerAllocator. The search can be narrowed to a time
+        range (inclusive, as in query_logs) and a log type. Only chunks containing
+        matches are decompressed.
+        """
+        if not query or not query.strip():
+            raise ValueError("Search query is required")
+        if log_type is not None and log_type not in LOG_TYPE_CODES:
+            raise ValueError(f"Unknown log type: {log_type}")
+        # Matches are read with the granularity and codec the dataset was written with
+        self._load_manifest()
+        # Second range to filter each chunk by, for the chunks in the time range
+        second_ranges = None
+        if start_timestamp:
+            second_ranges = dict(self._chunk_reads(self._query_intervals(start_timestamp, end_timestamp)))
+        
+        search_index = self._search_index
+        if search_index is None:
+            if not segment_paths(self.search_index_path):
+                raise ValueError("No search index found; reprocess the log file to build one")
+            search_index = self._search_index = SearchIndex(self.search_index_path)
+        matches = search_index.search(query)
+        if search_index.unindexed:
+            matches = sorted(set(matches).union(self._scan_unindexed(query, search_index.unindexed)))
+        self.metrics.increment('queries')
+        
+        return self._iter_search_matches(matches, second_ranges, log_type)
+
+    def _scan_unindexed(self, query, unindexed):
+        """Yield the (chunk key, line position) of the lines in unindexed (chunk key ->
+        first line position not in the search index) containing every term of query."""
+        terms = tokenize(query)
+        if not terms:
+            return
+        chunk_keys = set(self._chunk_keys())
+        for time_key, first_position in sorted(unindexed.items()):
+            if time_key not in chunk_keys:
+                continue
+            index = self._load_index(time_key)
+            read_line = self._line_reader(time_key, index)
+            for position in range(first_position, index.total_lines):
+                if terms <= tokenize(read_line(position).decode('utf-8')):
+                    yield time_key, position
+
+    def _iter_search_matches(self, matches, second_ranges, log_type):
+        """Yield the records of sorted (chunk key, line position) matches, keeping only
+        those in second_ranges (chunk key -> second range) unless it is None."""
+        code = LOG_TYPE_CODES[log_type] if log_type else None
+        current_key = None
+        for time_key, position in matches:
+            if second_ranges is not None and time_key not in second_ranges:
+                continue
+            if time_key != current_key:
+                index = self._load_index(time_key)
+                read_line = self._line_reader(time_key, index)
+                chunk_start = datetime.strptime(time_key, KEY_FORMATS[self.granularity])
+                second_range = second_ranges[time_key] if second_ranges is not None else None
+                current_key = time_key
+            line_code = index.log_types[position]
+            if code is not None and line_code != code:
+                continue
+            second_offset = index.seconds[position] if index.seconds is not None else 0
+            if second_range is not None and not second_range[0] <= second_offset <= second_range[1]:
+                continue
+            yield {
+                'timestamp': (chunk_start + timedelta(seconds=second_offset)).strftime(RECORD_TIMESTAMP_FORMAT),
+                'level': LOG_TYPES[line_code],
+                'line': read_line(position).decode('utf-8')
+            }
+
+    def view_logs_by_timestamp(self, timestamp, log_type=None):
+        """View logs for a specific timestamp by decompressing the file temporarily.
+        Optional log_type parameter to filter logs by type (INFO, ERROR, etc.)"""
+        try:
+            # Parse the timestamp to validate format (HH:MM:SS or YYYY-MM-DD HH:MM:SS)
+            parse_query_timestamp(timestamp)
+        except ValueError:
+            print("Invalid timestamp format. Please use HH:MM:SS or YYYY-MM-DD HH:MM:SS format.")
+            return
+
+        try:
+            # Find the chunks holding this second; only its lines are read from them
+            chunk_reads = self._chunk_reads(self._query_intervals(timestamp, timestamp))
+            
+            log_content = [record['line'] for _, _, record in self._iter_records(chunk_reads, log_type)]
+            # A chunk spanning more than a second may have no lines in this one
+            if not log_content and not self._has_lines(chunk_reads):
+                print(f"No logs found for timestamp {timestamp}")
+                return
+            
+            # Display the contents
+            print(f"\nLogs for timestamp {timestamp}" + 
+                  (f" (filtered by {log_type})" if log_type else ""))
+            print(f"Total log entries: {len(log_content)}")
+            print("-" * 80)
+            
+            # Display the logs
+            for line in log_content:
+                if line.strip():  # Only print non-empty lines
+                    print(line.strip())
+            
+            print("-" * 80)
+        
+        except Exception as e:
+            print(f"Error reading logs: {str(e)}")
 
     def view_logs_by_timerange(self, start_timestamp, end_timestamp, log_type=None):
         """View logs within a time range by decompressing the files temporarily.
         Optional log_type parameter to filter logs by type (INFO, ERROR, etc.)"""
         try:
             # Parse the timestamps to validate format
-            start_time = datetime.strptime(start_timestamp, '%H:%M:%S')
-            end_time = datetime.strptime(end_timestamp, '%H:%M:%S')
-            
-            # Convert timestamps to file format
-            start_key = start_timestamp.replace(':', '_')
-            end_key = end_timestamp.replace(':', '_')
+            intervals = self._query_intervals(start_timestamp, end_timestamp)
             
-            # Get all log files in the compressed directory
-            log_files = sorted([f for f in os.listdir(self.compressed_chunks_dir) if f.endswith('.log.gz')])
-            
-            if not log_files:
+            if not self._chunk_keys():
                 print("No log files found")
                 return
             
-            # Filter files within the time range
-            relevant_files = []
-            for log_file in log_files:
-                file_time = log_file.replace('.log.gz', '').replace('_', ':')
-                try:
-                    file_time_obj = datetime.strptime(file_time, '%H:%M:%S')
-                    if start_time <= file_time_obj <= end_time:
-                        relevant_files.append(log_file)
-                except ValueError:
-                    continue
+            # Find the chunks within the time range
+            chunk_reads = self._chunk_reads(intervals)
             
-            if not relevant_files:
+            all_logs = [record['line'] for _, _, record in self._iter_records(chunk_reads, log_type)]
+            if not all_logs and not self._has_lines(chunk_reads):
                 print(f"No logs found between {start_timestamp} and {end_timestamp}")
                 return
             
-            # Create a temporary directory
-            with tempfile.TemporaryDirectory() as temp_dir:
-                all_logs = []
-                total_lines = 0
-                
-                # Process each relevant file
-                for log_file in relevant_files:
-                    time_key = log_file.replace('.log.gz', '')
-                    compressed_log = os.path.join(self.compressed_chunks_dir, log_file)
-                    compressed_index = os.path.join(self.compressed_index_dir, f"{time_key}.json.gz")
-                    
-                    # Decompress and read the log file
-                    with gzip.open(compressed_log, 'rb') as f_in:
-                        log_content = f_in.read().decode('utf-8').splitlines()
-                    
-                    # Decompress and read the index file
-                    with gzip.open(compressed_index, 'rb') as f_in:
-                        index_content = json.loads(f_in.read().decode('utf-8'))
-                    
-                    # Filter logs if log_type is specified
-                    if log_type:
-                        # Get line numbers for the specified log type
-                        filtered_lines = []
-                        for entry in index_content['entries']:
-                            if entry['log_type'] == log_type:
-                                # Line numbers are 1-based in the index
-                                filtered_lines.append(log_content[entry['line_number'] - 1])
-                        
-                        # Update content
-                        log_content = filtered_lines
-                    
-                    all_logs.extend(log_content)
-                    total_lines += len(log_content)
-                
-                # Display the contents
-                print(f"\nLogs between {start_timestamp} and {end_timestamp}" + 
-                      (f" (filtered by {log_type})" if log_type else ""))
-                print(f"Total log entries: {total_lines}")
-                print("-" * 80)
-                
-                # Display the logs
-                for line in all_logs:
-                    if line.strip():  # Only print non-empty lines
-                        print(line.strip())
-                
-                print("-" * 80)
+            # Display the contents
+            print(f"\nLogs between {start_timestamp} and {end_timestamp}" + 
+                  (f" (filtered by {log_type})" if log_type else ""))
+            print(f"Total log entries: {len(all_logs)}")
+            print("-" * 80)
+            
+            # Display the logs
+            for line in all_logs:
+                if line.strip():  # Only print non-empty lines
+                    print(line.strip())
+            
+            print("-" * 80)
             
         except ValueError as e:
             print(f"Invalid timestamp format: {str(e)}")
@@ -384,6 +2143,12 @@ class LogProcessor:
             print(f"Error reading logs: {str(e)}")
 
 def main():
+    parser = argparse.ArgumentParser(description="Split, compress and view a log file")
+    parser.add_argument('--quiet', action='store_true', help="only show warnings and errors")
+    parser.add_argument('--verbose', action='store_true', help="show a message for every file written")
+    args = parser.parse_args()
+    configure_logging(args.quiet, args.verbose)
+    
     # Use your specific log file
     input_file = "Hadoop_2k (1).log"
     processor = LogProcessor(input_file)
@@ -395,13 +2160,15 @@ def main():
         print("3. View filtered logs by timestamp and type")
         print("4. View logs by time range")
         print("5. Reset Processing (Use after modifying the log file)")
-        print("6. Exit")
+        print("6. Ingest new lines appended to the log file")
+        print("7. Follow the log file (like tail -f, Ctrl+C to stop)")
+        print("8. Exit")
         
-        choice = input("Enter your choice (1-6): ")
+        choice = input("Enter your choice (1-8): ")
         
         if choice == "1":
             print(f"\nProcessing file: {input_file}")
-            print("Splitting logs by second and creating indexes...")
+            print("Splitting logs into chunks and creating indexes...")
             num_files = processor.split_by_second()
             if num_files > 0:
                 print(f"\nCreated {num_files} files in the 'chunks' directory")
@@ -411,18 +2178,18 @@ def main():
                 print("\nCompression complete!")
         
         elif choice == "2":
-            timestamp = input("\nEnter timestamp to view logs (HH:MM:SS format): ")
+            timestamp = input("\nEnter timestamp to view logs (HH:MM:SS or YYYY-MM-DD HH:MM:SS format): ")
             processor.view_logs_by_timestamp(timestamp)
         
         elif choice == "3":
-            timestamp = input("\nEnter timestamp to view logs (HH:MM:SS format): ")
+            timestamp = input("\nEnter timestamp to view logs (HH:MM:SS or YYYY-MM-DD HH:MM:SS format): ")
             print("\nAvailable log types: INFO, ERROR, WARN, DEBUG, FATAL")
             log_type = input("Enter log type to filter by: ").upper()
             processor.view_logs_by_timestamp(timestamp, log_type)
         
         elif choice == "4":
-            start_timestamp = input("\nEnter start timestamp (HH:MM:SS format): ")
-            end_timestamp = input("\nEnter end timestamp (HH:MM:SS format): ")
+            start_timestamp = input("\nEnter start timestamp (HH:MM:SS or YYYY-MM-DD HH:MM:SS format): ")
+            end_timestamp = input("\nEnter end timestamp (HH:MM:SS or YYYY-MM-DD HH:MM:SS format): ")
             processor.view_logs_by_timerange(start_timestamp, end_timestamp)
         
         elif choice == "5":
@@ -431,6 +2198,13 @@ def main():
                 processor.reset_processing()
         
         elif choice == "6":
+            processor.ingest_incremental()
+        
+        elif choice == "7":
+            print(f"\nFollowing {input_file}...")
+            processor.follow()
+        
+        elif choice == "8":
             print("\nExiting program...")
             break
         
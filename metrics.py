@@ -0,0 +1,195 @@
+"""Timers and counters for ingest and queries, and an opt-in profiler.
+
+A Metrics object adds up, for each named stage (e.g. parse, bucket, compress,
+write, decompress, index_load, filter), the time spent in it and the number
+of times it ran, and keeps named counters (lines read, queries, ...). Stages
+are timed once per batch of lines, block or file, never once per line, so
+the timers cost nothing measurable. A stage timed inside another one is not
+counted twice: the outer stage only gets the time spent outside the inner one.
+
+render_prometheus formats metrics in the Prometheus text format, and
+profiled runs a piece of code under cProfile and/or tracemalloc.
+"""
+import cProfile
+import io
+import pstats
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+# Functions listed in a CPU profile report, and allocation sites in a memory one
+PROFILE_TOP_ENTRIES = 30
+
+
+class Metrics:
+    """Thread-safe stage timers and counters."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._seconds = {}
+        self._calls = {}
+        self._counters = {}
+        # Per thread: one entry per stage being timed, holding the time spent in stages nested in it
+        self._local = threading.local()
+
+    @contextmanager
+    def timer(self, stage):
+        """Time the body of a with statement as one run of stage.
+
+        The body must not yield from a generator: the timer would go on running
+        while the consumer works.
+        """
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        nested = [0.0]
+        stack.append(nested)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            stack.pop()
+            if stack:
+                stack[-1][0] += elapsed
+            self.add_time(stage, elapsed - nested[0])
+
+    def add_time(self, stage, seconds, calls=1):
+        with self._lock:
+            self._seconds[stage] = self._seconds.get(stage, 0.0) + seconds
+            self._calls[stage] = self._calls.get(stage, 0) + calls
+
+    def increment(self, counter, amount=1):
+        with self._lock:
+            self._counters[counter] = self._counters.get(counter, 0) + amount
+
+    def snapshot(self):
+        """Return the current values: {'stages': {stage: {'seconds', 'calls'}}, 'counters': {name: value}}."""
+        with self._lock:
+            return {
+                'stages': {stage: {'seconds': seconds, 'calls': self._calls[stage]}
+                           for stage, seconds in self._seconds.items()},
+                'counters': dict(self._counters)
+            }
+
+    def merge(self, snapshot):
+        """Add the values of a snapshot, e.g. one taken in a worker process."""
+        for stage, values in snapshot['stages'].items():
+            self.add_time(stage, values['seconds'], values['calls'])
+        for counter, value in snapshot['counters'].items():
+            self.increment(counter, value)
+
+
+def snapshot_difference(after, before):
+    """Return what was added to the metrics between two snapshots, without the
+    stages and counters that did not change."""
+    stages = {}
+    for stage, values in after['stages'].items():
+        old = before['stages'].get(stage, {'seconds': 0.0, 'calls': 0})
+        if values['calls'] != old['calls']:
+            stages[stage] = {'seconds': values['seconds'] - old['seconds'], 'calls': values['calls'] - old['calls']}
+    counters = {counter: value - before['counters'].get(counter, 0)
+                for counter, value in after['counters'].items()
+                if value != before['counters'].get(counter, 0)}
+    return {'stages': stages, 'counters': counters}
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+               for value in labels.values())
+    return '{' + ','.join(f'{name}="{value}"' for name, value in zip(labels, escaped)) + '}'
+
+
+def render_prometheus(labelled_metrics, samples=(), prefix='logsplitter'):
+    """Format metrics in the Prometheus text exposition format.
+
+    labelled_metrics is a list of (labels dict, Metrics); stage times become the
+    <prefix>_stage_seconds_total and <prefix>_stage_calls_total counters with a
+    'stage' label, and every counter <prefix>_<name>_total. samples adds other
+    values as (name, type, help, labels dict, value), named <prefix>_<name>.
+    """
+    snapshots = [(labels, metrics.snapshot()) for labels, metrics in labelled_metrics]
+    out = []
+
+    def family(name, metric_type, help_text, values):
+        out.append(f'# HELP {prefix}_{name} {help_text}')
+        out.append(f'# TYPE {prefix}_{name} {metric_type}')
+        for labels, value in values:
+            out.append(f'{prefix}_{name}{_format_labels(labels)} {value}')
+
+    for key, name, help_text in (('seconds', 'stage_seconds_total', 'Seconds spent in each stage of ingest and queries.'),
+                                 ('calls', 'stage_calls_total', 'Number of times each stage ran.')):
+        family(name, 'counter', help_text,
+               [({**labels, 'stage': stage}, values[key])
+                for labels, snapshot in snapshots
+                for stage, values in sorted(snapshot['stages'].items())])
+
+    counters = sorted({counter for _, snapshot in snapshots for counter in snapshot['counters']})
+    for counter in counters:
+        family(f'{counter}_total', 'counter', f'Total {counter.replace("_", " ")}.',
+               [(labels, snapshot['counters'][counter])
+                for labels, snapshot in snapshots if counter in snapshot['counters']])
+
+    samples_by_name = {}
+    for name, metric_type, help_text, labels, value in samples:
+        samples_by_name.setdefault((name, metric_type, help_text), []).append((labels, value))
+    for (name, metric_type, help_text), values in samples_by_name.items():
+        family(name, metric_type, help_text, values)
+    return '\n'.join(out) + '\n'
+
+
+@contextmanager
+def profiled(cpu=True, memory=False):
+    """Profile the body of a with statement and fill in the report it yields.
+
+    cpu runs cProfile on the current thread: report['cpu'] is the text of the
+    top functions by cumulative time and report['profiler'] the profiler, for
+    dump_stats. memory traces allocations of all threads with tracemalloc:
+    report['memory'] has the peak and current traced bytes and the top
+    allocation sites.
+    """
+    report = {}
+    profiler = cProfile.Profile() if cpu else None
+    started_tracing = memory and not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    elif memory:
+        tracemalloc.reset_peak()
+    if profiler is not None:
+        profiler.enable()
+    try:
+        yield report
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            text = io.StringIO()
+            pstats.Stats(profiler, stream=text).sort_stats('cumulative').print_stats(PROFILE_TOP_ENTRIES)
+            report['cpu'] = text.getvalue()
+            report['profiler'] = profiler
+        if memory:
+            current, peak = tracemalloc.get_traced_memory()
+            top = tracemalloc.take_snapshot().statistics('lineno')[:PROFILE_TOP_ENTRIES]
+            report['memory'] = {'current_bytes': current, 'peak_bytes': peak, 'top': [str(stat) for stat in top]}
+            if started_tracing:
+                tracemalloc.stop()
+
+
+def write_profile(report, path):
+    """Write a profiled report: path + '.prof' (cProfile data, for pstats or snakeviz)
+    and path + '.txt' (the readable report). Returns the paths written."""
+    paths = []
+    if 'profiler' in report:
+        report['profiler'].dump_stats(path + '.prof')
+        paths.append(path + '.prof')
+    with open(path + '.txt', 'w', encoding='utf-8') as f:
+        if 'cpu' in report:
+            f.write(report['cpu'])
+        if 'memory' in report:
+            memory = report['memory']
+            f.write(f"Traced memory: peak {memory['peak_bytes']} bytes, current {memory['current_bytes']} bytes\n")
+            f.write('\n'.join(memory['top']) + '\n')
+    paths.append(path + '.txt')
+    return paths
@@ -0,0 +1,31 @@
+"""Ordered read-ahead over a thread pool.
+
+Used to decompress the blocks of a wide query concurrently while the
+records are still produced in order: zlib, lzma and bz2 release the GIL
+while they work, so threads are enough to use several cores.
+"""
+from collections import deque
+
+
+def ordered_prefetch(executor, function, items, read_ahead):
+    """Yield (item, function(item)) for each of items, in order.
+
+    function runs on the executor for up to read_ahead items ahead of the one
+    being yielded, so at most read_ahead results are held at a time. Items are
+    only taken from the iterable as they are needed, and calls not started yet
+    are cancelled when the generator is closed early (e.g. once a row limit is
+    reached).
+    """
+    pending = deque()
+    try:
+        for item in items:
+            pending.append((item, executor.submit(function, item)))
+            if len(pending) >= read_ahead:
+                item, future = pending.popleft()
+                yield item, future.result()
+        while pending:
+            item, future = pending.popleft()
+            yield item, future.result()
+    finally:
+        for _, future in pending:
+            future.cancel()
@@ -0,0 +1,102 @@
+import os
+import struct
+from array import array
+
+import pytest
+
+from binary_index import HEADER, MAGIC, BinaryIndex, encode_index
+from log_splitter import LogProcessor
+
+SAMPLE_LOG = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Hadoop_2k (1).log")
+FULL_RANGE = ('2015-10-18 00:00:00', '2015-10-18 23:59:59')
+
+
+def chunk_of(lines):
+    return b''.join(line + b'\n' for line in lines)
+
+
+@pytest.mark.parametrize('with_seconds', [False, True])
+@pytest.mark.parametrize('with_blocks', [False, True])
+@pytest.mark.parametrize('line_count', [3, 6, 7])
+def test_encoded_index_reads_back(with_seconds, with_blocks, line_count):
+    lines = [b'line %d' % i + b'x' * i for i in range(line_count)]
+    codes = bytes(i % 6 for i in range(line_count))
+    seconds = [i * 7 for i in range(line_count)] if with_seconds else None
+    blocks = ([0, 2, line_count], [0, 100, 180]) if with_blocks else None
+
+    index = BinaryIndex(encode_index(codes, [len(line) + 1 for line in lines], seconds, blocks))
+    data = chunk_of(lines)
+    assert index.total_lines == line_count
+    assert bytes(index.log_types) == codes
+    assert list(index.offsets)[-1] == len(data)
+    assert [bytes(index.line(data, i)) for i in range(line_count)] == lines
+    assert (list(index.seconds) if index.seconds is not None else None) == seconds
+    if with_blocks:
+        assert list(index.block_first_lines) == blocks[0]
+        assert list(index.block_offsets) == blocks[1]
+        assert [index.block_of(i) for i in range(line_count)] == [0 if i < 2 else 1 for i in range(line_count)]
+        block = data[index.offsets[2]:]
+        assert [bytes(index.block_line(block, 1, i)) for i in range(2, line_count)] == lines[2:]
+    else:
+        assert index.block_first_lines is None
+
+
+def test_version_1_index_is_readable():
+    lines = [b'first', b'second line', b'third']
+    offsets = array('I', [0, 6, 18, 24])
+    total_lines = len(lines)
+    data = (struct.pack('<4sBB2xI', MAGIC, 1, 0, total_lines) + bytes([1, 2, 3])
+            + b'\0' * (-(HEADER.size + total_lines) % 4) + offsets.tobytes())
+    index = BinaryIndex(data)
+    assert bytes(index.log_types) == bytes([1, 2, 3])
+    assert index.seconds is None and index.block_first_lines is None
+    assert [bytes(index.line(chunk_of(lines), i)) for i in range(3)] == lines
+
+
+def test_other_files_are_rejected():
+    with pytest.raises(ValueError):
+        BinaryIndex(b'{"total_lines": 0, "entries": []}')
+
+
+def records(processor, log_type=None):
+    return list(processor.query_logs(*FULL_RANGE, log_type=log_type))
+
+
+def test_json_indexed_dataset_reads_like_a_binary_one(tmp_path):
+    oracle = LogProcessor(SAMPLE_LOG, storage_root=str(tmp_path / 'binary'))
+    oracle.split_by_second_streaming()
+
+    store = str(tmp_path / 'json')
+    processor = LogProcessor(SAMPLE_LOG, index_format='json', storage_root=store)
+    processor.split_by_second()
+    processor.compress_files()
+    assert any(name.endswith('.json.gz') for name in os.listdir(processor.compressed_index_dir))
+    assert not any(name.endswith('.idx') for name in os.listdir(processor.compressed_index_dir))
+
+    # Read back by a processor that writes binary indexes
+    reader = LogProcessor(SAMPLE_LOG, storage_root=store)
+    for log_type in (None, 'ERROR', 'WARN'):
+        assert records(reader, log_type) == records(oracle, log_type)
+    assert reader.count_logs(*FULL_RANGE) == oracle.count_logs(*FULL_RANGE)
+
+
+def test_append_to_json_indexed_dataset_matches_full_ingest(tmp_path):
+    with open(SAMPLE_LOG, 'r', encoding='utf-8') as f:
+        lines = [line.rstrip('\n') + '\n' for line in f]
+    path = str(tmp_path / 'app.log')
+    with open(path, 'w', encoding='utf-8') as f:
+        f.writelines(lines[:1200])
+    store = str(tmp_path / 'store')
+    processor = LogProcessor(path, index_format='json', storage_root=store)
+    processor.split_by_second()
+    processor.compress_files()
+
+    with open(path, 'a', encoding='utf-8') as f:
+        f.writelines(lines[1200:])
+    appender = LogProcessor(path, storage_root=store)
+    appender.ingest_incremental()
+
+    oracle = LogProcessor(path, storage_root=str(tmp_path / 'oracle'))
+    oracle.split_by_second_streaming()
+    assert records(appender) == records(oracle)
+    assert records(LogProcessor(path, storage_root=store), 'ERROR') == records(oracle, 'ERROR')
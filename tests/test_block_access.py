@@ -0,0 +1,61 @@
+import os
+
+import pytest
+
+from log_splitter import LogProcessor
+
+SAMPLE_LOG = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Hadoop_2k (1).log")
+FULL_RANGE = ('2015-10-18 00:00:00', '2015-10-18 23:59:59')
+RANGES = [FULL_RANGE, ('2015-10-18 18:03:30', '2015-10-18 18:05:10'), ('2015-10-18 18:04:41', None)]
+BLOCK_LINES = 50
+
+
+@pytest.fixture(scope='module')
+def stores(tmp_path_factory):
+    root = tmp_path_factory.mktemp('blocks')
+    # Chunks in a single block are read whole, as before block tables
+    oracle = LogProcessor(SAMPLE_LOG, block_lines=10 ** 9, storage_root=str(root / 'oracle'))
+    oracle.split_and_compress()
+    blocked = LogProcessor(SAMPLE_LOG, block_lines=BLOCK_LINES, storage_root=str(root / 'blocked'))
+    blocked.split_and_compress()
+    return oracle, str(root / 'blocked')
+
+
+@pytest.mark.parametrize('read_workers', [1, 3])
+@pytest.mark.parametrize('log_type', [None, 'INFO', 'ERROR', 'WARN', 'FATAL'])
+def test_block_reads_match_whole_chunk_reads(stores, read_workers, log_type):
+    oracle, store = stores
+    processor = LogProcessor(SAMPLE_LOG, read_workers=read_workers, storage_root=store)
+    for start, end in RANGES:
+        assert (list(processor.query_logs(start, end, log_type=log_type)) ==
+                list(oracle.query_logs(start, end, log_type=log_type)))
+        assert processor.count_logs(start, end, log_type=log_type) == oracle.count_logs(start, end, log_type=log_type)
+
+
+@pytest.mark.parametrize('read_workers', [1, 3])
+@pytest.mark.parametrize('log_type', [None, 'WARN'])
+def test_pages_resume_inside_blocks(stores, read_workers, log_type):
+    oracle, store = stores
+    processor = LogProcessor(SAMPLE_LOG, read_workers=read_workers, storage_root=store)
+    records, cursor = processor.query_page(*FULL_RANGE, log_type=log_type, limit=37)
+    while cursor is not None:
+        page, cursor = processor.query_page(*FULL_RANGE, log_type=log_type, limit=37, cursor=cursor)
+        records.extend(page)
+    assert records == list(oracle.query_logs(*FULL_RANGE, log_type=log_type))
+
+
+def test_each_block_holds_its_lines(stores):
+    _, store = stores
+    processor = LogProcessor(SAMPLE_LOG, storage_root=store)
+    chunk_keys = processor._chunk_keys()
+    assert chunk_keys
+    for time_key in chunk_keys:
+        index = processor._load_index(time_key)
+        chunk_data = processor._decompress_chunk(time_key)
+        first_lines = list(index.block_first_lines)
+        assert first_lines == list(range(0, index.total_lines, BLOCK_LINES)) + [index.total_lines]
+        for block in range(len(first_lines) - 1):
+            block_data = processor._decompress_block(time_key, index, block)
+            for position in range(first_lines[block], first_lines[block + 1]):
+                assert index.block_of(position) == block
+                assert bytes(index.block_line(block_data, block, position)) == bytes(index.line(chunk_data, position))
@@ -0,0 +1,82 @@
+import os
+
+import pytest
+
+from log_codecs import CODECS, Codec, ZlibDictCodec, available_codecs, get_codec, train_dictionary
+from log_splitter import LogProcessor
+
+SAMPLE_LOG = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Hadoop_2k (1).log")
+FULL_RANGE = ('2015-10-18 00:00:00', '2015-10-18 23:59:59')
+
+
+def sample_lines():
+    with open(SAMPLE_LOG, 'rb') as f:
+        return [line.rstrip(b'\n') + b'\n' for line in f]
+
+
+@pytest.mark.parametrize('name', available_codecs())
+def test_codec_round_trip(name):
+    data = b''.join(sample_lines()[:300])
+    codec = get_codec(name)
+    if isinstance(codec, ZlibDictCodec):
+        codec.dictionary = train_dictionary(sample_lines())
+    for level_codec in (codec, codec.with_level(1)):
+        for block in (b'', b'x', data):
+            assert level_codec.decompress(level_codec.compress(block)) == block
+    assert get_codec(codec.spec).spec == codec.spec
+
+
+def test_dictionary_shrinks_small_blocks():
+    lines = sample_lines()
+    dictionary = train_dictionary(lines[:1000])
+    assert 0 < len(dictionary) <= 32 * 1024
+    block = b''.join(lines[1000:1020])
+    primed = ZlibDictCodec(dictionary=dictionary)
+    assert primed.decompress(primed.compress(block)) == block
+    assert len(primed.compress(block)) < len(get_codec('zlib').compress(block))
+
+
+def test_unknown_codecs_and_levels_are_rejected():
+    with pytest.raises(ValueError):
+        get_codec('snappy')
+    with pytest.raises(ValueError):
+        get_codec('gzip:fast')
+    for name in set(CODECS) - set(available_codecs()):
+        with pytest.raises(ValueError):
+            get_codec(name)
+
+
+def test_codec_without_compress_cannot_be_created():
+    class HalfCodec(Codec):
+        name = 'half'
+
+        def decompress(self, data):
+            return data
+
+    with pytest.raises(TypeError):
+        HalfCodec()
+
+
+@pytest.fixture(scope='module')
+def gzip_oracle(tmp_path_factory):
+    processor = LogProcessor(SAMPLE_LOG, storage_root=str(tmp_path_factory.mktemp('gzip')))
+    processor.split_by_second_streaming()
+    return processor
+
+
+@pytest.mark.parametrize('spec', [name for name in available_codecs() if name != 'gzip'] + ['gzip:1'])
+def test_dataset_reads_the_same_with_every_codec(tmp_path, gzip_oracle, spec):
+    store = str(tmp_path / 'store')
+    LogProcessor(SAMPLE_LOG, codec=spec, block_lines=64, storage_root=store).split_and_compress()
+
+    # Read with the codec recorded in the manifest
+    processor = LogProcessor(SAMPLE_LOG, storage_root=store)
+    for log_type in (None, 'WARN'):
+        assert (list(processor.query_logs(*FULL_RANGE, log_type=log_type)) ==
+                list(gzip_oracle.query_logs(*FULL_RANGE, log_type=log_type)))
+    assert processor.codec.spec == get_codec(spec).spec
+    page, cursor = processor.query_page('2015-10-18 18:04:00', '2015-10-18 18:07:00', limit=150)
+    next_page, _ = processor.query_page('2015-10-18 18:04:00', '2015-10-18 18:07:00', limit=150, cursor=cursor)
+    assert page + next_page == list(gzip_oracle.query_logs('2015-10-18 18:04:00', '2015-10-18 18:07:00'))[:300]
+    assert processor.count_logs(*FULL_RANGE) == gzip_oracle.count_logs(*FULL_RANGE)
+    assert list(processor.search_logs('error contacting')) == list(gzip_oracle.search_logs('error contacting'))
@@ -0,0 +1,182 @@
+import os
+
+import pytest
+
+from inverted_index import InvertedIndex, segment_paths, unindexed_path
+from log_splitter import LogProcessor
+
+SAMPLE_LOG = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Hadoop_2k (1).log")
+FULL_RANGE = ('2015-10-18 00:00:00', '2015-10-18 23:59:59')
+
+
+def sample_lines():
+    with open(SAMPLE_LOG, 'r', encoding='utf-8') as f:
+        return [line.rstrip('\n') + '\n' for line in f]
+
+
+def ingest(processor, mode):
+    if mode == 'classic':
+        processor.split_by_second()
+        processor.compress_files()
+    elif mode == 'streaming':
+        processor.split_by_second_streaming()
+    elif mode == 'fused':
+        processor.split_and_compress()
+    else:
+        processor.split_and_compress_parallel(workers=2, shard_bytes=50000)
+
+
+def stored_lines(processor):
+    return [record['line'] for record in processor.query_logs(*FULL_RANGE)]
+
+
+@pytest.mark.parametrize('mode', ['classic', 'streaming', 'fused', 'sharded'])
+def test_full_ingest_leaves_half_written_last_line_to_append(tmp_path, mode):
+    lines = sample_lines()
+    path = str(tmp_path / 'app.log')
+    last = lines[1000]
+    with open(path, 'w', encoding='utf-8') as f:
+        f.writelines(lines[:1000])
+        f.write(last[:40])
+    processor = LogProcessor(path, storage_root=str(tmp_path / 'store'))
+    ingest(processor, mode)
+    assert stored_lines(processor) == [line.strip() for line in lines[:1000]]
+
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(last[40:])
+        f.writelines(lines[1001:])
+    assert processor.ingest_incremental() == len(lines) - 1000
+    assert stored_lines(processor) == [line.strip() for line in lines]
+
+
+def test_append_in_batches_matches_full_ingest_and_counts_stored_lines(tmp_path, monkeypatch):
+    monkeypatch.setattr('log_splitter.APPEND_BATCH_LINES', 100)
+    lines = sample_lines()
+    appended = lines[500:]
+    # Lines without a timestamp are skipped, and not counted
+    appended[10:10] = ['no timestamp here\n', '\n']
+    path = str(tmp_path / 'app.log')
+    with open(path, 'w', encoding='utf-8') as f:
+        f.writelines(lines[:500])
+    processor = LogProcessor(path, storage_root=str(tmp_path / 'store'))
+    processor.split_by_second_streaming()
+    with open(path, 'a', encoding='utf-8') as f:
+        f.writelines(appended)
+    assert processor.ingest_incremental() == len(lines) - 500
+
+    oracle = LogProcessor(path, storage_root=str(tmp_path / 'oracle'))
+    oracle.split_by_second_streaming()
+    assert stored_lines(processor) == stored_lines(oracle)
+    assert processor.count_logs(*FULL_RANGE) == oracle.count_logs(*FULL_RANGE)
+    assert ([record['line'] for record in processor.search_logs('RMContainerAllocator')] ==
+            [record['line'] for record in oracle.search_logs('RMContainerAllocator')])
+
+
+def write(path, lines, mode='w'):
+    with open(path, mode, encoding='utf-8') as f:
+        f.writelines(lines)
+
+
+def full_ingest(tmp_path, lines, name='oracle'):
+    """Return a processor holding lines ingested in one go, the oracle of the appends."""
+    path = str(tmp_path / f'{name}.log')
+    write(path, lines)
+    processor = LogProcessor(path, storage_root=str(tmp_path / name))
+    processor.split_by_second_streaming()
+    return processor
+
+
+def searched_lines(processor, query):
+    return [record['line'] for record in processor.search_logs(query)]
+
+
+def index_contents(processor):
+    contents = {}
+    for segment in segment_paths(processor.search_index_path):
+        index = InvertedIndex(segment)
+        for term in index.terms:
+            contents.setdefault(term, []).extend(index.lookup(term))
+    return {term: sorted(pairs) for term, pairs in contents.items()}
+
+
+def test_appends_add_search_segments_equal_to_a_full_index(tmp_path):
+    lines = sample_lines()
+    path = str(tmp_path / 'app.log')
+    write(path, lines[:400])
+    processor = LogProcessor(path, storage_root=str(tmp_path / 'store'))
+    processor.split_by_second_streaming()
+    for start in range(400, len(lines), 400):
+        write(path, lines[start:start + 400], 'a')
+        assert processor.ingest_incremental() == len(lines[start:start + 400])
+    assert processor.ingest_incremental() == 0
+
+    oracle = full_ingest(tmp_path, lines)
+    # Segments of similar sizes are merged as they are added
+    assert 1 < len(segment_paths(processor.search_index_path)) < 5
+    assert index_contents(processor) == index_contents(oracle)
+    assert stored_lines(processor) == stored_lines(oracle)
+    for query in ('RMContainerAllocator', 'error contacting', 'nosuchterm'):
+        assert searched_lines(processor, query) == searched_lines(oracle, query)
+
+
+def test_lines_appended_without_search_index_are_still_found(tmp_path):
+    lines = sample_lines()
+    path = str(tmp_path / 'app.log')
+    write(path, lines[:1000])
+    LogProcessor(path, storage_root=str(tmp_path / 'store')).split_by_second_streaming()
+    write(path, lines[1000:], 'a')
+    processor = LogProcessor(path, build_search_index=False, storage_root=str(tmp_path / 'store'))
+    processor.ingest_incremental()
+    assert os.path.exists(unindexed_path(processor.search_index_path))
+
+    oracle = full_ingest(tmp_path, lines)
+    for query in ('RMContainerAllocator', 'error contacting', 'nosuchterm'):
+        assert searched_lines(processor, query) == searched_lines(oracle, query)
+
+
+@pytest.mark.parametrize('change', ['rotated', 'replaced', 'truncated'])
+def test_append_resumes_after_the_file_changes(tmp_path, change):
+    lines = sample_lines()
+    logs = tmp_path / 'logs'
+    logs.mkdir()
+    path = str(logs / 'app.log')
+    first = lines[:1000] if change == 'truncated' else lines[:500]
+    write(path, first)
+    processor = LogProcessor(path, storage_root=str(tmp_path / 'store'))
+    processor.split_by_second_streaming()
+
+    if change == 'rotated':
+        # The rest of the old file is read before the new one
+        write(path, lines[500:800], 'a')
+        os.rename(path, str(logs / 'app.log.1'))
+        write(path, lines[800:])
+        expected = lines
+    elif change == 'replaced':
+        # Same file, longer than before, with other contents
+        write(path, lines[500:])
+        expected = lines
+    else:
+        write(path, lines[1000:1200])
+        expected = lines[:1200]
+    processor.ingest_incremental()
+    assert stored_lines(processor) == stored_lines(full_ingest(tmp_path, expected))
+
+
+def test_retention_after_appends_keeps_the_newest_days(tmp_path):
+    days = [[line.replace('2015-10-18', f'2015-10-{day}', 1) for line in sample_lines()] for day in (18, 19, 20)]
+    path = str(tmp_path / 'app.log')
+    write(path, days[0])
+    processor = LogProcessor(path, storage_root=str(tmp_path / 'store'))
+    processor.split_by_second_streaming()
+    for day in days[1:]:
+        write(path, day, 'a')
+        processor.ingest_incremental()
+    removed = processor.apply_retention(2)
+    assert removed and all(key.startswith('2015-10-18') for key in removed)
+
+    oracle = full_ingest(tmp_path, days[1] + days[2])
+    all_days = ('2015-10-18 00:00:00', '2015-10-20 23:59:59')
+    assert list(processor.query_logs(*all_days)) == list(oracle.query_logs(*all_days))
+    assert processor.count_logs(*all_days) == oracle.count_logs(*all_days)
+    assert index_contents(processor) == index_contents(oracle)
+    assert searched_lines(processor, 'RMContainerAllocator') == searched_lines(oracle, 'RMContainerAllocator')
@@ -0,0 +1,75 @@
+import json
+import os
+import shutil
+import time
+
+from datasets import DatasetRegistry
+from ingest_jobs import JobManager, staging_path
+
+SAMPLE_LOG = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Hadoop_2k (1).log")
+
+
+def wait_for(job, timeout=60):
+    deadline = time.monotonic() + timeout
+    while job.state not in ('done', 'failed'):
+        assert time.monotonic() < deadline, f"job still {job.state}"
+        time.sleep(0.05)
+    return job
+
+
+def test_reupload_to_processed_dataset_fails_and_keeps_its_file(tmp_path):
+    registry = DatasetRegistry(root=str(tmp_path / 'datasets'))
+    jobs = JobManager(workers=1, profile_dir=str(tmp_path / 'profiles'))
+    dataset = registry.get('logs', create=True)
+    first = shutil.copy(SAMPLE_LOG, os.path.join(dataset.upload_dir, 'first.log'))
+    second = os.path.join(dataset.upload_dir, 'second.log')
+    with open(SAMPLE_LOG, 'r', encoding='utf-8') as source, open(second, 'w', encoding='utf-8') as target:
+        target.writelines(line for line in source if ' ERROR ' in line)
+
+    job = wait_for(jobs.submit_ingest(dataset, first, {'granularity': 'minute'}))
+    assert job.state == 'done'
+    assert job.result['chunks'] > 0
+
+    job = wait_for(jobs.submit_ingest(dataset, second, {'granularity': 'minute'}))
+    assert job.state == 'failed'
+    assert 'reset' in job.error
+    # The dataset still serves, and points at, the logs it was processed from
+    assert dataset.processor.input_file == first
+    with open(dataset.metadata_path, 'r', encoding='utf-8') as f:
+        assert json.load(f)['input_file'] == os.path.abspath(first)
+
+
+def test_rejected_reupload_leaves_the_file_of_the_same_name_alone(tmp_path):
+    registry = DatasetRegistry(root=str(tmp_path / 'datasets'))
+    jobs = JobManager(workers=1, profile_dir=str(tmp_path / 'profiles'))
+    dataset = registry.get('logs', create=True)
+    path = shutil.copy(SAMPLE_LOG, os.path.join(dataset.upload_dir, 'app.log'))
+    assert wait_for(jobs.submit_ingest(dataset, path, {'granularity': 'minute'})).state == 'done'
+
+    upload_path = staging_path(dataset, 'app.log')
+    with open(upload_path, 'w', encoding='utf-8') as f:
+        f.write('2015-10-18 18:01:47,978 INFO [main] other: log\n')
+    job = wait_for(jobs.submit_ingest(dataset, path, {'granularity': 'minute'}, upload_path=upload_path))
+    assert job.state == 'failed'
+    with open(path, 'rb') as f, open(SAMPLE_LOG, 'rb') as sample:
+        assert f.read() == sample.read()
+    assert os.listdir(dataset.upload_dir) == ['app.log']
+
+
+def test_append_to_processed_dataset(tmp_path):
+    registry = DatasetRegistry(root=str(tmp_path / 'datasets'))
+    jobs = JobManager(workers=1, profile_dir=str(tmp_path / 'profiles'))
+    dataset = registry.get('logs', create=True)
+    path = os.path.join(dataset.upload_dir, 'app.log')
+    with open(SAMPLE_LOG, 'r', encoding='utf-8') as f:
+        # Incremental ingest leaves a last line without a newline for later
+        lines = [line.rstrip('\n') + '\n' for line in f]
+    with open(path, 'w', encoding='utf-8') as f:
+        f.writelines(lines[:1000])
+    assert wait_for(jobs.submit_ingest(dataset, path, {'granularity': 'minute'})).state == 'done'
+
+    with open(path, 'a', encoding='utf-8') as f:
+        f.writelines(lines[1000:])
+    job = wait_for(jobs.submit_ingest(dataset, path, {'append': True}))
+    assert job.state == 'done'
+    assert job.result['message'] == f'Appended {len(lines) - 1000} new log lines'
@@ -0,0 +1,98 @@
+import os
+
+import pytest
+
+from inverted_index import InvertedIndex, InvertedIndexBuilder, segment_paths, tokenize
+from log_splitter import LogProcessor
+
+SAMPLE_LOG = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Hadoop_2k (1).log")
+QUERIES = ['RMContainerAllocator', 'error contacting', 'lease renewer', 'nosuchterm']
+
+
+def scan(query):
+    """Return the lines of the sample log containing every word of query, the oracle of search_logs."""
+    terms = tokenize(query)
+    with open(SAMPLE_LOG, 'r', encoding='utf-8') as f:
+        return [line.strip() for line in f if terms <= tokenize(line)]
+
+
+def search(processor, query, **filters):
+    return [record['line'] for record in processor.search_logs(query, **filters)]
+
+
+def test_search_with_a_fresh_processor_uses_the_stored_settings(tmp_path):
+    store = str(tmp_path / 'store')
+    LogProcessor(SAMPLE_LOG, storage_root=store, granularity='hour', codec='zlib-dict').split_by_second_streaming()
+
+    # Constructed with the defaults (minute chunks, gzip), as the app does for an existing dataset
+    processor = LogProcessor(SAMPLE_LOG, storage_root=store)
+    for query in QUERIES:
+        assert search(processor, query) == scan(query)
+    expected = [line for line in scan('RMContainerAllocator')
+                if '2015-10-18 18:05:00' <= line[:19] <= '2015-10-18 18:06:59' and line.split()[2] == 'ERROR']
+    assert expected
+    assert search(processor, 'RMContainerAllocator', start_timestamp='2015-10-18 18:05:00',
+                  end_timestamp='2015-10-18 18:06:59', log_type='ERROR') == expected
+
+
+def index_contents(path):
+    """Return {term: sorted (chunk key, position) pairs} of every segment of the index at path."""
+    contents = {}
+    for segment in segment_paths(path):
+        index = InvertedIndex(segment)
+        for term in index.terms:
+            contents.setdefault(term, []).extend(index.lookup(term))
+    return {term: sorted(pairs) for term, pairs in contents.items()}
+
+
+def test_spilled_builder_writes_the_in_memory_index(tmp_path, monkeypatch):
+    with open(SAMPLE_LOG, 'r', encoding='utf-8') as f:
+        lines = [line.strip() for line in f]
+    parts = [lines[:700], lines[700:1500], lines[1500:]]
+
+    def build(spill_path):
+        builder = InvertedIndexBuilder(spill_path=spill_path)
+        first_positions = {}
+        for part in parts:
+            # Later parts are collected by their own builders, as shards are
+            other = InvertedIndexBuilder(spill_path=spill_path and f"{spill_path}.part{len(first_positions)}")
+            for position, line in enumerate(part):
+                other.add(line[:16], position, line)
+            other.flush()
+            builder.add_builder(other, {key: first_positions.get(key, 0) for key in other.chunk_ids})
+            for key in other.chunk_ids:
+                first_positions[key] = first_positions.get(key, 0) + sum(line[:16] == key for line in part)
+        return builder
+
+    build(None).write(str(tmp_path / 'memory.bin'))
+    monkeypatch.setattr('inverted_index.MAX_BUILDER_PAIRS', 500)
+    monkeypatch.setattr('inverted_index.MAX_BUILDER_TERMS', 100)
+    monkeypatch.setattr('inverted_index.MAX_MERGED_RUNS', 3)
+    builder = build(str(tmp_path / 'spilled.bin'))
+    assert builder.runs
+    builder.write(str(tmp_path / 'spilled.bin'))
+
+    assert index_contents(str(tmp_path / 'spilled.bin')) == index_contents(str(tmp_path / 'memory.bin'))
+    assert sorted(os.listdir(tmp_path)) == ['memory.bin', 'spilled.bin']
+
+
+@pytest.mark.parametrize('mode', ['streaming', 'fused', 'sharded'])
+def test_ingest_with_spilled_index_matches_a_scan(tmp_path, monkeypatch, mode):
+    oracle = LogProcessor(SAMPLE_LOG, storage_root=str(tmp_path / 'oracle'))
+    oracle.split_by_second_streaming()
+
+    monkeypatch.setattr('inverted_index.MAX_BUILDER_PAIRS', 500)
+    monkeypatch.setattr('inverted_index.MAX_BUILDER_TERMS', 100)
+    monkeypatch.setattr('inverted_index.MAX_MERGED_RUNS', 3)
+    processor = LogProcessor(SAMPLE_LOG, storage_root=str(tmp_path / 'store'))
+    if mode == 'streaming':
+        processor.split_by_second_streaming()
+    elif mode == 'fused':
+        processor.split_and_compress()
+    else:
+        processor.split_and_compress_parallel(workers=2, shard_bytes=50000)
+
+    assert index_contents(processor.search_index_path) == index_contents(oracle.search_index_path)
+    for query in QUERIES:
+        assert search(processor, query) == scan(query)
+    assert not [name for name in os.listdir(processor.compressed_index_dir) if '.run' in name or '.shard' in name]
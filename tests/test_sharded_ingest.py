@@ -0,0 +1,69 @@
+import os
+
+import pytest
+
+from inverted_index import InvertedIndex, segment_paths
+from log_splitter import LogProcessor
+
+SAMPLE_LOG = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Hadoop_2k (1).log")
+ALL_DAYS = ('2015-10-18 00:00:00', '2015-10-19 23:59:59')
+
+
+@pytest.fixture(scope='module')
+def log_file(tmp_path_factory):
+    """Two days of the sample log with a few lines without a timestamp."""
+    with open(SAMPLE_LOG, 'r', encoding='utf-8') as f:
+        lines = [line.rstrip('\n') + '\n' for line in f]
+    lines[100:100] = ['\tat org.apache.hadoop.ipc.Client.call(Client.java:1475)\n', '\n']
+    path = str(tmp_path_factory.mktemp('logs') / 'app.log')
+    with open(path, 'w', encoding='utf-8') as f:
+        f.writelines(lines)
+        f.writelines(line.replace('2015-10-18', '2015-10-19', 1) for line in lines)
+    return path
+
+
+@pytest.fixture(scope='module', params=['minute', 'hour'])
+def serial(request, log_file, tmp_path_factory):
+    processor = LogProcessor(log_file, granularity=request.param, storage_root=str(tmp_path_factory.mktemp('serial')))
+    processor.split_by_second_streaming()
+    return processor
+
+
+def index_contents(processor):
+    contents = {}
+    for segment in segment_paths(processor.search_index_path):
+        index = InvertedIndex(segment)
+        for term in index.terms:
+            contents.setdefault(term, []).extend(index.lookup(term))
+    return {term: sorted(pairs) for term, pairs in contents.items()}
+
+
+def chunk_lines(processor):
+    return [(chunk['key'], chunk['lines'], chunk['log_types']) for chunk in processor._load_manifest()]
+
+
+@pytest.mark.parametrize('workers, shard_bytes', [(1, 10 ** 9), (2, 50000), (3, 4096), (3, 997)])
+def test_sharded_ingest_matches_serial_ingest(tmp_path, log_file, serial, workers, shard_bytes):
+    processor = LogProcessor(log_file, granularity=serial.granularity, block_lines=100,
+                             storage_root=str(tmp_path / 'sharded'))
+    processor.split_and_compress_parallel(workers=workers, shard_bytes=shard_bytes)
+
+    assert chunk_lines(processor) == chunk_lines(serial)
+    for log_type in (None, 'ERROR'):
+        assert (list(processor.query_logs(*ALL_DAYS, log_type=log_type)) ==
+                list(serial.query_logs(*ALL_DAYS, log_type=log_type)))
+    assert processor.count_logs(*ALL_DAYS) == serial.count_logs(*ALL_DAYS)
+    assert index_contents(processor) == index_contents(serial)
+    assert list(processor.search_logs('RMContainerAllocator')) == list(serial.search_logs('RMContainerAllocator'))
+
+
+@pytest.mark.parametrize('shard_bytes', [1, 997, 50000, 10 ** 9])
+def test_shards_end_after_a_newline(log_file, shard_bytes):
+    processor = LogProcessor(log_file)
+    file_size = os.path.getsize(log_file)
+    offsets = processor._shard_offsets(shard_bytes, file_size)
+    assert offsets[0] == 0 and offsets[-1] == file_size
+    assert offsets == sorted(set(offsets))
+    with open(log_file, 'rb') as f:
+        data = f.read()
+    assert all(data[offset - 1:offset] == b'\n' for offset in offsets[1:])